@@ -0,0 +1,177 @@
+"""
+Benchmark suite for the Work Log. It generates synthetic logs of several
+sizes and times how long WorkLog takes to load, sort and save them, and
+every search of TaskSearch. Results are printed and can be saved as JSON, and
+compared with a baseline saved before to flag any regression.
+
+Example:
+    python benchmark.py --sizes 1000 100000 --output results.json
+    python benchmark.py --baseline results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import utils
+from storage import CsvStorage
+from task import (
+    Contains, DateBetween, DateIs, Matches, TaskSearch, TimeIs)
+from work_log import WorkLog
+
+SIZES = [1000, 100000, 1000000]
+WORDS = [
+    'meeting', 'review', 'project', 'call', 'email', 'report', 'design',
+    'python', 'planning', 'client', 'office', 'bug', 'release', 'training',
+    'interview', 'budget', 'deploy', 'notes', 'research', 'support',
+]
+FIRST_DATE = datetime.date(2010, 1, 1)
+
+
+def generate_logs(rows, days=3650, notes_length=40, duplicates=0.1, seed=0):
+    """
+    Returns a list of synthetic logs. Their dates are spread over the number
+    of days given, notes have about notes_length characters, and a ratio of
+    the logs given by duplicates repeat the title and notes of another one.
+    """
+    rand = random.Random(seed)
+    logs = []
+    for _ in range(rows):
+        date = FIRST_DATE + datetime.timedelta(days=rand.randrange(days))
+        if logs and rand.random() < duplicates:
+            original = rand.choice(logs)
+            title, notes = original['Title'], original['Notes']
+        else:
+            title = ' '.join(rand.choice(WORDS) for _ in range(3)).title()
+            words = []
+            while sum(len(word) + 1 for word in words) < notes_length:
+                words.append(rand.choice(WORDS))
+            notes = ' '.join(words).capitalize() if notes_length else ''
+        logs.append({
+            'Date': utils.format_date(date),
+            'Title': title,
+            'Time': str(rand.randint(1, 480)),
+            'Notes': notes,
+        })
+    return logs
+
+
+def generate_log(file, rows, **options):
+    """Saves a synthetic log in a csv file. Options are as generate_logs"""
+    CsvStorage(file).save(generate_logs(rows, **options))
+
+
+def timed(function, repeat=1):
+    """Returns the best time in seconds of running a function"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def queries():
+    """
+    Returns the predicate run by each of the TaskSearch methods measured,
+    with fixed values instead of the ones the user would give.
+    """
+    start = FIRST_DATE + datetime.timedelta(days=365)
+    end = start + datetime.timedelta(days=30)
+    return {
+        'search_date': DateIs(start),
+        'search_by_range': DateBetween(start, end),
+        'search_time': TimeIs(60),
+        'search_exact': Contains('review'),
+        'search_regex': Matches(r'rev\w+ \w+'),
+    }
+
+
+def run(size, repeat=1, **options):
+    """
+    Returns a dict with the time in seconds of every operation measured on a
+    synthetic log of the size given.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        file = os.path.join(directory, 'log.csv')
+        generate_log(file, size, **options)
+        results = {}
+        results['get_tasks'] = timed(lambda: WorkLog(file), repeat)
+        log = WorkLog(file)
+        tasks = list(log.TASKS)
+        random.Random(0).shuffle(tasks)
+        results['sort_tasks'] = timed(lambda: log.sort_tasks(tasks), repeat)
+        results['save_log'] = timed(log.save_log, repeat)
+        for method, predicate in queries().items():
+            results[method] = timed(
+                lambda: TaskSearch.query(log.TASKS, predicate), repeat)
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Returns a list of (size, operation, time, baseline time) of the results
+    that are slower than the baseline by more than the tolerance ratio.
+    """
+    regressions = []
+    for size, operations in results.items():
+        for operation, seconds in operations.items():
+            before = baseline.get(size, {}).get(operation)
+            if before is not None and seconds > before * (1 + tolerance):
+                regressions.append((size, operation, seconds, before))
+    return regressions
+
+
+def main(argv=None):
+    """Runs the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--days', type=int, default=3650)
+    parser.add_argument('--notes-length', type=int, default=40)
+    parser.add_argument('--duplicates', type=float, default=0.1)
+    parser.add_argument('--output', help='file to save results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run(
+            size, args.repeat, days=args.days,
+            notes_length=args.notes_length, duplicates=args.duplicates)
+        for operation, seconds in results[str(size)].items():
+            print("{:>9} {:<16} {:10.4f}s".format(size, operation, seconds))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'python': platform.python_version(),
+                'results': results,
+            }, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(
+                results, json.load(baseline)['results'], args.tolerance)
+        for size, operation, seconds, before in regressions:
+            print("REGRESSION {} {}: {:.4f}s (baseline {:.4f}s)".format(
+                size, operation, seconds, before))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import datetime
+import mmap
+import struct
+
+import profiling
+import utils
+from storage import CsvStorage, JournalStorage, copy_log, replace_file
+from task import ProxyTaskList, Task, TaskArrays, numpy
+
+# Magic string, version, number of records and size of the string heap
+HEADER = struct.Struct('<4sIQQ8x')
+# Date ordinal, minutes spent, and offset and length in the string heap of
+# the title, the notes and the id
+RECORD = struct.Struct('<iiIIIIII')
+MAGIC = b'WLOG'
+VERSION = 1
+
+
+class MappedLog:
+    """
+    The records of a binary log, read straight from the file mapped in
+    memory. Records have a fixed width and are sorted by date, so any record
+    is found at once and dates are looked up with a binary search, all
+    without decoding anything else. Strings are decoded from the heap only
+    when they are asked for.
+    """
+
+    def __init__(self, file):
+        """
+        Maps a binary log file. It raises ValueError if the file is not a
+        binary log. A missing or empty file is an empty log.
+        """
+        self.map = None
+        self.count = 0
+        self.heap = HEADER.size
+        try:
+            with open(file, 'rb') as binary:
+                if binary.seek(0, 2):
+                    self.map = mmap.mmap(
+                        binary.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            pass
+        if self.map is None:
+            return
+        try:
+            magic, version, self.count, heap_size = HEADER.unpack_from(
+                self.map)
+        except struct.error:
+            magic = version = heap_size = None
+        self.heap = HEADER.size + self.count * RECORD.size
+        if (magic != MAGIC or version != VERSION
+                or len(self.map) != self.heap + heap_size):
+            self.close()
+            raise ValueError("{} is not a binary work log".format(file))
+
+    def __len__(self):
+        return self.count
+
+    def record(self, position):
+        """Returns the values of the record at the position given"""
+        return RECORD.unpack_from(
+            self.map, HEADER.size + position * RECORD.size)
+
+    def date(self, position):
+        """Returns the date ordinal of the record at the position given"""
+        return struct.unpack_from(
+            '<i', self.map, HEADER.size + position * RECORD.size)[0]
+
+    def bisect(self, ordinal, right=False):
+        """
+        Returns the position of the first record with a date ordinal greater
+        than or equal to the one given, or greater if right is True.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            date = self.date(middle)
+            if date < ordinal or (right and date == ordinal):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def minutes(self):
+        """
+        Returns the minutes spent of every record, as a NumPy array mapped
+        over the file if NumPy is available, or else as a list.
+        """
+        if not self.count:
+            return []
+        if numpy is not None:
+            records = numpy.frombuffer(
+                self.map, numpy.dtype('<i4'), self.count * 8, HEADER.size)
+            return records[1::8]
+        with memoryview(self.map) as view:
+            return [
+                record[1] for record in struct.iter_unpack(
+                    RECORD.format, view[HEADER.size:self.heap])]
+
+    def dates(self):
+        """Returns the date ordinals of every record as a NumPy array"""
+        records = numpy.frombuffer(
+            self.map, numpy.dtype('<i4'), self.count * 8, HEADER.size)
+        return records[0::8]
+
+    def string(self, offset, length):
+        """Returns a string of the heap"""
+        start = self.heap + offset
+        return self.map[start:start + length].decode('utf-8')
+
+    def values(self, position):
+        """
+        Returns the title, date, time spent, notes and id of the record at
+        the position given, as Task.from_values takes them.
+        """
+        date, minutes, *strings = self.record(position)
+        title, notes, task_id = (
+            self.string(*strings[i:i + 2]) for i in range(0, 6, 2))
+        return (
+            title, datetime.date.fromordinal(date), str(minutes), notes,
+            task_id)
+
+    def log(self, position):
+        """Returns the log of the record at the position given"""
+        title, date, time, notes, task_id = self.values(position)
+        return {
+            'Date': utils.format_date(date),
+            'Title': title,
+            'Time': time,
+            'Notes': notes,
+            'Id': task_id,
+        }
+
+    def logs(self):
+        """Returns a list with the logs of all records"""
+        logs = [self.log(position) for position in range(self.count)]
+        profiling.count('rows parsed', len(logs))
+        return logs
+
+    def close(self):
+        """
+        Unmaps the file. If NumPy arrays over it are still in use, it stays
+        mapped until they are gone.
+        """
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+            self.map = None
+            self.count = 0
+
+
+def encode(rows):
+    """
+    Returns the bytes of a binary log with the rows given, sorted by date.
+    Each distinct string is stored once in the heap. It raises ValueError
+    if a time spent is not a number written as such, as it would not be
+    read back the same.
+    """
+    rows = sorted(rows, key=lambda row: utils.parse_date(row['Date']))
+    heap = bytearray()
+    strings = {}
+
+    def add(string):
+        string = string or ''
+        if string not in strings:
+            data = string.encode('utf-8')
+            if len(heap) + len(data) >= 1 << 32:
+                raise ValueError("the strings of the log don't fit in 4 GiB")
+            strings[string] = (len(heap), len(data))
+            heap.extend(data)
+        return strings[string]
+
+    records = bytearray()
+    for row in rows:
+        minutes = int(row['Time'])
+        if str(minutes) != row['Time']:
+            raise ValueError(
+                "time spent can't be stored: {!r}".format(row['Time']))
+        records.extend(RECORD.pack(
+            utils.parse_date(row['Date']).toordinal(), minutes,
+            *add(row['Title']), *add(row.get('Notes')), *add(row.get('Id'))))
+    header = HEADER.pack(MAGIC, VERSION, len(rows), len(heap))
+    return bytes(header + records + heap)
+
+
+class BinaryStorage(CsvStorage):
+    """
+    Storage of a log in a binary file of fixed width records, sorted by date,
+    followed by a heap with every distinct string. The file is mapped in
+    memory by a BinaryTaskList, so opening a log of any size reads only its
+    header. Every save rewrites the whole file.
+    """
+    EXTENSIONS = ('.wlog',)
+
+    def __init__(self, file):
+        """Initializes the storage with the path of the binary file"""
+        super().__init__(file)
+        self.mapped = None
+
+    @classmethod
+    def handles(cls, file):
+        """Returns True if the file given is a binary log"""
+        return bool(file) and file.lower().endswith(cls.EXTENSIONS)
+
+    def open(self):
+        """
+        Returns the MappedLog of the file, mapping it the first time. Changes
+        made by other processes are found from then on.
+        """
+        if self.mapped is None:
+            with self.lock(shared=True):
+                self._stamp = self.stamp()
+                self.mapped = MappedLog(self.file)
+        return self.mapped
+
+    def close(self):
+        """Unmaps the file, if it is mapped"""
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+
+    def load(self):
+        """
+        Returns a list with the rows of the file as dicts, as it is now. The
+        file is mapped again just for that, as the MappedLog of a list keeps
+        the file it was opened with.
+        """
+        with self.lock(shared=True):
+            self._stamp = self.stamp()
+            mapped = MappedLog(self.file)
+        try:
+            return mapped.logs()
+        finally:
+            mapped.close()
+
+    @profiling.timed()
+    def save(self, rows):
+        """Saves all rows in the binary file, replacing it atomically"""
+        data = encode(rows)
+        with self.lock():
+            self.close()
+            replace_file(self.file, data)
+            self.saved()
+
+    def changes_since(self, stamp):
+        """Rows can't be told apart, so the whole log is read again"""
+        return None
+
+
+class BinaryTaskList(ProxyTaskList):
+    """
+    A sorted list of the tasks of a BinaryStorage, read from the file mapped
+    in memory. The list works as the date and time index of the log, and its
+    TaskArrays are NumPy arrays mapped over the file, so searches by date
+    and time spent run over the records without creating the tasks they
+    don't find.
+    """
+    INDEXES = ('date', 'time', 'id')
+
+    def __init__(self, storage, build):
+        """
+        Initializes the list with the storage of the binary file and the
+        function that builds the full list of tasks from an iterable of
+        tasks. Only the header of the file is read.
+        """
+        super().__init__(build)
+        self.storage = storage
+        self.mapped = storage.open()
+        self._arrays = None
+
+    def __repr__(self):
+        return "BinaryTaskList({!r})".format(self.storage.file)
+
+    def between(self, start_date, end_date):
+        """Returns a list of the tasks between two dates, both included"""
+        if self._list is not None:
+            return self._list.indexes['date'].between(start_date, end_date)
+        first = self.mapped.bisect(start_date.toordinal())
+        last = self.mapped.bisect(end_date.toordinal(), right=True)
+        return [self._task(position) for position in range(first, last)]
+
+    def spent(self, time):
+        """Returns a list of the tasks with the time spent given"""
+        if self._list is not None:
+            return [task for task in self._list if task.time == time]
+        try:
+            minutes = int(time)
+        except ValueError:
+            return []
+        if str(minutes) != time:
+            return []
+        found = self.mapped.minutes()
+        if numpy is not None and len(found):
+            positions = numpy.flatnonzero(found == minutes).tolist()
+        else:
+            positions = [
+                position for position, spent in enumerate(found)
+                if spent == minutes]
+        return [self._task(position) for position in positions]
+
+    def arrays(self):
+        """
+        Returns the TaskArrays of the list, mapped over the file until it is
+        loaded. It returns None if NumPy is not available.
+        """
+        if self._list is not None:
+            return self._list.arrays()
+        if numpy is None or not len(self.mapped):
+            return None
+        if self._arrays is None:
+            self._arrays = TaskArrays(
+                self, self.mapped.dates(), self.mapped.minutes())
+        return self._arrays
+
+    def _count(self):
+        return len(self.mapped)
+
+    def _release(self):
+        """
+        Drops the tasks kept and unmaps the file, as it is not needed once
+        they are loaded.
+        """
+        super()._release()
+        self._arrays = None
+        self.storage.close()
+
+    def _task(self, position):
+        """Returns the task of the record at the position given"""
+        task = self._tasks.get(position)
+        if task is None:
+            task = Task.from_values(*self.mapped.values(position))
+            profiling.count('rows parsed')
+            self._tasks[position] = task
+            self._positions[task] = position
+        return task
+
+
+def import_csv(csv_file, binary_file):
+    """Copies a csv log, with its journal, into a binary log"""
+    return copy_log(JournalStorage(csv_file, 0), BinaryStorage(binary_file))
+
+
+def export_csv(binary_file, csv_file):
+    """Copies a binary log into a csv log"""
+    return copy_log(BinaryStorage(binary_file), CsvStorage(csv_file))
@@ -0,0 +1,273 @@
+"""
+Command line of the Work Log: its menus, or commands without any prompt.
+
+Commands import, search and report entries, and without one the menus run.
+
+Examples:
+    python work_log.py
+    python work_log.py --journal --group-commit 5
+    python work_log.py import < entries.csv
+    python work_log.py import --format jsonl < entries.jsonl
+    python work_log.py search --from 01/01/2018 --to 31/12/2018 --text party
+    python work_log.py search --regex "^Call" --format jsonl
+    python work_log.py report --by week --from 01/01/2018 --to 31/12/2018
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import sys
+
+import patterns
+import profiling
+import utils
+from storage import FIELDNAMES
+from menu import MainMenu
+from task import (
+    And, Contains, DateBetween, DateIs, Matches, Or, Task, TaskSearch, TimeIs)
+from work_log import WorkLog
+
+FORMATS = ('csv', 'jsonl')
+
+
+def read_logs(stream, file_format='csv'):
+    """
+    Yields the logs read from a csv or JSON lines stream. JSON lines are
+    yielded as text, to be parsed by read_tasks along with the other checks.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def parse_log(log):
+    """
+    Returns a log given as a dict or as a JSON line. It raises ValueError
+    if the line is not valid JSON or not an object.
+    """
+    if isinstance(log, str):
+        try:
+            log = json.loads(log)
+        except ValueError as error:
+            raise ValueError("not valid JSON: {}".format(error))
+    if not isinstance(log, dict):
+        raise ValueError("an entry must be an object")
+    return log
+
+
+def parse_regex(pattern):
+    """Returns a pattern compiled, for argparse to tell when it's not valid"""
+    try:
+        return patterns.compile(pattern)
+    except re.error as error:
+        raise argparse.ArgumentTypeError(
+            "not a valid regular expression: {}".format(error))
+
+
+def read_tasks(logs):
+    """
+    Returns a list of tasks created from logs, and a list with the errors of
+    the logs that are not valid. Dates and times are checked the same way as
+    when the user enters them.
+    """
+    tasks = []
+    errors = []
+    for number, log in enumerate(logs, 1):
+        try:
+            log = parse_log(log)
+            if not log.get('Title'):
+                raise ValueError("a title is required")
+            time = log.get('Time')
+            if isinstance(time, (bool, float)):
+                raise ValueError("time spent must be a whole number")
+            time = int(time)
+            if time <= 0:
+                raise ValueError("time spent must be a positive number")
+            tasks.append(Task.from_values(
+                log['Title'], utils.parse_date(log.get('Date') or ''),
+                str(time), log.get('Notes') or '', log.get('Id')))
+        except (TypeError, ValueError) as error:
+            errors.append("Entry {}: {}".format(number, error))
+    return tasks, errors
+
+
+def write_tasks(tasks, stream, file_format='csv'):
+    """
+    Writes each task to a stream as soon as it is got, as csv rows (with a
+    header) or as JSON lines.
+    """
+    if file_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for task in tasks:
+            writer.writerow(task.log())
+    else:
+        for task in tasks:
+            stream.write(json.dumps(task.log()) + '\n')
+
+
+def get_predicate(args):
+    """
+    Returns the predicate of the filters given in the command line, all of
+    them combined with And (or Or with --any). None means all tasks.
+    """
+    predicates = []
+    if args.date:
+        predicates.append(DateIs(args.date))
+    if args.start or args.end:
+        predicates.append(DateBetween(
+            args.start or datetime.date.min, args.end or datetime.date.max))
+    if args.time is not None:
+        predicates.append(TimeIs(args.time))
+    if args.text is not None:
+        predicates.append(Contains(args.text))
+    if args.regex is not None:
+        predicates.append(Matches(args.regex))
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    return Or(*predicates) if args.any else And(*predicates)
+
+
+def import_command(log, args):
+    """Imports the entries read from stdin into the log"""
+    tasks, errors = read_tasks(read_logs(sys.stdin, args.format))
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        print("Nothing imported: {} entries are not valid".format(
+            len(errors)), file=sys.stderr)
+        return 1
+    added = log.import_tasks(tasks)
+    print("{} entries imported".format(added), file=sys.stderr)
+    if added < len(tasks):
+        print("{} entries were already in the log".format(
+            len(tasks) - added), file=sys.stderr)
+    return 0
+
+
+def search_command(log, args):
+    """Writes the entries of the log that meet the filters to stdout"""
+    predicate = get_predicate(args)
+    if predicate is None:
+        tasks = log.TASKS
+    else:
+        tasks = TaskSearch.stream(log.TASKS, predicate)
+    write_tasks(tasks, sys.stdout, args.format)
+    return 0
+
+
+def report_command(log, args):
+    """
+    Writes the time spent per day, week, month or title to stdout, or just
+    the total with --by total.
+    """
+    if args.by == 'total':
+        minutes, count = log.totals().total(args.start, args.end)
+        fieldnames = ['Minutes', 'Tasks']
+        logs = [{'Minutes': minutes, 'Tasks': count}]
+    else:
+        name = args.by.title()
+        fieldnames = [name, 'Minutes', 'Tasks']
+        logs = (
+            {name: value, 'Minutes': minutes, 'Tasks': count}
+            for value, minutes, count
+            in log.report(args.by, args.start, args.end))
+    if args.format == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(logs)
+    else:
+        for log in logs:
+            sys.stdout.write(json.dumps(log) + '\n')
+    return 0
+
+
+def get_parser():
+    """Returns the parser of the command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog='work_log.py', description=__doc__.split('\n')[1])
+    parser.add_argument('--file', default='log.csv', help='log file to use')
+    parser.add_argument(
+        '--journal', action='store_true', help='journal changes')
+    parser.add_argument(
+        '--lazy', action='store_true', help='read the log only when needed')
+    parser.add_argument(
+        '--shards', choices=('month', 'year'),
+        help='keep the log in a directory with a file per month or year')
+    parser.add_argument(
+        '--group-commit', type=float, default=0, metavar='SECONDS',
+        help='save together the changes made within SECONDS')
+    parser.add_argument(
+        '--profile', metavar='FILE',
+        help='time the hot paths and dump the stats to FILE on exit, as'
+             ' JSON or in cProfile format if FILE ends in .prof')
+    commands = parser.add_subparsers(
+        dest='command', help='run without a command to use the menus')
+
+    importer = commands.add_parser(
+        'import', help='import entries from stdin')
+    importer.add_argument('--format', choices=FORMATS, default='csv')
+    importer.set_defaults(run=import_command)
+
+    search = commands.add_parser(
+        'search', help='write entries that meet all filters to stdout')
+    search.add_argument('--format', choices=FORMATS, default='csv')
+    search.add_argument(
+        '--date', type=utils.parse_date, help='exact date, DD/MM/YYYY')
+    search.add_argument(
+        '--from', dest='start', type=utils.parse_date, help='first date')
+    search.add_argument(
+        '--to', dest='end', type=utils.parse_date, help='last date')
+    search.add_argument('--time', type=int, help='time spent in minutes')
+    search.add_argument('--text', help='text within Title or Notes')
+    search.add_argument(
+        '--regex', type=parse_regex, help='regular expression')
+    search.add_argument(
+        '--any', action='store_true', help='meet any filter instead of all')
+    search.set_defaults(run=search_command)
+
+    report = commands.add_parser(
+        'report', help='write the time spent per period or title to stdout')
+    report.add_argument('--format', choices=FORMATS, default='csv')
+    report.add_argument(
+        '--by', choices=('day', 'week', 'month', 'title', 'total'),
+        default='month', help='what to add up the time spent by')
+    report.add_argument(
+        '--from', dest='start', type=utils.parse_date, help='first date')
+    report.add_argument(
+        '--to', dest='end', type=utils.parse_date, help='last date')
+    report.set_defaults(run=report_command)
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs the command given in the command line, or the menus if there is
+    none, and returns its exit code. Changes kept by group commit are saved
+    and the log is closed before it returns.
+    """
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.shards and os.path.isfile(args.file):
+        parser.error(
+            "--shards needs a directory as --file: {}".format(args.file))
+    if args.profile:
+        profiling.enable(args.profile)
+    log = WorkLog(
+        args.file, journal=args.journal, lazy=args.lazy,
+        group_commit=args.group_commit, shards=args.shards,
+        watch=args.command is None)
+    try:
+        if args.command is None:
+            MainMenu(log).run()
+            return 0
+        return args.run(log, args)
+    finally:
+        log.close()
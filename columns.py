@@ -0,0 +1,306 @@
+import bisect
+import datetime
+import weakref
+from array import array
+
+import utils
+from task import Task, TaskArrays, minutes_of, numpy
+
+
+class StringPool:
+    """
+    Stores every distinct string once and identifies it by a number, so
+    repeated titles and notes take the space of a single integer per row.
+    """
+
+    def __init__(self):
+        """Initializes the pool with the empty string as number 0"""
+        self.strings = ['']
+        self.numbers = {'': 0}
+        self.lowered = []
+
+    def add(self, string):
+        """Returns the number of a string, adding it to the pool if needed"""
+        if string is None:
+            string = ''
+        number = self.numbers.get(string)
+        if number is None:
+            number = self.numbers[string] = len(self.strings)
+            self.strings.append(string)
+        return number
+
+    def lower(self):
+        """
+        Returns a list with the lowercased version of every string in the
+        pool. It is computed once and extended as new strings are added.
+        """
+        for string in self.strings[len(self.lowered):]:
+            self.lowered.append(string.lower())
+        return self.lowered
+
+
+class TaskColumns:
+    """
+    Column based storage of a sorted list of tasks, used instead of a TaskList
+    when a log is too big to keep a Task object per entry. Each column is a
+    compact array: the sort key (date ordinal and sequence number packed in
+    one integer), the minutes spent, and the numbers of the time, title and
+    notes in a StringPool, plus the task ids. The time is kept as written,
+    and the minutes only to filter by them. Task objects are only created as
+    views when an entry is accessed, and any change made to a view is written
+    back with update. The columns also work as the date, text and id indexes
+    of the list.
+    """
+    SEQ_BITS = 32
+    # Minutes of a time spent that is not a number written as such
+    NO_MINUTES = -2 ** 31
+
+    def __init__(self, tasks=()):
+        """
+        Builds the columns from any iterable of tasks, keeping same day tasks
+        in the order they come.
+        """
+        self.pool = StringPool()
+        self._keys = array('q')
+        self._minutes = array('i')
+        self._times = array('i')
+        self._titles = array('i')
+        self._notes = array('i')
+        self._ids = []
+        self._key_by_id = {}
+        self._seq = 0
+        self._no_minutes = 0
+        self._views = weakref.WeakValueDictionary()
+        self._key_of = weakref.WeakKeyDictionary()
+        self._arrays = None
+        self.indexes = {'date': self, 'text': self, 'id': self}
+
+        self._fill([self._row(task) for task in tasks])
+
+    @classmethod
+    def from_logs(cls, logs):
+        """
+        Builds the columns straight from the logs of a csv file, without
+        creating a Task object for each of them.
+        """
+        return cls(
+            Task.from_values(
+                log['Title'],
+                utils.parse_date(log['Date']),
+                log['Time'], log['Notes'], log.get('Id'))
+            for log in logs)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, index):
+        """Slices are returned as plain lists of task views"""
+        if isinstance(index, slice):
+            return [self._view(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list index out of range")
+        return self._view(index)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self._view(position)
+
+    def __contains__(self, task):
+        return task in self._key_of
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "TaskColumns({} tasks)".format(len(self))
+
+    def index(self, task):
+        """Returns the position of the task in the list"""
+        try:
+            return self._position(self._key_of[task])
+        except KeyError:
+            raise ValueError("task is not in list") from None
+
+    def add(self, task):
+        """Inserts a new task after any other task with the same date"""
+        row = self._row(task)
+        self._insert(row)
+        self._track(row[0], task)
+
+    append = add
+
+    def extend(self, tasks):
+        """
+        Adds many new tasks at once, sorting all the rows just once instead
+        of inserting them one by one.
+        """
+        rows = list(zip(*self._columns()))
+        for task in tasks:
+            row = self._row(task)
+            rows.append(row)
+            self._track(row[0], task)
+        self._fill(rows)
+
+    def remove(self, task):
+        """Removes a task locating it by its key rather than by equality"""
+        key = self._key_of.pop(task, None)
+        if key is None:
+            raise ValueError("task is not in list")
+        self._delete(self._position(key))
+        self._views.pop(key, None)
+
+    def update(self, task):
+        """
+        Writes back the attributes of a task view after it has been edited,
+        and moves it to its new position. Its order among the tasks of the
+        same date doesn't change.
+        """
+        old_key = self._key_of[task]
+        self._delete(self._position(old_key))
+        self._views.pop(old_key, None)
+        row = self._row(task, old_key & ((1 << self.SEQ_BITS) - 1))
+        self._insert(row)
+        self._track(row[0], task)
+
+    def logs(self):
+        """
+        Returns an iterator over the logs of all tasks, to be saved, without
+        creating task views.
+        """
+        strings = self.pool.strings
+        for position, key in enumerate(self._keys):
+            date = datetime.date.fromordinal(key >> self.SEQ_BITS)
+            yield {
+                'Title': strings[self._titles[position]],
+                'Date': utils.format_date(date),
+                'Time': strings[self._times[position]],
+                'Notes': strings[self._notes[position]],
+                'Id': self._ids[position],
+            }
+
+    def arrays(self):
+        """
+        Returns the TaskArrays of the columns, copied straight from them
+        without creating task views. It returns None if NumPy is not
+        available or any time spent is not a number written as such.
+        """
+        if numpy is None or self._no_minutes:
+            return None
+        if self._arrays is None:
+            keys = numpy.frombuffer(self._keys, dtype=numpy.int64)
+            self._arrays = TaskArrays(
+                self, keys >> self.SEQ_BITS,
+                numpy.frombuffer(self._minutes, dtype=numpy.int32).copy())
+        return self._arrays
+
+    def on(self, date):
+        """Returns a list of the tasks of a date"""
+        return self.between(date, date)
+
+    def between(self, start_date, end_date):
+        """Returns a list of the tasks between two dates, both included"""
+        first = bisect.bisect_left(
+            self._keys, start_date.toordinal() << self.SEQ_BITS)
+        last = bisect.bisect_left(
+            self._keys, (end_date.toordinal() + 1) << self.SEQ_BITS)
+        return [self._view(position) for position in range(first, last)]
+
+    def search(self, text):
+        """
+        Returns a list of the tasks which contain the text given within their
+        Title or Notes, ignoring case. Each distinct string is checked once.
+        """
+        text = text.lower()
+        matches = [text in string for string in self.pool.lower()]
+        return [
+            self._view(position) for position in range(len(self))
+            if matches[self._titles[position]]
+            or matches[self._notes[position]]
+        ]
+
+    def get(self, task_id):
+        """Returns the task with the id given, or None"""
+        key = self._key_by_id.get(task_id)
+        if key is None:
+            return None
+        return self._view(self._position(key))
+
+    def _row(self, task, seq=None):
+        """Returns the values of the columns for a task"""
+        if seq is None:
+            seq = self._seq
+            self._seq += 1
+        try:
+            minutes = minutes_of(task.time)
+        except (TypeError, ValueError):
+            minutes = self.NO_MINUTES
+        return (
+            task.date.toordinal() << self.SEQ_BITS | seq, minutes,
+            self.pool.add(task.time), self.pool.add(task.title),
+            self.pool.add(task.notes), task.id)
+
+    def _fill(self, rows):
+        """Fills all columns with the rows given, sorted by key"""
+        rows.sort(key=lambda row: row[0])
+        self._arrays = None
+        for column in self._columns():
+            del column[:]
+        for row in rows:
+            for column, value in zip(self._columns(), row):
+                column.append(value)
+        self._key_by_id = {row[-1]: row[0] for row in rows}
+        self._no_minutes = self._minutes.count(self.NO_MINUTES)
+
+    def _insert(self, row):
+        """Inserts the values of a row in all columns"""
+        position = bisect.bisect_left(self._keys, row[0])
+        self._arrays = None
+        for column, value in zip(self._columns(), row):
+            column.insert(position, value)
+        self._key_by_id[row[-1]] = row[0]
+        self._no_minutes += row[1] == self.NO_MINUTES
+
+    def _delete(self, position):
+        """Deletes the row at the position given from all columns"""
+        self._arrays = None
+        task_id = self._ids[position]
+        if self._key_by_id.get(task_id) == self._keys[position]:
+            del self._key_by_id[task_id]
+        self._no_minutes -= self._minutes[position] == self.NO_MINUTES
+        for column in self._columns():
+            del column[position]
+
+    def _columns(self):
+        """Returns the columns, in the same order as the values of a row"""
+        return (
+            self._keys, self._minutes, self._times, self._titles,
+            self._notes, self._ids)
+
+    def _track(self, key, task):
+        """Registers a task as the view of the row with the key given"""
+        self._views[key] = task
+        self._key_of[task] = key
+
+    def _view(self, position):
+        """
+        Returns the task view of the row at the position given. Views are
+        kept while they are used somewhere else, so the same entry is always
+        the same task object.
+        """
+        key = self._keys[position]
+        task = self._views.get(key)
+        if task is None:
+            strings = self.pool.strings
+            task = Task.from_values(
+                strings[self._titles[position]],
+                datetime.date.fromordinal(key >> self.SEQ_BITS),
+                strings[self._times[position]],
+                strings[self._notes[position]], self._ids[position])
+            self._track(key, task)
+        return task
+
+    def _position(self, key):
+        """Returns the position of the row stored under the key given"""
+        return bisect.bisect_left(self._keys, key)
@@ -0,0 +1,460 @@
+import array
+import bisect
+import calendar
+import datetime
+import re
+
+import utils
+
+
+class DateIndex:
+    """
+    Index of tasks by date. It holds a sorted list of the distinct dates in
+    the log and a bucket for each date with the tasks of that day, in the
+    same order they have in the log. It is kept up to date by a TaskList,
+    which calls build, add and remove with the (date, sequence) key of each
+    task.
+    """
+
+    def __init__(self):
+        """Initializes an empty index"""
+        self.dates = []
+        self.buckets = {}
+
+    def build(self, entries):
+        """
+        Fills the index from a list of (key, task) pairs already sorted by
+        key.
+        """
+        self.dates = []
+        self.buckets = {}
+        for (date, seq), task in entries:
+            bucket = self.buckets.get(date)
+            if bucket is None:
+                self.dates.append(date)
+                bucket = self.buckets[date] = ([], [])
+            bucket[0].append(seq)
+            bucket[1].append(task)
+
+    def add(self, key, task):
+        """Adds a task to the bucket of its date"""
+        date, seq = key
+        bucket = self.buckets.get(date)
+        if bucket is None:
+            bisect.insort(self.dates, date)
+            bucket = self.buckets[date] = ([], [])
+        position = bisect.bisect_left(bucket[0], seq)
+        bucket[0].insert(position, seq)
+        bucket[1].insert(position, task)
+
+    def remove(self, key, task):
+        """Removes a task from the bucket of its date"""
+        date, seq = key
+        seqs, tasks = self.buckets[date]
+        position = bisect.bisect_left(seqs, seq)
+        del seqs[position]
+        del tasks[position]
+        if not seqs:
+            del self.buckets[date]
+            del self.dates[bisect.bisect_left(self.dates, date)]
+
+    def on(self, date):
+        """Returns a list of the tasks of a date"""
+        bucket = self.buckets.get(date)
+        if bucket is None:
+            return []
+        return list(bucket[1])
+
+    def between(self, start_date, end_date):
+        """Returns a list of the tasks between two dates, both included"""
+        found = []
+        first = bisect.bisect_left(self.dates, start_date)
+        last = bisect.bisect_right(self.dates, end_date)
+        for date in self.dates[first:last]:
+            found.extend(self.buckets[date][1])
+        return found
+
+
+class IdIndex:
+    """
+    Index of tasks by id, to find any task of the log at once. It is kept
+    up to date by a TaskList, like any other index.
+    """
+
+    def __init__(self):
+        """Initializes an empty index"""
+        self.tasks = {}
+
+    def build(self, entries):
+        """Fills the index from a list of (key, task) pairs"""
+        self.tasks = {task.id: task for _, task in entries}
+
+    def add(self, key, task):
+        """Adds a task to the index"""
+        self.tasks[task.id] = task
+
+    def remove(self, key, task):
+        """Removes a task from the index"""
+        if self.tasks.get(task.id) is task:
+            del self.tasks[task.id]
+
+    def get(self, task_id):
+        """Returns the task with the id given, or None"""
+        return self.tasks.get(task_id)
+
+
+class TextIndex:
+    """
+    Inverted index over the lowercased Title and Notes of the tasks. It keeps
+    the words of each task and every group of GRAM consecutive characters
+    (n-grams), so a substring search only needs to check the tasks that have
+    the rarest n-gram of the text searched, instead of every task in the
+    log. Shorter texts are looked up through the words of the index.
+
+    Building the postings costs as much as many scans, so the first SCANS
+    searches just scan the tasks and only the next one builds them. Each
+    task indexed gets a number, and the postings are compact arrays of
+    those numbers. Removed tasks only free their number, and the postings
+    are built again once most numbers are free. For each task just its key
+    and the Title and Notes it was indexed with are kept.
+    """
+    GRAM = 3
+    WORD = re.compile(r'\w+')
+    SCANS = 20
+
+    def __init__(self):
+        """Initializes an empty index"""
+        self.build([])
+
+    def build(self, entries):
+        """Keeps the tasks of a list of (key, task) pairs to be indexed"""
+        self.grams = None
+        self.words = None
+        self.tasks = []
+        self.numbers = {}
+        self.scans = 0
+        self.entries = {
+            task: (key, task.title, task.notes) for key, task in entries}
+
+    def add(self, key, task):
+        """Adds the words and n-grams of a task to the index"""
+        self.entries[task] = (key, task.title, task.notes)
+        if self.grams is not None:
+            self.post(task, task.title, task.notes)
+
+    def remove(self, key, task):
+        """Removes a task from the index, freeing its number"""
+        del self.entries[task]
+        if self.grams is None:
+            return
+        self.tasks[self.numbers.pop(task)] = None
+        if len(self.numbers) * 2 < len(self.tasks):
+            self.grams = None
+            self.words = None
+
+    def post(self, task, title, notes):
+        """Numbers a task and adds it to the postings of its terms"""
+        number = len(self.tasks)
+        self.tasks.append(task)
+        self.numbers[task] = number
+        grams, words = self.terms(title, notes)
+        for postings, terms in ((self.grams, grams), (self.words, words)):
+            for term in terms:
+                numbers = postings.get(term)
+                if numbers is None:
+                    numbers = postings[term] = array.array('I')
+                numbers.append(number)
+
+    def postings(self):
+        """Builds the postings of every task, if they are not built"""
+        if self.grams is None:
+            self.grams = {}
+            self.words = {}
+            self.tasks = []
+            self.numbers = {}
+            for task, (_, title, notes) in self.entries.items():
+                self.post(task, title, notes)
+
+    def search(self, text):
+        """
+        Returns a list of the tasks which contain the text given within their
+        Title or Notes, ignoring case. Tasks are in the same order as in the
+        log.
+        """
+        text = text.lower()
+        if self.grams is None and self.scans < self.SCANS:
+            self.scans += 1
+            candidates = self.entries
+        elif len(text) >= self.GRAM:
+            self.postings()
+            postings = [self.grams.get(gram) for gram in self.ngrams(text)]
+            if None in postings:
+                return []
+            candidates = self.numbered(min(postings, key=len))
+        elif self.WORD.fullmatch(text):
+            # A short word can only be found inside one of the words indexed
+            self.postings()
+            numbers = set()
+            for word, found in self.words.items():
+                if text in word:
+                    numbers.update(found)
+            candidates = self.numbered(numbers)
+        else:
+            candidates = self.entries
+
+        # Candidates are checked to keep only the actual matches
+        found = [
+            task for task in candidates
+            if any(text in field for field in self.texts(task))
+        ]
+        return sorted(found, key=lambda task: self.entries[task][0])
+
+    def numbered(self, numbers):
+        """Returns the tasks with the numbers given, skipping removed ones"""
+        tasks = self.tasks
+        return [
+            tasks[number] for number in numbers
+            if tasks[number] is not None]
+
+    @staticmethod
+    def texts(task):
+        """Returns the lowercased texts of a task that are indexed"""
+        return (task.title or '').lower(), (task.notes or '').lower()
+
+    @classmethod
+    def terms(cls, title, notes):
+        """Returns the sets of n-grams and words of a Title and Notes"""
+        grams = set()
+        words = set()
+        for text in ((title or '').lower(), (notes or '').lower()):
+            grams.update(cls.ngrams(text))
+            words.update(cls.WORD.findall(text))
+        return grams, words
+
+    @classmethod
+    def ngrams(cls, text):
+        """Returns the set of n-grams of a text"""
+        return {
+            text[i:i + cls.GRAM] for i in range(len(text) - cls.GRAM + 1)}
+
+
+class TotalsIndex:
+    """
+    Minutes spent and number of tasks per day, ISO week, month and title,
+    kept up to date as tasks are added and removed. What was added for each
+    task is kept, so it is removed right after the task is edited. The
+    totals of the days are also held in Fenwick trees over the span of days
+    of the log, so a change and the totals of any range of dates both take
+    a logarithmic time. The span only grows, widening on both sides, when a
+    task falls out of it. Weeks and months within a range take their totals
+    as they are, and only the ones cut by the range are added up from the
+    trees.
+    """
+    GROUPS = ('day', 'week', 'month', 'title')
+
+    def __init__(self):
+        """Initializes an empty index"""
+        self.build([])
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        """Returns the index of an iterable of tasks"""
+        index = cls()
+        for task in tasks:
+            index.add(None, task)
+        return index
+
+    def build(self, entries):
+        """Fills the index from a list of (key, task) pairs"""
+        self.totals = {group: {} for group in self.GROUPS}
+        self.entries = {}
+        self.dates = []
+        self._first = None
+        self._minutes = [0]
+        self._counts = [0]
+        for key, task in entries:
+            self.add(key, task)
+
+    def add(self, key, task):
+        """Adds the time spent in a task to its totals"""
+        values = tuple(
+            task.title or '' if group == 'title'
+            else self.group(group, task.date)
+            for group in self.GROUPS)
+        self.entries[task] = (self.minutes(task), values)
+        self._change(self.minutes(task), values, 1)
+
+    def remove(self, key, task):
+        """Subtracts the time spent in a task from its totals"""
+        self._change(*self.entries.pop(task), -1)
+
+    def total(self, start_date=None, end_date=None):
+        """
+        Returns the minutes spent and the number of tasks between two dates,
+        both included. Without dates, the totals of the whole log.
+        """
+        first = 0 if start_date is None else start_date.toordinal()
+        last = None if end_date is None else end_date.toordinal() + 1
+        if last is not None and last <= first:
+            return 0, 0
+        minutes, count = self._sums(last)
+        before, count_before = self._sums(first)
+        return minutes - before, count - count_before
+
+    def report(self, group, start_date=None, end_date=None):
+        """
+        Returns a sorted list of (name, minutes, count) with the totals of
+        each day, week, month or title. Totals of a range of dates are added
+        up from the days in the range, so titles can't be given a range.
+        """
+        if start_date is None and end_date is None:
+            totals = self.totals[group]
+        elif group == 'title':
+            raise ValueError("title totals can't be given a range of dates")
+        elif group == 'day':
+            days = self.totals['day']
+            first = 0
+            last = len(self.dates)
+            if start_date is not None:
+                first = bisect.bisect_left(self.dates, start_date)
+            if end_date is not None:
+                last = bisect.bisect_right(self.dates, end_date)
+            totals = {date: days[date] for date in self.dates[first:last]}
+        else:
+            start_date = start_date or datetime.date.min
+            end_date = end_date or datetime.date.max
+            totals = {}
+            for value, total in self.totals[group].items():
+                first, last = self.span(group, value)
+                if last < start_date or first > end_date:
+                    continue
+                if not (start_date <= first and last <= end_date):
+                    total = self.total(
+                        max(first, start_date), min(last, end_date))
+                    if not total[1]:
+                        continue
+                totals[value] = total
+        return [
+            (self.name(group, value), minutes, count)
+            for value, (minutes, count) in sorted(totals.items())
+        ]
+
+    def _change(self, minutes, values, sign):
+        """
+        Adds (sign 1) or subtracts (sign -1) the minutes of a task from the
+        totals of the values it is grouped by.
+        """
+        minutes *= sign
+        for group, value in zip(self.GROUPS, values):
+            totals = self.totals[group]
+            total = totals.get(value)
+            if total is None:
+                total = totals[value] = [0, 0]
+                if group == 'day':
+                    bisect.insort(self.dates, value)
+            total[0] += minutes
+            total[1] += sign
+            if not total[1]:
+                del totals[value]
+                if group == 'day':
+                    del self.dates[bisect.bisect_left(self.dates, value)]
+        self._add_day(values[0].toordinal(), minutes, sign)
+
+    def _add_day(self, ordinal, minutes, count):
+        """
+        Adds minutes and tasks to the trees of the day given. A day out of
+        their span grows them, and they are built with its totals already.
+        """
+        size = len(self._minutes) - 1
+        if self._first is None or not 0 <= ordinal - self._first < size:
+            self._grow(ordinal)
+            return
+        position = ordinal - self._first + 1
+        while position < len(self._minutes):
+            self._minutes[position] += minutes
+            self._counts[position] += count
+            position += position & -position
+
+    def _grow(self, ordinal):
+        """
+        Makes the span of the trees include the day given, widening it by its
+        size on each side, and builds them again from the totals of the days.
+        """
+        first = last = ordinal
+        if self._first is not None:
+            size = len(self._minutes) - 1
+            first = max(min(first, self._first - size), 1)
+            last = max(last, self._first + 2 * size - 1)
+        size = last - first + 1
+        minutes = [0] * (size + 1)
+        counts = [0] * (size + 1)
+        for date, (spent, count) in self.totals['day'].items():
+            position = date.toordinal() - first + 1
+            minutes[position] += spent
+            counts[position] += count
+        # The trees are built in linear time, each node adding itself to its
+        # parent
+        for position in range(1, size + 1):
+            parent = position + (position & -position)
+            if parent <= size:
+                minutes[parent] += minutes[position]
+                counts[parent] += counts[position]
+        self._first = first
+        self._minutes = minutes
+        self._counts = counts
+
+    def _sums(self, ordinal=None):
+        """
+        Returns the minutes and number of tasks of the days before the
+        ordinal given, or of all days if it is None.
+        """
+        if self._first is None:
+            return 0, 0
+        size = len(self._minutes) - 1
+        position = size
+        if ordinal is not None:
+            position = min(max(ordinal - self._first, 0), size)
+        minutes = count = 0
+        while position > 0:
+            minutes += self._minutes[position]
+            count += self._counts[position]
+            position -= position & -position
+        return minutes, count
+
+    @staticmethod
+    def group(group, date):
+        """Returns the value a date is grouped by: day, week or month"""
+        if group == 'day':
+            return date
+        if group == 'week':
+            return tuple(date.isocalendar())[:2]
+        return date.year, date.month
+
+    @staticmethod
+    def span(group, value):
+        """Returns the first and last dates of a week or month"""
+        if group == 'week':
+            first = datetime.date.fromisocalendar(*value, 1)
+            return first, first + datetime.timedelta(days=6)
+        year, month = value
+        days = calendar.monthrange(year, month)[1]
+        return datetime.date(year, month, 1), datetime.date(year, month, days)
+
+    @staticmethod
+    def name(group, value):
+        """Returns the name of a day, week, month or title to show"""
+        if group == 'day':
+            return utils.format_date(value)
+        if group == 'week':
+            return '{}-W{:02}'.format(*value)
+        if group == 'month':
+            return '{1:02}/{0}'.format(*value)
+        return value
+
+    @staticmethod
+    def minutes(task):
+        """Returns the minutes spent in a task, or 0 if they aren't a number"""
+        try:
+            return int(task.time)
+        except (TypeError, ValueError):
+            return 0
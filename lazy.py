@@ -0,0 +1,132 @@
+import bisect
+import csv
+import io
+
+import profiling
+import utils
+from storage import row_id
+from task import ProxyTaskList, Task
+
+
+class LazyTaskList(ProxyTaskList):
+    """
+    A sorted list of tasks read from a csv file only when it is needed. On
+    first access the file is scanned once to build an index with the offset,
+    length and date of each row, without creating any Task. Rows are parsed
+    into tasks as they are accessed. Date lookups are answered with the
+    index, while id lookups load the full list. The file is kept open from
+    the scan on, so the rows are read from the same file even if another
+    process replaces it meanwhile.
+    """
+
+    def __init__(self, file, build):
+        """
+        Initializes the list with the path of the csv file and the function
+        that builds the full list of tasks from an iterable of tasks. The
+        file is not read until the list is used.
+        """
+        super().__init__(build)
+        self.file = file
+        self._offsets = None
+        self._lengths = None
+        self._numbers = None
+        self._dates = None
+        self._fieldnames = None
+        self._handle = None
+
+    def __repr__(self):
+        return "LazyTaskList({!r})".format(self.file)
+
+    def between(self, start_date, end_date):
+        """Returns a list of the tasks between two dates, both included"""
+        if self._list is not None:
+            return self._list.indexes['date'].between(start_date, end_date)
+        dates = self._open()
+        first = bisect.bisect_left(dates, start_date.toordinal())
+        last = bisect.bisect_right(dates, end_date.toordinal())
+        return [self._task(position) for position in range(first, last)]
+
+    def _count(self):
+        return len(self._open())
+
+    def _release(self):
+        """Drops the tasks kept and closes the file, once they are loaded"""
+        super()._release()
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    @profiling.timed()
+    def _open(self):
+        """
+        Scans the csv file to build the index of its rows, sorted by date,
+        the first time it is called. It returns the sorted date ordinals.
+        """
+        if self._dates is not None:
+            return self._dates
+        rows = []
+        try:
+            self._handle = open(self.file, 'rb')
+        except FileNotFoundError:
+            pass
+        else:
+            header = self._handle.readline()
+            if header.strip():
+                self._fieldnames = self._parse(header)
+                rows = self._scan(self._handle, len(header))
+        rows.sort()
+        self._dates = [row[0] for row in rows]
+        self._offsets = [row[2] for row in rows]
+        self._lengths = [row[3] for row in rows]
+        self._numbers = [row[1] for row in rows]
+        return self._dates
+
+    def _scan(self, csvfile, offset):
+        """
+        Returns a list with the date ordinal, number, offset and length of
+        every row of a csv file, starting at the offset given.
+        """
+        rows = []
+        date_column = self._fieldnames.index('Date')
+        for row in self.rows(csvfile):
+            if row.strip():
+                fields = self._parse(row)
+                date = utils.parse_date(fields[date_column]).toordinal()
+                rows.append((date, len(rows), offset, len(row)))
+            offset += len(row)
+        return rows
+
+    def _task(self, position):
+        """Returns the task of the row at the position given of the index"""
+        task = self._tasks.get(position)
+        if task is None:
+            self._handle.seek(self._offsets[position])
+            fields = self._parse(self._handle.read(self._lengths[position]))
+            profiling.count('rows parsed')
+            log = dict(zip(self._fieldnames, fields))
+            if not log.get('Id'):
+                log['Id'] = row_id(self._numbers[position], log)
+            task = Task(**log)
+            self._tasks[position] = task
+            self._positions[task] = position
+        return task
+
+    @staticmethod
+    def rows(csvfile):
+        """
+        Yields the raw rows of a csv file opened in binary mode. A row may
+        span several lines when a quoted field contains line breaks.
+        """
+        row = b''
+        for line in csvfile:
+            row += line
+            if row.count(b'"') % 2 == 0:
+                yield row
+                row = b''
+        if row:
+            yield row
+
+    @staticmethod
+    def _parse(row):
+        """Returns the fields of a raw csv row"""
+        return next(csv.reader(io.StringIO(row.decode('utf-8'), newline='')))
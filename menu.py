@@ -1,5 +1,6 @@
+import profiling
 import utils
-from task import TaskSearch
+from task import TaskSearch, TaskView
 
 
 class MenuOption:
@@ -35,6 +36,7 @@ class Menu:
     execute the function provided by the option until selected exit option.
     """
     options = []
+    partial_redraw = False
 
     def print_title(self):
         """Prints the menu header. Must be implemented on child classes"""
@@ -45,11 +47,17 @@ class Menu:
         for option in self.options:
             print(option)
 
+    @profiling.timed()
     def print_menu(self):
-        """Prints the whole menu on screen: Title and Options"""
-        utils.clear_screen()
-        self.print_title()
-        self.print_options()
+        """
+        Prints the whole menu on screen: Title and Options. The menu is
+        written at once, and menus with partial_redraw rewrite only the lines
+        that changed since they were last printed.
+        """
+        with utils.screen.frame(self.partial_redraw):
+            utils.clear_screen()
+            self.print_title()
+            self.print_options()
 
     def get_option(self):
         """
@@ -62,6 +70,7 @@ class Menu:
             for option in self.options:
                 if choice == option.key:
                     return option
+            utils.screen.invalidate()
             print("Sorry, you must choose a valid option")
 
     def get_function(self, option):
@@ -103,12 +112,13 @@ class Menu:
 class MainMenu(Menu):
     """
     Main menu of the Work Log application. It lets the user to create a new
-    entry, to search in existing entries or to quit program.
+    entry, to search in existing entries, to see reports of the time spent
+    or to quit program.
     """
 
     def __init__(self, log):
         """
-        Initializes the menu with a WorkLog object. It also creates three
+        Initializes the menu with a WorkLog object. It also creates four
         menu options to show and to operate with.
         """
         self.log = log
@@ -116,15 +126,70 @@ class MainMenu(Menu):
             MenuOption('a', 'Add new entry', log, 'add_task'),
             MenuOption(
                 'b', 'Search in existing entries', SearchMenu(log), 'run'),
-            MenuOption('c', 'Quit program', self, 'quit'),
+            MenuOption('c', 'Reports of time spent', ReportMenu(log), 'run'),
+            MenuOption('d', 'Quit program', self, 'quit'),
         ]
 
+    def print_menu(self):
+        """
+        Prints the menu after saving any group of changes whose time is over
+        and merging the changes other processes saved to the log meanwhile.
+        """
+        self.log.flush_expired()
+        self.log.refresh()
+        super().print_menu()
+
     def print_title(self):
         """Main Menu header"""
         print("WORK LOG")
         print("What would you like to do?")
 
 
+class ReportMenu(Menu):
+    """
+    Report menu of the WorkLog application. It shows the time spent per
+    day, week, month or title, or the total time spent between two dates.
+    """
+
+    def __init__(self, log):
+        """
+        Initializes the menu with a WorkLog object. It also creates six
+        menu options to show and to operate with.
+        """
+        self.log = log
+        self.options = [
+            MenuOption('a', 'Time per day', self, 'show_report', 'day'),
+            MenuOption('b', 'Time per week', self, 'show_report', 'week'),
+            MenuOption('c', 'Time per month', self, 'show_report', 'month'),
+            MenuOption('d', 'Time per title', self, 'show_report', 'title'),
+            MenuOption('e', 'Time in a range of dates', self, 'show_total'),
+            MenuOption('f', 'Return to menu', self, 'quit'),
+        ]
+
+    def print_title(self):
+        """Report Menu header"""
+        print("Which report do you want to see?")
+
+    def show_report(self, group):
+        """Prints the time spent per day, week, month or title"""
+        utils.clear_screen()
+        rows = self.log.report(group)
+        print("{:<30} {:>10} {:>7}".format(group.title(), 'Minutes', 'Tasks'))
+        for name, minutes, count in rows:
+            print("{:<30} {:>10} {:>7}".format(name, minutes, count))
+        minutes, count = self.log.totals().total()
+        print("{:<30} {:>10} {:>7}\n".format('Total', minutes, count))
+        input("Press enter to return to the menu")
+
+    def show_total(self):
+        """Prints the total time spent between two dates"""
+        start_date, end_date = utils.get_date_range()
+        minutes, count = self.log.totals().total(start_date, end_date)
+        print("\n{} minutes ({:.1f} hours) spent in {} tasks".format(
+            minutes, minutes / 60, count))
+        input("Press enter to return to the menu")
+
+
 class SearchMenu(Menu, TaskSearch):
     """
     Search menu of the WorkLog application. It lets the user to search in
@@ -154,64 +219,125 @@ class SearchMenu(Menu, TaskSearch):
     def side_run(self, result):
         """After the option chosen returns a list of tasks, they must be shown
         creating a TaskMenu object to display them."""
-        TaskMenu(self.log, 0, result).run()
+        TaskMenu(self.log, 0, self.log.view(result)).run()
 
 
 class TaskMenu(Menu):
     """
     Task menu of the WorkLog application. It lets the user to see, edit or
     delete any of the tasks shown one at a time. Menu lets user to pass through
-    tasks back and forth.
+    tasks back and forth, or through pages of tasks in list mode. Tasks of a
+    TaskView are pulled only a page ahead of the one shown, so the first
+    results are shown before the search ends.
     """
+    partial_redraw = True
+    PAGE_SIZE = 10
 
     def __init__(self, log, index=0, tasks=None):
         """
         Initializes the menu with a WorkLog object. By default, index is 0
         so the first task in the list is shown. If no tasks provided, this
-        menu gets all tasks from the log and shows them. It also creates five
+        menu gets all tasks from the log and shows them. It also creates the
         menu options to show and operate with. Menu options are different
-        depending on the index of the task shown, so options are changed
-        on __init__ in each case.
+        depending on the index of the task shown, so the options shown are
+        chosen again every time the index changes.
         """
         self.log = log
         self.index = index
+        self.list_mode = False
         if tasks is None:
             self.tasks = log.TASKS
         else:
             self.tasks = tasks
-        self.options = [
+        self.all_options = [
             MenuOption('p', '[P]revious', self, 'previous_task'),
             MenuOption('n', '[N]ext', self, 'next_task'),
-            MenuOption('e', '[E]dit', log, 'edit_task', index, self.tasks),
-            MenuOption('d', '[D]elete', log, 'delete_task', index, self.tasks),
+            MenuOption('e', '[E]dit', self, 'edit_task'),
+            MenuOption('d', '[D]elete', self, 'delete_task'),
+            MenuOption('l', '[L]ist', self, 'list_tasks'),
+            MenuOption('s', '[S]ingle', self, 'show_task'),
             MenuOption('r', '[R]eturn', self, 'quit')
         ]
-        self.options = self.get_options(index, len(self.tasks))
+        self.options = self.get_options(index, self.available())
+
+    def available(self):
+        """
+        Returns the number of tasks there are to show. The tasks of a
+        TaskView are only pulled up to the page after the index shown.
+        """
+        if isinstance(self.tasks, TaskView):
+            return self.tasks.pull(self.index + self.PAGE_SIZE * 2)
+        return len(self.tasks)
+
+    def count(self):
+        """
+        Returns the number of tasks as a text, as '≥N' while there are
+        tasks of a TaskView that haven't been pulled yet.
+        """
+        if isinstance(self.tasks, TaskView) and not self.tasks.complete:
+            return '≥{}'.format(self.tasks.known)
+        return str(len(self.tasks))
 
     def get_options(self, index, length):
         """
         Return a list of available options to show in the menu depending
-        on the index of the task and the lenght of tasks.
+        on the index of the task and the lenght of tasks. In list mode, the
+        index is the first task of the page.
         """
+        previous, following, edit, delete, to_list, single, back = (
+            self.all_options)
         if length == 0:
-            return [self.options[-1]]
-        if index == 0:
-            if length == 1:
-                return self.options[2:]
-            return self.options[1:]
-        if index == length - 1:
-            return [self.options[0]] + self.options[2:]
+            return [back]
         if index >= length:
             raise IndexError("list index out of range")
-        return self.options
+        step = self.PAGE_SIZE if self.list_mode else 1
+        options = []
+        if index > 0:
+            options.append(previous)
+        if index + step < length:
+            options.append(following)
+        if self.list_mode:
+            options.append(single)
+        else:
+            options.extend([edit, delete, to_list])
+        options.append(back)
+        return options
 
     def print_title(self):
         """Task Menu header"""
-        if self.tasks:
-            self.tasks[self.index].show()
-            print("Result {} of {}\n".format(self.index + 1, len(self.tasks)))
-        else:
+        if not self.available():
             print("There are no tasks to show.\n")
+        elif self.list_mode:
+            self.print_page()
+        else:
+            self.tasks[self.index].show()
+            print("Result {} of {}\n".format(self.index + 1, self.count()))
+
+    def print_page(self):
+        """Prints the page of tasks that starts at the index"""
+        page = self.tasks[self.index:self.index + self.PAGE_SIZE]
+        print("Results {}-{} of {}\n".format(
+            self.index + 1, self.index + len(page), self.count()))
+        for number, task in enumerate(page, self.index + 1):
+            print("{:>4}) {} {} ({} minutes)".format(
+                number, utils.format_date(task.date), task.title, task.time))
+        print()
+
+    def print_menu(self):
+        """
+        Prints the menu after saving any group of changes whose time is over
+        and merging the changes other processes saved to the log meanwhile,
+        keeping the index within the tasks left.
+        """
+        self.log.flush_expired()
+        if self.log.refresh():
+            length = self.available()
+            if self.index >= length:
+                self.index = max(length - 1, 0)
+                if self.list_mode:
+                    self.index -= self.index % self.PAGE_SIZE
+            self.options = self.get_options(self.index, length)
+        super().print_menu()
 
     def print_options(self):
         """Prints menu options in a different way than the base menu class"""
@@ -220,15 +346,33 @@ class TaskMenu(Menu):
     def side_run(self, result):
         """
         Upon completion of option chosen, index is updated to show the proper
-        task on next iteration of the menu.
+        task on next iteration of the menu, along with its options.
         """
         self.index = result
-        self.__init__(self.log, self.index, self.tasks)
+        self.options = self.get_options(self.index, self.available())
+
+    def edit_task(self):
+        """Edits the task shown and returns the index to show next"""
+        return self.log.edit_task(self.index, self.tasks)
+
+    def delete_task(self):
+        """Deletes the task shown and returns the index to show next"""
+        return self.log.delete_task(self.index, self.tasks)
+
+    def list_tasks(self):
+        """Changes to list mode, showing the page of the task shown"""
+        self.list_mode = True
+        return self.index - self.index % self.PAGE_SIZE
+
+    def show_task(self):
+        """Changes back to show one task, the first one of the page"""
+        self.list_mode = False
+        return self.index
 
     def previous_task(self):
-        """Decreases index by one to show previous task"""
-        return self.index - 1
+        """Decreases index by one (or a page) to show previous task"""
+        return max(self.index - (self.PAGE_SIZE if self.list_mode else 1), 0)
 
     def next_task(self):
-        """Increases index by one to show next task"""
-        return self.index + 1
+        """Increases index by one (or a page) to show next task"""
+        return self.index + (self.PAGE_SIZE if self.list_mode else 1)
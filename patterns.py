@@ -0,0 +1,109 @@
+"""
+Regular expressions of the searches. Compiled patterns are kept in an LRU
+cache shared by every search, so searching the same pattern again doesn't
+compile it again. The literal text every match of a pattern must contain is
+worked out from its parsed form, so the tasks without it are skipped with a
+plain substring test, or found through a text index, before the regex runs.
+"""
+import functools
+import re
+
+import profiling
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+# Number of compiled patterns kept
+CACHE_SIZE = 256
+# Flags that make a literal of the pattern match other text than itself
+CASE_FLAGS = re.IGNORECASE | re.LOCALE
+REPEATS = tuple(
+    getattr(sre_constants, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, name))
+
+
+def compile(pattern, flags=0):
+    """
+    Returns a pattern compiled, from the cache if it was compiled before. A
+    pattern compiled already is returned as it is. It raises re.error if the
+    pattern is not valid.
+    """
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    return _compile(pattern, flags)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _compile(pattern, flags):
+    """Compiles a pattern, once for every pattern and flags kept"""
+    profiling.count('regexes compiled')
+    return re.compile(pattern, flags)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def literal(regex):
+    """
+    Returns the longest text that every match of a compiled pattern
+    contains, or None if there is none that is sure. Patterns that ignore
+    case have none.
+    """
+    if not isinstance(regex.pattern, str) or regex.flags & CASE_FLAGS:
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError, ValueError):
+        return None
+    return max(required(parsed), key=len, default=None)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def prefix(regex):
+    """
+    Returns the literal text every match of a compiled pattern starts with,
+    after any anchor, or an empty string if there is none. The regex engine
+    looks for such a prefix on its own as fast as a substring test.
+    """
+    if not isinstance(regex.pattern, str):
+        return ''
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError, ValueError):
+        return ''
+    run = []
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(value))
+        elif op is not sre_constants.AT or run:
+            break
+    return ''.join(run)
+
+
+def required(items):
+    """
+    Returns the runs of literal characters that every match of the parsed
+    items of a pattern contains. Anything that can match different texts
+    ends a run, and only the groups and repeats that must match at least
+    once are looked into.
+    """
+    runs = []
+    run = []
+    for op, value in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(value))
+            continue
+        if run:
+            runs.append(''.join(run))
+            run = []
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, _, group = value
+            if not add_flags & CASE_FLAGS:
+                runs.extend(required(group))
+        elif op in REPEATS and value[0] >= 1:
+            runs.extend(required(value[2]))
+    if run:
+        runs.append(''.join(run))
+    return runs
@@ -0,0 +1,175 @@
+"""
+Opt-in instrumentation of the Work Log. When it is enabled, the hot paths
+(reading and sorting the log, saving it, searches and menu drawing) are
+timed, and counters keep the rows parsed, the bytes written and the tasks
+scanned by searches. The stats are dumped to a file on exit: as JSON, or in
+cProfile format (to be read with pstats) if the file ends in '.prof'.
+
+It is enabled by the WORK_LOG_PROFILE environment variable or by the
+--profile option of the command line, both set to the file to dump to:
+    WORK_LOG_PROFILE=stats.json python work_log.py
+    python work_log.py --profile stats.prof search --text party
+
+While it is disabled every hook returns at once, so it adds almost nothing.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import time
+
+ENVIRON = 'WORK_LOG_PROFILE'
+PROFILE_SUFFIX = '.prof'
+
+# The Stats being collected, or None while instrumentation is disabled
+STATS = None
+
+
+class Stats:
+    """
+    Stats collected while instrumentation is enabled: the number of calls
+    and the seconds spent in each timed function, and named counters. With
+    a profiler, every function call is profiled too.
+    """
+
+    def __init__(self, file=None, profiler=None):
+        """Initializes empty stats, to be dumped to the file given"""
+        self.file = file
+        self.profiler = profiler
+        self.timings = {}
+        self.counters = {}
+
+    def add_time(self, name, seconds):
+        """Adds a call that took the seconds given to a timing"""
+        timing = self.timings.setdefault(name, [0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+
+    def count(self, name, amount=1):
+        """Adds an amount to a counter"""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def as_dict(self):
+        """
+        Returns the stats as a dict that can be saved as JSON, with the
+        tasks scanned per query worked out from the counters.
+        """
+        stats = {
+            'timings': {
+                name: {'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in sorted(self.timings.items())
+            },
+            'counters': dict(sorted(self.counters.items())),
+        }
+        queries = self.counters.get('queries')
+        if queries:
+            stats['tasks scanned per query'] = (
+                self.counters.get('tasks scanned', 0) / queries)
+        return stats
+
+    def dump(self, file=None):
+        """
+        Writes the stats to a file, or to the file they were created with:
+        in cProfile format if there is a profiler and the file ends in
+        '.prof', or else as JSON.
+        """
+        file = file or self.file
+        if self.profiler is not None and file.endswith(PROFILE_SUFFIX):
+            self.profiler.disable()
+            self.profiler.dump_stats(file)
+            return
+        with open(file, 'w') as output:
+            json.dump(self.as_dict(), output, indent=2)
+
+
+def enable(file=None):
+    """
+    Starts collecting stats, which are dumped to the file given (if any) on
+    exit. A file ending in '.prof' also runs cProfile over the whole
+    session. It returns the Stats collected.
+    """
+    global STATS
+    disable()
+    profiler = None
+    if file and file.endswith(PROFILE_SUFFIX):
+        profiler = cProfile.Profile()
+    STATS = Stats(file, profiler)
+    if file:
+        atexit.register(dump)
+    if profiler is not None:
+        profiler.enable()
+    return STATS
+
+
+def enable_from_environ():
+    """Enables instrumentation if the WORK_LOG_PROFILE variable is set"""
+    file = os.environ.get(ENVIRON)
+    if file:
+        enable(file)
+
+
+def disable():
+    """Stops collecting stats, without dumping them, and returns them"""
+    global STATS
+    stats, STATS = STATS, None
+    atexit.unregister(dump)
+    if stats is not None and stats.profiler is not None:
+        stats.profiler.disable()
+    return stats
+
+
+def dump():
+    """Dumps the stats being collected to their file, if they have one"""
+    if STATS is not None and STATS.file:
+        STATS.dump()
+
+
+def enabled():
+    """Returns True while stats are being collected"""
+    return STATS is not None
+
+
+def timed(name=None):
+    """
+    Decorator that adds the time spent in every call of a function to a
+    timing, named after the function if no name is given.
+    """
+    def decorator(function):
+        timing = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if STATS is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if STATS is not None:
+                    STATS.add_time(timing, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(name, amount=1):
+    """Adds an amount to a counter"""
+    if STATS is not None:
+        STATS.count(name, amount)
+
+
+def counted(name, tasks):
+    """
+    Returns the tasks given, or an iterator over them that counts how many
+    are pulled while instrumentation is enabled.
+    """
+    if STATS is None:
+        return tasks
+    return _counted(name, tasks)
+
+
+def _counted(name, tasks):
+    """Yields the tasks given, adding each one to a counter"""
+    for task in tasks:
+        count(name)
+        yield task
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+
+import profiling
+import utils
+from storage import (
+    CsvStorage, JournalStorage, copy_log, csv_text, read_csv, replace_file)
+from task import ProxyTaskList, Task
+
+
+class ShardedStorage(CsvStorage):
+    """
+    Storage of a log in a directory, with a csv file (a shard) for the
+    entries of each month or year, named like 2018-02.csv or 2018.csv. A
+    manifest keeps the first and last date, the number of rows and a hash of
+    the content of every shard, so a search by date reads only the shards
+    that overlap its dates, and a change rewrites only the shards it
+    touches. Shards are written before the manifest, each one atomically.
+    """
+    MANIFEST = 'manifest.json'
+    PERIODS = ('month', 'year')
+
+    def __init__(self, directory, period=None):
+        """
+        Opens the log kept in a directory, creating it if needed. A new log
+        is split by the period given, 'month' by default, while an existing
+        one keeps the period it was created with. It raises ValueError if the
+        path given is a file.
+        """
+        if os.path.isfile(directory):
+            raise ValueError(
+                "{} is a file, not a directory of shards".format(directory))
+        super().__init__(directory)
+        self.manifest = os.path.join(directory, self.MANIFEST)
+        self.period = period
+        with self.lock(shared=True):
+            self._stamp = self.stamp()
+            self.read_manifest()
+        if period and period != self.period:
+            raise ValueError("the log is split by {}, not by {}".format(
+                self.period, period))
+        os.makedirs(directory, exist_ok=True)
+
+    def read_manifest(self):
+        """
+        Reads the manifest again, as another process may have changed the
+        shards. A log without one is split by the period it was given.
+        """
+        try:
+            with open(self.manifest) as manifest:
+                content = json.load(manifest)
+        except FileNotFoundError:
+            content = {'period': self.period or self.PERIODS[0], 'shards': {}}
+        if content['period'] not in self.PERIODS:
+            raise ValueError("unknown period: {}".format(content['period']))
+        self.period = content['period']
+        self.shards = content['shards']
+
+    @classmethod
+    def handles(cls, file):
+        """Returns True if the file given is a directory of shards"""
+        return bool(file) and os.path.isdir(file)
+
+    def shard_name(self, date):
+        """Returns the name of the shard of a date"""
+        if self.period == 'year':
+            return '{:%Y}'.format(date)
+        return '{:%Y-%m}'.format(date)
+
+    def names(self):
+        """Returns the names of all shards, from the oldest to the newest"""
+        return sorted(self.shards)
+
+    def names_between(self, start_date, end_date):
+        """Returns the names of the shards with tasks between two dates"""
+        return [
+            name for name in self.names()
+            if utils.parse_date(self.shards[name]['first']) <= end_date
+            and utils.parse_date(self.shards[name]['last']) >= start_date
+        ]
+
+    def count(self):
+        """Returns the number of rows of all shards, without reading them"""
+        return sum(shard['rows'] for shard in self.shards.values())
+
+    def load_shard(self, name):
+        """
+        Returns a list with the rows of a shard as dicts. Shards are read
+        under the lock of the whole log, so they have no locks of their own.
+        """
+        profiling.count('shards read')
+        with self.lock(shared=True):
+            try:
+                return read_csv(self.shard_file(name))[1]
+            except FileNotFoundError:
+                return []
+
+    def load(self):
+        """
+        Returns a list with the rows of all shards, sorted by date, as they
+        are now.
+        """
+        rows = []
+        with self.lock(shared=True):
+            self._stamp = self.stamp()
+            self.read_manifest()
+            for name in self.names():
+                rows.extend(self.load_shard(name))
+        return rows
+
+    @profiling.timed()
+    def save(self, rows):
+        """
+        Saves all rows, rewriting only the shards whose content changed and
+        deleting the ones left empty.
+        """
+        with self.lock():
+            self.read_manifest()
+            shards = {}
+            for row in rows:
+                name = self.shard_name(utils.parse_date(row['Date']))
+                shards.setdefault(name, []).append(row)
+            for name in self.names():
+                shards.setdefault(name, [])
+            self.write(shards)
+            self.saved()
+
+    def compact(self, rows):
+        """Saves all rows, as shards are never left with stale content"""
+        self.save(rows)
+
+    @profiling.timed()
+    def record_many(self, changes):
+        """
+        Applies several changes to the shards of the rows involved, found by
+        their id, and rewrites just those shards.
+        """
+        shards = {}
+
+        def rows_of(row):
+            name = self.shard_name(utils.parse_date(row['Date']))
+            if name not in shards:
+                shards[name] = (
+                    self.load_shard(name) if name in self.shards else [])
+            return shards[name]
+
+        def find(row):
+            same = rows_of(row)
+            for position, other in enumerate(same):
+                if other.get('Id') == row.get('Id'):
+                    return same, position
+            return same, None
+
+        with self.lock():
+            self.read_manifest()
+            for op, rows in changes:
+                if op == self.ADD:
+                    rows_of(rows[0]).append(rows[0])
+                elif op == self.DELETE:
+                    same, position = find(rows[0])
+                    if position is not None:
+                        del same[position]
+                elif op == self.EDIT:
+                    same, position = find(rows[0])
+                    if rows_of(rows[1]) is same and position is not None:
+                        same[position] = rows[1]
+                        continue
+                    if position is not None:
+                        del same[position]
+                    rows_of(rows[1]).append(rows[1])
+            self.write(shards)
+            self.saved()
+        return True
+
+    def changes_since(self, stamp):
+        """
+        Shards don't tell what changed in them, so the whole log is read
+        again.
+        """
+        return None
+
+    def watched_files(self):
+        """Returns the files to watch: the manifest, rewritten by any change"""
+        if self._stamp is None:
+            return []
+        return [self.manifest, self.lock_file]
+
+    def write(self, shards):
+        """
+        Writes the rows of the shards given by name, sorted by date, unless
+        their content is the same, and then the manifest. Empty shards are
+        deleted.
+        """
+        changed = False
+        for name, rows in sorted(shards.items()):
+            if not rows:
+                if self.shards.pop(name, None) is not None:
+                    os.remove(self.shard_file(name))
+                    changed = True
+                continue
+            rows.sort(key=lambda row: utils.parse_date(row['Date']))
+            text = csv_text(rows)
+            digest = hashlib.blake2b(
+                text.encode('utf-8'), digest_size=16).hexdigest()
+            if self.shards.get(name, {}).get('hash') == digest:
+                continue
+            replace_file(self.shard_file(name), text)
+            profiling.count('shards written')
+            dates = [utils.parse_date(row['Date']) for row in rows]
+            self.shards[name] = {
+                'first': utils.format_date(min(dates)),
+                'last': utils.format_date(max(dates)),
+                'rows': len(rows),
+                'hash': digest,
+            }
+            changed = True
+        if changed or not os.path.exists(self.manifest):
+            replace_file(self.manifest, json.dumps(
+                {'period': self.period, 'shards': self.shards}, indent=2))
+
+    def shard_file(self, name):
+        """Returns the path of the csv file of a shard"""
+        return os.path.join(self.file, name + '.csv')
+
+
+class ShardedTaskList(ProxyTaskList):
+    """
+    A sorted list of the tasks of a ShardedStorage, read one shard at a time
+    only when needed. Its length comes from the manifest, date lookups read
+    just the shards that overlap the dates, and going through the list reads
+    the shards in order. Any other operation loads all remaining shards.
+    """
+
+    def __init__(self, storage, build):
+        """
+        Initializes the list with the storage of the shards and the function
+        that builds the full list of tasks from an iterable of tasks.
+        """
+        super().__init__(build)
+        self.storage = storage
+        self._shards = {}
+
+    def __getitem__(self, index):
+        return self.load()[index]
+
+    def __contains__(self, task):
+        return task in self.load()
+
+    def __repr__(self):
+        return "ShardedTaskList({!r})".format(self.storage.file)
+
+    def index(self, task):
+        """Returns the position of the task in the list"""
+        return self.load().index(task)
+
+    def between(self, start_date, end_date):
+        """
+        Returns a list of the tasks between two dates, both included, reading
+        only the shards that overlap them.
+        """
+        if self._list is not None:
+            return self._list.indexes['date'].between(start_date, end_date)
+        return [
+            task for name in self.storage.names_between(start_date, end_date)
+            for task in self._tasks_of(name)
+            if start_date <= task.date <= end_date
+        ]
+
+    def _count(self):
+        return self.storage.count()
+
+    def _all(self):
+        return (
+            task for name in self.storage.names()
+            for task in self._tasks_of(name))
+
+    def _release(self):
+        """Drops the shards kept, once their tasks are loaded"""
+        self._shards = {}
+
+    def _tasks_of(self, name):
+        """Returns the tasks of a shard, reading it the first time"""
+        tasks = self._shards.get(name)
+        if tasks is None:
+            tasks = [Task(**row) for row in self.storage.load_shard(name)]
+            self._shards[name] = tasks
+        return tasks
+
+
+def split_csv(csv_file, directory, period=None):
+    """Copies a csv log, with its journal, into the shards of a sharded log"""
+    return copy_log(
+        JournalStorage(csv_file, 0), ShardedStorage(directory, period))
+
+
+def join_shards(directory, csv_file):
+    """Copies the shards of a sharded log into a csv log"""
+    return copy_log(ShardedStorage(directory), CsvStorage(csv_file))
@@ -0,0 +1,359 @@
+import contextlib
+import datetime
+import sqlite3
+import weakref
+
+import profiling
+import utils
+from storage import CsvStorage, JournalStorage, copy_log
+from task import Task, new_task_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    time TEXT NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    uid TEXT NOT NULL DEFAULT ''
+);
+"""
+
+INDEX_SCHEMA = """
+CREATE INDEX IF NOT EXISTS tasks_date ON tasks (date, id);
+CREATE INDEX IF NOT EXISTS tasks_time ON tasks (time);
+CREATE INDEX IF NOT EXISTS tasks_title ON tasks (title);
+CREATE INDEX IF NOT EXISTS tasks_uid ON tasks (uid);
+"""
+
+TEXT_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_text USING fts5(
+    title, notes, content='tasks', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS tasks_text_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_text (rowid, title, notes)
+    VALUES (new.id, new.title, new.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_text_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_text (tasks_text, rowid, title, notes)
+    VALUES ('delete', old.id, old.title, old.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_text_update AFTER UPDATE ON tasks BEGIN
+    INSERT INTO tasks_text (tasks_text, rowid, title, notes)
+    VALUES ('delete', old.id, old.title, old.notes);
+    INSERT INTO tasks_text (rowid, title, notes)
+    VALUES (new.id, new.title, new.notes);
+END;
+"""
+
+COLUMNS = "id, date, title, time, notes, uid"
+INSERT = ("INSERT INTO tasks (date, title, time, notes, uid)"
+          " VALUES (?, ?, ?, ?, ?)")
+ORDER = " ORDER BY date, id"
+
+
+class SqliteStorage(CsvStorage):
+    """
+    Storage of a log in a SQLite database, with indexes on date, time and
+    title, task id (the uid column, as id is the row id) and a FTS5 trigram
+    table over Title and Notes. The tasks of the log
+    are kept by a SqliteTaskList, which writes every change in its own
+    transaction, so there is nothing else to save after a change.
+    """
+    EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+    def __init__(self, file):
+        """Opens the database, creating its tables if needed"""
+        super().__init__(file)
+        self.connection = sqlite3.connect(file)
+        self.connection.create_function(
+            'py_lower', 1, lambda text: text.lower(), deterministic=True)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.upgrade()
+            self.connection.executescript(INDEX_SCHEMA)
+        try:
+            with self.connection:
+                self.connection.executescript(TEXT_SCHEMA)
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 or trigrams: text searches scan
+            self.text_index = False
+        else:
+            self.text_index = True
+
+    def upgrade(self):
+        """
+        Adds the uid column to a database created before tasks had ids, and
+        gives an id to every row without one.
+        """
+        columns = [
+            row[1] for row in
+            self.connection.execute("PRAGMA table_info(tasks)")]
+        if 'uid' not in columns:
+            self.connection.execute(
+                "ALTER TABLE tasks ADD COLUMN uid TEXT NOT NULL DEFAULT ''")
+        rows = self.connection.execute(
+            "SELECT id FROM tasks WHERE uid = ''").fetchall()
+        self.connection.executemany(
+            "UPDATE tasks SET uid = ? WHERE id = ?",
+            ((new_task_id(), row_id) for row_id, in rows))
+
+    @classmethod
+    def handles(cls, file):
+        """Returns True if the file given is a SQLite log"""
+        return bool(file) and file.lower().endswith(cls.EXTENSIONS)
+
+    def load(self):
+        """Returns a list with the rows of the database as dicts"""
+        cursor = self.connection.execute(
+            "SELECT date, title, time, notes, uid FROM tasks" + ORDER)
+        rows = [self.row_log(*row) for row in cursor]
+        profiling.count('rows parsed', len(rows))
+        return rows
+
+    def save(self, rows):
+        """Replaces all rows of the database in a single transaction"""
+        with self.connection:
+            self.connection.execute("DELETE FROM tasks")
+            self.connection.executemany(
+                INSERT, (self.log_row(row) for row in rows))
+
+    def compact(self, rows):
+        """
+        Every change is already in the database, so compacting the log only
+        optimizes the text index and the database file.
+        """
+        if self.text_index:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO tasks_text (tasks_text) VALUES ('optimize')")
+        self.connection.execute("VACUUM")
+
+    def record_many(self, changes):
+        """Changes are written by the SqliteTaskList, so this does nothing"""
+        return True
+
+    def changes(self):
+        """
+        Every query of the SqliteTaskList reads the database as other
+        processes left it, so there are never changes to merge.
+        """
+        return []
+
+    def lock(self, shared=False):
+        """SQLite locks the database itself, so there is no lock file"""
+        return contextlib.nullcontext()
+
+    @staticmethod
+    def log_row(log):
+        """
+        Returns the values of a row of the database for a log. Logs without
+        an id get a new one.
+        """
+        return (
+            utils.parse_date(log['Date']).toordinal(), log['Title'],
+            log['Time'], log['Notes'] or '', log.get('Id') or new_task_id())
+
+    @staticmethod
+    def row_log(date, title, time, notes, uid):
+        """Returns the log of a row of the database"""
+        return {
+            'Date': utils.format_date(datetime.date.fromordinal(date)),
+            'Title': title,
+            'Time': time,
+            'Notes': notes,
+            'Id': uid,
+        }
+
+
+class SqliteTaskList:
+    """
+    A sorted list of the tasks of a SqliteStorage. Tasks are views created
+    when a row is read, and they are kept while they are used somewhere else,
+    so the same row is always the same task. Every change is written in a
+    single row transaction. The list also works as the date, text, time,
+    regex and id indexes of the log, running each search as a SQL query.
+    """
+
+    def __init__(self, storage):
+        """Initializes the list with the storage of the database"""
+        self.storage = storage
+        self.connection = storage.connection
+        self._views = weakref.WeakValueDictionary()
+        self._id_of = weakref.WeakKeyDictionary()
+        self.indexes = {
+            'date': self, 'text': self, 'time': self, 'regex': self,
+            'id': self}
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT count(*) FROM tasks").fetchone()[0]
+
+    def __getitem__(self, index):
+        """Slices are returned as plain lists of tasks"""
+        length = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._select(
+                ORDER + " LIMIT ? OFFSET ?",
+                max(stop - start, 0), start)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("list index out of range")
+        return self._select(ORDER + " LIMIT 1 OFFSET ?", index)[0]
+
+    def __iter__(self):
+        cursor = self.connection.execute(
+            "SELECT " + COLUMNS + " FROM tasks" + ORDER)
+        for row in cursor:
+            yield self._view(row)
+
+    def __contains__(self, task):
+        return task in self._id_of
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "SqliteTaskList({!r})".format(self.storage.file)
+
+    def index(self, task):
+        """Returns the position of the task in the list"""
+        try:
+            task_id = self._id_of[task]
+        except KeyError:
+            raise ValueError("task is not in list") from None
+        return self.connection.execute(
+            "SELECT count(*) FROM tasks, (SELECT date AS d FROM tasks"
+            " WHERE id = ?) WHERE date < d OR (date = d AND id < ?)",
+            (task_id, task_id)).fetchone()[0]
+
+    def add(self, task):
+        """Inserts a new task after any other task with the same date"""
+        with self.connection:
+            cursor = self.connection.execute(INSERT, self._values(task))
+        self._track(cursor.lastrowid, task)
+
+    append = add
+
+    def extend(self, tasks):
+        """Inserts many new tasks in a single transaction"""
+        added = []
+        with self.connection:
+            for task in tasks:
+                cursor = self.connection.execute(INSERT, self._values(task))
+                added.append((cursor.lastrowid, task))
+        for task_id, task in added:
+            self._track(task_id, task)
+
+    def remove(self, task):
+        """Deletes the row of a task"""
+        task_id = self._id_of.pop(task, None)
+        if task_id is None:
+            raise ValueError("task is not in list")
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM tasks WHERE id = ?", (task_id,))
+        self._views.pop(task_id, None)
+
+    def update(self, task):
+        """Writes the attributes of an edited task to its row"""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE tasks SET date = ?, title = ?, time = ?, notes = ?,"
+                " uid = ? WHERE id = ?",
+                self._values(task) + (self._id_of[task],))
+
+    def logs(self):
+        """Returns an iterator over the logs of all tasks, to be saved"""
+        return iter(self.storage.load())
+
+    def arrays(self):
+        """Searches are run by SQLite, so there are no TaskArrays"""
+        return None
+
+    def on(self, date):
+        """Returns a list of the tasks of a date"""
+        return self._select(
+            " WHERE date = ?" + ORDER, date.toordinal())
+
+    def between(self, start_date, end_date):
+        """Returns a list of the tasks between two dates, both included"""
+        return self._select(
+            " WHERE date BETWEEN ? AND ?" + ORDER,
+            start_date.toordinal(), end_date.toordinal())
+
+    def spent(self, time):
+        """Returns a list of the tasks with the time spent given"""
+        return self._select(" WHERE time = ?" + ORDER, time)
+
+    def search(self, text):
+        """
+        Returns a list of the tasks which contain the text given within their
+        Title or Notes, ignoring case. Texts of three or more characters are
+        looked up in the trigram index first.
+        """
+        text = text.lower()
+        where = (" WHERE (instr(py_lower(title), ?) > 0"
+                 " OR instr(py_lower(notes), ?) > 0)")
+        params = [text, text]
+        if self.storage.text_index and len(text) >= 3:
+            where += (" AND id IN (SELECT rowid FROM tasks_text"
+                      " WHERE tasks_text MATCH ?)")
+            params.append('"{}"'.format(text.replace('"', '""')))
+        return self._select(where + ORDER, *params)
+
+    def match(self, regex):
+        """
+        Returns a list of the tasks whose Title or Notes match a compiled
+        regular expression.
+        """
+        self.connection.create_function(
+            'task_match', 1, lambda text: regex.search(text) is not None)
+        return self._select(
+            " WHERE task_match(title) OR task_match(notes)" + ORDER)
+
+    def get(self, task_id):
+        """Returns the task with the id given, or None"""
+        found = self._select(" WHERE uid = ?", task_id)
+        return found[0] if found else None
+
+    def _select(self, query, *params):
+        """Returns the tasks of the rows selected by a query"""
+        cursor = self.connection.execute(
+            "SELECT " + COLUMNS + " FROM tasks" + query, params)
+        return [self._view(row) for row in cursor]
+
+    def _view(self, row):
+        """Returns the task view of a row of the database"""
+        task_id, date, title, time, notes, uid = row
+        task = self._views.get(task_id)
+        if task is None:
+            task = Task.from_values(
+                title, datetime.date.fromordinal(date), time, notes, uid)
+            self._track(task_id, task)
+        return task
+
+    def _track(self, task_id, task):
+        """Registers a task as the view of the row with the id given"""
+        self._views[task_id] = task
+        self._id_of[task] = task_id
+
+    @staticmethod
+    def _values(task):
+        """Returns the values of the row of a task, without its row id"""
+        return (
+            task.date.toordinal(), task.title, task.time, task.notes or '',
+            task.id)
+
+
+def import_csv(csv_file, db_file):
+    """Copies a csv log, with its journal, into a SQLite log"""
+    return copy_log(JournalStorage(csv_file, 0), SqliteStorage(db_file))
+
+
+def export_csv(db_file, csv_file):
+    """Copies a SQLite log into a csv log"""
+    return copy_log(SqliteStorage(db_file), CsvStorage(csv_file))
@@ -0,0 +1,577 @@
+import bisect
+import contextlib
+import csv
+import hashlib
+import io
+import os
+import tempfile
+
+import profiling
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows: logs are not locked there, but changes are still found
+    fcntl = None
+
+FIELDNAMES = ["Date", "Title", "Time", "Notes", "Id"]
+# Number of fields with the content of a row, before its Id
+CONTENT = 4
+
+
+class CsvStorage:
+    """
+    Reads and saves the rows of a log in a single csv file. Every save
+    rewrites the whole file with all the rows given. Changes are named with
+    one of the operations ADD, DELETE or EDIT.
+
+    Several processes can share a log: reads and writes hold an advisory
+    lock of a '.lock' file next to the log, which also keeps a generation
+    number increased by every write. With it and the modification time,
+    size and inode of the file, changes saved by other processes since the
+    log was read are found by changes. Rows appended to the file by other
+    tools are read without reading the rest of the file again.
+    """
+    ADD = '+'
+    DELETE = '-'
+    EDIT = 'e'
+    # Bytes of the end of the file kept to tell if rows were just appended
+    TAIL_SIZE = 64
+
+    def __init__(self, file=None):
+        """Initializes the storage with the path of the csv file"""
+        self.file = file
+        self.lock_file = '{}.lock'.format(file)
+        self._lock = None
+        self._locks = 0
+        self._stamp = None
+        self._tail = None
+
+    @profiling.timed()
+    def load(self):
+        """
+        Returns a list with the rows of the file as dicts. If there is no
+        file, the list is empty. Rows without an id, from logs saved before
+        tasks had ids, get the id given by row_id.
+        """
+        with self.lock(shared=True):
+            self._stamp = self.stamp()
+            try:
+                fieldnames, rows = read_csv(self.file)
+            except FileNotFoundError:
+                return []
+            self.read_tail(fieldnames, len(rows))
+        return rows
+
+    @profiling.timed()
+    def save(self, rows):
+        """
+        Saves all rows in the csv file. They are written to a temporary file
+        in a single write and synced to disk, and then the temporary file
+        replaces the csv file, so a crash never leaves a partial file.
+        """
+        rows = list(rows)
+        with self.lock():
+            replace_file(self.file, csv_text(rows))
+            self.saved()
+            self.read_tail(FIELDNAMES, len(rows))
+
+    @contextlib.contextmanager
+    def lock(self, shared=False):
+        """
+        Holds the lock of the log while the context is open: shared to read
+        and exclusive to write. Locks taken inside another one are already
+        held by it. Without a file, or if the lock file can't be opened (as
+        on a read only drive), nothing is locked, and a log not created yet
+        is read without a lock.
+        """
+        if self._locks or not self.file:
+            self._locks += 1
+            try:
+                yield
+            finally:
+                self._locks -= 1
+            return
+        handle = None
+        if not shared or os.path.exists(self.file):
+            try:
+                handle = open(self.lock_file, 'a+')
+            except OSError:
+                pass
+        try:
+            if handle is not None and fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._lock = handle
+            self._locks = 1
+            yield
+        finally:
+            self._lock = None
+            self._locks = 0
+            if handle is not None:
+                handle.close()
+
+    def generation(self):
+        """Returns the number of writes made to the log, 0 if unknown"""
+        try:
+            with open(self.lock_file) as lock_file:
+                return int(lock_file.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def stamp(self):
+        """
+        Returns what tells the log has changed: the generation and the
+        modification time, size and inode of the file.
+        """
+        return self.generation(), file_stamp(self.file)
+
+    def saved(self):
+        """
+        Increases the generation after a write, while the lock is held, and
+        takes the stamp of the log as written.
+        """
+        if self._lock is not None:
+            generation = self.generation() + 1
+            self._lock.seek(0)
+            self._lock.truncate()
+            self._lock.write(str(generation))
+            self._lock.flush()
+        self._stamp = self.stamp()
+
+    def track(self):
+        """
+        Takes the stamp of the log as it is now, for lists that read the log
+        without load, so the changes made from then on are found.
+        """
+        with self.lock(shared=True):
+            self._stamp = self.stamp()
+
+    def changes(self):
+        """
+        Returns the changes saved by other processes since the log was read
+        or saved here, as (op, rows) pairs. It returns None if they can't be
+        told, as when the log was never read through the storage, and the
+        whole log has to be read again.
+        """
+        if not self.file:
+            return []
+        if self._stamp is None:
+            return None
+        with self.lock(shared=True):
+            stamp = self.stamp()
+            if stamp == self._stamp:
+                return []
+            changes = self.changes_since(stamp)
+            if changes is not None:
+                self._stamp = stamp
+        return changes
+
+    def watched_files(self):
+        """
+        Returns the files to watch to know when the log may have changed, or
+        an empty list if its changes are not found by changes.
+        """
+        if self._stamp is None:
+            return []
+        return [self.file, self.lock_file]
+
+    def changes_since(self, stamp):
+        """
+        Returns the changes made since the log was read, up to the stamp
+        given: the rows appended to the csv file, as ADD changes. It returns
+        None if the file was changed in any other way.
+        """
+        if stamp[1] == self._stamp[1]:
+            return []
+        rows = self.appended(stamp[1])
+        if rows is None:
+            return None
+        return [(self.ADD, [row]) for row in rows]
+
+    def read_tail(self, fieldnames, count):
+        """
+        Keeps the end of the csv file as it was read or saved, with its
+        fieldnames and number of rows, to read later just the rows appended.
+        """
+        size = self._stamp[1][1] if self._stamp[1] else 0
+        with open(self.file, 'rb') as csvfile:
+            csvfile.seek(max(size - self.TAIL_SIZE, 0))
+            tail = csvfile.read(min(size, self.TAIL_SIZE))
+        self._tail = fieldnames, count, tail
+
+    def appended(self, file_stamp):
+        """
+        Returns the rows appended to the csv file since it was read, given
+        the stamp of the file now, or None if it was changed otherwise. Rows
+        are told to be appended when the file is the same one, it is bigger
+        and it still ends as it did.
+        """
+        old = self._stamp[1]
+        if (self._tail is None or old is None or file_stamp is None
+                or file_stamp[2] != old[2] or file_stamp[1] <= old[1]):
+            return None
+        fieldnames, count, tail = self._tail
+        if not fieldnames or not tail.endswith(b'\n'):
+            return None
+        with open(self.file, 'rb') as csvfile:
+            csvfile.seek(old[1] - len(tail))
+            if csvfile.read(len(tail)) != tail:
+                return None
+            data = csvfile.read(file_stamp[1] - old[1])
+        if not data.endswith(b'\n'):
+            return None
+        text = io.StringIO(data.decode('utf-8'), newline='')
+        rows = list(csv.DictReader(text, fieldnames))
+        profiling.count('rows parsed', len(rows))
+        for number, row in enumerate(rows, count):
+            if not row.get('Id'):
+                row['Id'] = row_id(number, row)
+        self._tail = (
+            fieldnames, count + len(rows), (tail + data)[-self.TAIL_SIZE:])
+        return rows
+
+    def compact(self, rows):
+        """Saves all rows, leaving the storage as clean as possible"""
+        self.save(rows)
+
+    def has_journal(self):
+        """Returns True if there are changes not saved in the csv file yet"""
+        return False
+
+    def record(self, op, *rows):
+        """
+        Records a single change made to the log. It returns False if the
+        change is not recorded, so the caller saves all the rows instead.
+        """
+        return self.record_many([(op, rows)])
+
+    def record_many(self, changes):
+        """
+        Records several changes, given as (op, rows) pairs, at once. This
+        storage can't do it, so it returns False to let the caller save all
+        the rows instead.
+        """
+        return False
+
+
+class JournalStorage(CsvStorage):
+    """
+    Storage that appends every change to a journal file next to the csv file
+    instead of rewriting it. Each journal record starts with an operation:
+    '+' adds a row, '-' deletes a row and 'e' replaces a row with a new one,
+    followed by the fields of the rows involved. Rows are found by their id,
+    or by their content if they have none. The journal is merged back
+    into the csv file (compacted) when it grows beyond compact_size bytes or
+    when save is called. With a compact_size of 0 nothing is journaled, but an
+    existing journal is still replayed, so no change is lost when a log is
+    opened without journaling.
+    """
+    COMPACT_SIZE = 1024 * 1024
+
+    def __init__(self, file=None, compact_size=None):
+        """
+        Initializes the storage with the path of the csv file. The journal is
+        kept in the same path with a '.journal' suffix.
+        """
+        super().__init__(file)
+        self.journal = '{}.journal'.format(file)
+        self._offset = 0
+        if compact_size is None:
+            compact_size = self.COMPACT_SIZE
+        self.compact_size = compact_size
+
+    @profiling.timed()
+    def load(self):
+        """
+        Returns the rows of the csv file with all changes of the journal
+        replayed over them, in the same order they were made.
+        """
+        with self.lock(shared=True):
+            rows = super().load()
+            records, self._offset = self.read_journal()
+            self._stamp = self.stamp()
+
+        # Positions of the rows by id and by content, to find them when
+        # replaying. Rows without an id (from older logs) are found by
+        # content. A crash between compacting and removing the journal leaves
+        # changes already saved in the csv file, so rows added are skipped
+        # when their id is there and rows with an id are never found by
+        # content, which makes replaying them again harmless
+        by_id = {}
+        by_content = {}
+
+        def track(position):
+            row = rows[position]
+            if row.get('Id'):
+                by_id[row['Id']] = position
+            same = by_content.setdefault(self.row_key(row)[:CONTENT], [])
+            bisect.insort(same, position)
+
+        def find(row):
+            if row.get('Id'):
+                position = by_id.get(row['Id'])
+                if position is None:
+                    return None
+            else:
+                same = by_content.get(self.row_key(row)[:CONTENT])
+                if not same:
+                    return None
+                position = same[0]
+            row = rows[position]
+            by_id.pop(row.get('Id'), None)
+            by_content[self.row_key(row)[:CONTENT]].remove(position)
+            return position
+
+        for position in range(len(rows)):
+            track(position)
+
+        for op, changed in records:
+            if op == self.ADD:
+                if changed[0].get('Id') in by_id:
+                    continue
+                rows.append(changed[0])
+                track(len(rows) - 1)
+            elif op == self.DELETE:
+                position = find(changed[0])
+                if position is not None:
+                    rows[position] = None
+            elif op == self.EDIT:
+                position = find(changed[0])
+                if position is not None:
+                    rows[position] = changed[1]
+                    track(position)
+        return [row for row in rows if row is not None]
+
+    def read_journal(self, offset=0):
+        """
+        Returns the changes recorded in the journal from the byte offset
+        given, as (op, rows) pairs, and the offset where its last complete
+        record ends. A record cut off by a crash is not read until it is
+        complete.
+        """
+        try:
+            with open(self.journal, 'rb') as journal:
+                journal.seek(offset)
+                data = journal.read()
+        except FileNotFoundError:
+            return [], 0
+        data = data[:self.complete(data)]
+        changes = []
+        widths = (CONTENT, len(FIELDNAMES))
+        text = io.StringIO(data.decode('utf-8'), newline='')
+        for record in csv.reader(text):
+            op, fields = record[0] if record else None, record[1:]
+            width = len(fields) // 2 if op == self.EDIT else len(fields)
+            if width not in widths or len(fields) % width:
+                # A partial write, it is skipped
+                continue
+            changes.append((op, [
+                dict(zip(FIELDNAMES, fields[start:start + width]))
+                for start in range(0, len(fields), width)]))
+        profiling.count('journal records parsed', len(changes))
+        return changes, offset + len(data)
+
+    def has_journal(self):
+        """Returns True if there are changes not saved in the csv file yet"""
+        return os.path.exists(self.journal)
+
+    def save(self, rows):
+        """Saves all rows in the csv file and starts a new empty journal"""
+        with self.lock():
+            super().save(rows)
+            try:
+                os.remove(self.journal)
+            except FileNotFoundError:
+                pass
+            self._offset = 0
+            self._stamp = self.stamp()
+
+    def stamp(self):
+        """
+        Returns what tells the log has changed: the generation and the
+        modification time, size and inode of the file and the journal.
+        """
+        return super().stamp() + (file_stamp(self.journal),)
+
+    def watched_files(self):
+        """Returns the files to watch, the journal too"""
+        files = super().watched_files()
+        return files and files + [self.journal]
+
+    def changes_since(self, stamp):
+        """
+        Returns the changes made since the log was read, up to the stamp
+        given: the rows appended to the csv file and the new records of the
+        journal. It returns None if the csv file was rewritten or the
+        journal was started again.
+        """
+        journal, old_journal = stamp[2], self._stamp[2]
+        if old_journal is not None and (
+                journal is None or journal[2] != old_journal[2]
+                or journal[1] < self._offset):
+            return None
+        changes = super().changes_since(stamp)
+        if changes is not None and journal != old_journal:
+            records, self._offset = self.read_journal(self._offset)
+            changes.extend(records)
+        return changes
+
+    @profiling.timed()
+    def record_many(self, changes):
+        """
+        Appends several changes to the journal in a single write, synced to
+        disk. It returns False when the journal is bigger than compact_size,
+        so the caller saves all the rows instead.
+        """
+        if not self.compact_size:
+            return False
+        buffer = io.StringIO(newline='')
+        writer = csv.writer(buffer)
+        for op, rows in changes:
+            record = [op]
+            for row in rows:
+                record.extend(self.row_key(row))
+            writer.writerow(record)
+        with self.lock():
+            with open(self.journal, 'a+b') as journal:
+                # A record cut off by a crash is dropped before appending
+                journal.seek(self._offset)
+                end = self._offset + self.complete(journal.read())
+                if end < journal.tell():
+                    journal.truncate(end)
+                start = journal.seek(0, 2)
+                journal.write(buffer.getvalue().encode('utf-8'))
+                journal.flush()
+                os.fsync(journal.fileno())
+                size = journal.tell()
+            self._offset = size
+            self.saved()
+        profiling.count('bytes written', size - start)
+        return size < self.compact_size
+
+    @staticmethod
+    def complete(data):
+        """
+        Returns the length of the complete records at the start of some
+        journal data: up to the last newline that is not within quotes.
+        """
+        end = data.rfind(b'\n') + 1
+        while end and data.count(b'"', 0, end) % 2:
+            end = data.rfind(b'\n', 0, end - 1) + 1
+        return end
+
+    @staticmethod
+    def row_key(row):
+        """Returns the fields of a row as a tuple, in the csv file order"""
+        return tuple(
+            '' if row.get(field) is None else row.get(field)
+            for field in FIELDNAMES)
+
+
+def file_stamp(file):
+    """
+    Returns the modification time, size and inode of a file, or None if
+    there is no file.
+    """
+    try:
+        stat = os.stat(file)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def copy_log(source, target):
+    """
+    Saves every row of a storage into another one, replacing its content, to
+    move a log from a format to another. It returns the number of rows.
+    """
+    rows = source.load()
+    target.save(rows)
+    return len(rows)
+
+
+def read_csv(file):
+    """
+    Returns the fieldnames of a csv file and its rows as dicts, without
+    taking any lock. Rows without an id get the id given by row_id. It
+    raises FileNotFoundError if there is no file.
+    """
+    with open(file, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        rows = list(reader)
+    profiling.count('rows parsed', len(rows))
+    for number, row in enumerate(rows):
+        if not row.get('Id'):
+            row['Id'] = row_id(number, row)
+    return reader.fieldnames, rows
+
+
+def csv_text(rows):
+    """Returns the text of a csv file with the rows given, and a header"""
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def row_id(number, row):
+    """
+    Returns the id of a row without one, made from its number in the file
+    and its content. The same file always gives the same ids, so they are
+    stable until the file is saved with them.
+    """
+    fields = [row.get(field) or '' for field in FIELDNAMES[:CONTENT]]
+    text = '\x1f'.join([str(number)] + fields)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def replace_file(file, text):
+    """
+    Replaces the content of a file atomically: the text (or bytes) is
+    written to a temporary file in the same directory, synced to disk and
+    renamed over the file. The file keeps its permissions.
+    """
+    directory = os.path.dirname(os.path.abspath(file))
+    handle, temp = tempfile.mkstemp(
+        dir=directory, prefix='.{}.'.format(os.path.basename(file)),
+        suffix='.tmp')
+    try:
+        if isinstance(text, bytes):
+            temp_file = open(handle, 'wb')
+        else:
+            temp_file = open(handle, 'w', newline='')
+        with temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+            profiling.count('bytes written', temp_file.tell())
+        try:
+            mode = os.stat(file).st_mode
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(temp, mode & 0o7777)
+        os.replace(temp, file)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except FileNotFoundError:
+            pass
+        raise
+    sync_directory(directory)
+
+
+def sync_directory(directory):
+    """Syncs a directory to disk so a rename in it is durable, if possible"""
+    try:
+        handle = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(handle)
+    except OSError:
+        pass
+    finally:
+        os.close(handle)
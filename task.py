@@ -1,33 +1,99 @@
-import datetime
+import bisect
+import collections
+import concurrent.futures
+import functools
+import itertools
+import operator
+import os
+import random
 import re
+
+import patterns
+import profiling
 import utils
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def match_texts(regex, texts, literal=None):
+    """
+    Returns the positions of the (title, notes) pairs of a list where a
+    compiled regular expression is found. Texts without the literal given,
+    if any, are skipped without running the regex. It runs in the worker
+    processes of a parallel regex search, so it only gets the texts of the
+    tasks.
+    """
+    return [
+        position for position, (title, notes) in enumerate(texts)
+        if (literal is None or literal in title or literal in notes)
+        and (regex.search(title) or regex.search(notes))
+    ]
+
+
+def minutes_of(time):
+    """
+    Returns the minutes of a time spent written as a number, like '60'. It
+    raises ValueError for any other text, like '060', which is not equal to
+    the number written back.
+    """
+    minutes = int(time)
+    if str(minutes) != time:
+        raise ValueError("time spent is not a number: {!r}".format(time))
+    return minutes
+
+
+def new_task_id():
+    """Returns a new random task id, as 16 hexadecimal digits"""
+    return '{:016x}'.format(random.getrandbits(64))
+
 
 class Task:
     """
     Contains relevant info about a task. This info is: Date, Title,
     Time spent and Notes (which are optional). An object of this type can
     show its info properly on screen and can be created on the fly by asking
-    the user to fill its attributes.
+    the user to fill its attributes. Every task has a unique id that never
+    changes, saved in the Id column. Tasks read from a file without ids get
+    a new one.
     """
+    __slots__ = ('title', 'date', 'time', 'notes', 'id', '__weakref__')
+
     def __init__(self, **kwargs):
         """Initialize an instance of Task with needed attributes"""
         if kwargs:
             self.title = kwargs.get('Title')
-            self.date = datetime.datetime.strptime(
-                kwargs.get('Date'), '%d/%m/%Y').date()
+            self.date = utils.parse_date(kwargs.get('Date'))
             self.time = kwargs.get('Time')
             self.notes = kwargs.get('Notes')
+            self.id = kwargs.get('Id') or new_task_id()
         else:
             self.title = utils.get_title()
             self.date = utils.get_date()
             self.time = utils.get_time()
             self.notes = utils.get_notes()
+            self.id = new_task_id()
+
+    @classmethod
+    def from_values(cls, title, date, time, notes, task_id=None):
+        """
+        Returns a task with the attributes given, already converted, without
+        parsing them nor asking the user for them.
+        """
+        task = cls.__new__(cls)
+        task.title = title
+        task.date = date
+        task.time = time
+        task.notes = notes
+        task.id = task_id or new_task_id()
+        return task
 
     def show(self):
         """Prints on screen the info about the task"""
         utils.clear_screen()
-        print("Date: {}".format(self.date.strftime('%d/%m/%Y')))
+        print("Date: {}".format(utils.format_date(self.date)))
         print("Title: {}".format(self.title))
         print("Time spent: {} minutes".format(self.time))
         if self.notes:
@@ -52,33 +118,994 @@ class Task:
         """
         log = {
             'Title': self.title,
-            'Date': self.date.strftime('%d/%m/%Y'),
+            'Date': utils.format_date(self.date),
             'Time': self.time,
-            'Notes': self.notes
+            'Notes': self.notes,
+            'Id': self.id,
         }
         return log
 
 
+class TaskList:
+    """
+    A list of tasks that is always kept sorted by date. Tasks sharing the same
+    date keep the order in which they were added, so every task is stored
+    under a (date, sequence) key and new ones are placed with a binary search
+    instead of sorting the whole list again. Any index given by name (like a
+    DateIndex) is kept up to date with every change made to the list.
+    """
+    def __init__(self, tasks=(), indexes=None):
+        """
+        Builds the list from any iterable of tasks. The sequence number is
+        given in the order the tasks come, and then they are sorted just once.
+        """
+        self._seq = itertools.count()
+        self.indexes = indexes or {}
+        self._build(((task.date, next(self._seq)), task) for task in tasks)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __getitem__(self, index):
+        """Slices are returned as plain lists of tasks"""
+        return self._tasks[index]
+
+    def __iter__(self):
+        return iter(self._tasks)
+
+    def __contains__(self, task):
+        return task in self._key_of
+
+    def __eq__(self, other):
+        if isinstance(other, TaskList):
+            other = other._tasks
+        return self._tasks == other
+
+    def __repr__(self):
+        return "TaskList({!r})".format(self._tasks)
+
+    def index(self, task):
+        """Returns the position of the task in the list"""
+        try:
+            return self._position(self._key_of[task])
+        except KeyError:
+            raise ValueError("task is not in list") from None
+
+    def add(self, task):
+        """Inserts a new task after any other task with the same date"""
+        self._insert((task.date, next(self._seq)), task)
+
+    append = add
+
+    def extend(self, tasks):
+        """
+        Adds many new tasks at once, sorting the whole list and building its
+        indexes just once instead of inserting them one by one.
+        """
+        entries = list(zip(self._keys, self._tasks))
+        entries.extend(((task.date, next(self._seq)), task) for task in tasks)
+        self._build(entries)
+
+    def remove(self, task):
+        """Removes a task locating it by its key rather than by equality"""
+        if task not in self._key_of:
+            raise ValueError("task is not in list")
+        self._delete(self._key_of[task], task)
+
+    def update(self, task):
+        """
+        Updates the position of a task and the indexes after it has been
+        edited. It keeps its sequence number, so its order among tasks of the
+        same date doesn't change.
+        """
+        old_key = self._key_of[task]
+        self._delete(old_key, task)
+        self._insert((task.date, old_key[1]), task)
+
+    def logs(self):
+        """Returns an iterator over the logs of all tasks, to be saved"""
+        return (task.log() for task in self._tasks)
+
+    def arrays(self):
+        """
+        Returns the TaskArrays of the list, built once and then kept up to
+        date with every task added or removed. It returns None if NumPy is
+        not available or the times can't be held, which is also kept until
+        the list changes.
+        """
+        if self._arrays is None:
+            self._arrays = TaskArrays.from_tasks(self) or False
+        return self._arrays or None
+
+    def _build(self, entries):
+        """Fills the list and its indexes from (key, task) pairs"""
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self._keys = [key for key, _ in entries]
+        self._tasks = [task for _, task in entries]
+        self._key_of = dict(zip(self._tasks, self._keys))
+        self._arrays = None
+        for index in self.indexes.values():
+            index.build(entries)
+
+    def _insert(self, key, task):
+        """Inserts a task under the key given and adds it to the indexes"""
+        position = bisect.bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._tasks.insert(position, task)
+        self._key_of[task] = key
+        if self._arrays and not self._arrays.insert(position, task):
+            self._arrays = False
+        for index in self.indexes.values():
+            index.add(key, task)
+
+    def _delete(self, key, task):
+        """Deletes a task stored under the key given from list and indexes"""
+        position = self._position(key)
+        del self._keys[position]
+        del self._tasks[position]
+        del self._key_of[task]
+        if self._arrays:
+            self._arrays.delete(position)
+        else:
+            # A task whose time couldn't be held may be the one removed
+            self._arrays = None
+        for index in self.indexes.values():
+            index.remove(key, task)
+
+    def _position(self, key):
+        """Returns the position of the task stored under the key given"""
+        return bisect.bisect_left(self._keys, key)
+
+
+class ProxyTaskList:
+    """
+    Base class of the sorted lists of tasks that read their storage only as
+    tasks are needed, each storage its own way. Tasks are created one by one
+    when they are accessed, and kept so the same row is always the same
+    task. Until it is loaded the list itself works as the indexes named in
+    INDEXES, answering them straight from the storage.
+
+    The list is read only: the first change made to it (or any operation it
+    can't do lazily) loads all remaining tasks into a list built with the
+    function given, and from then on everything is done by that list.
+    """
+    INDEXES = ('date', 'id')
+
+    def __init__(self, build):
+        """
+        Initializes the list with the function that builds the full list of
+        tasks from an iterable of tasks.
+        """
+        self.build = build
+        self._list = None
+        self._tasks = {}
+        self._positions = {}
+
+    def __len__(self):
+        if self._list is not None:
+            return len(self._list)
+        return self._count()
+
+    def __getitem__(self, index):
+        """Slices are returned as plain lists of tasks"""
+        if self._list is not None:
+            return self._list[index]
+        length = self._count()
+        if isinstance(index, slice):
+            return [self._task(i) for i in range(*index.indices(length))]
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("list index out of range")
+        return self._task(index)
+
+    def __iter__(self):
+        if self._list is not None:
+            return iter(self._list)
+        return self._all()
+
+    def __contains__(self, task):
+        if self._list is not None:
+            return task in self._list
+        return task in self._positions
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    @property
+    def loaded(self):
+        """True once all tasks have been loaded into the full list"""
+        return self._list is not None
+
+    @property
+    def indexes(self):
+        """
+        The indexes of the full list once loaded. Before that, the list
+        itself works as the indexes named in INDEXES.
+        """
+        if self._list is not None:
+            return self._list.indexes
+        return {name: self for name in self.INDEXES}
+
+    def index(self, task):
+        """Returns the position of the task in the list"""
+        if self._list is not None:
+            return self._list.index(task)
+        try:
+            return self._positions[task]
+        except KeyError:
+            raise ValueError("task is not in list") from None
+
+    def on(self, date):
+        """Returns a list of the tasks of a date"""
+        return self.between(date, date)
+
+    def between(self, start_date, end_date):
+        """Returns a list of the tasks between two dates, both included"""
+        raise NotImplementedError()
+
+    def get(self, task_id):
+        """Loads all tasks and returns the one with the id given, or None"""
+        return self.load().indexes['id'].get(task_id)
+
+    def add(self, task):
+        """Loads all tasks and adds a new one to the full list"""
+        self.load().add(task)
+
+    append = add
+
+    def extend(self, tasks):
+        """Loads all tasks and adds many new ones to the full list"""
+        self.load().extend(tasks)
+
+    def remove(self, task):
+        """Loads all tasks and removes one from the full list"""
+        self.load().remove(task)
+
+    def update(self, task):
+        """Loads all tasks and updates an edited one in the full list"""
+        self.load().update(task)
+
+    def logs(self):
+        """Returns an iterator over the logs of all tasks, to be saved"""
+        return self.load().logs()
+
+    def arrays(self):
+        """Returns the TaskArrays of the full list"""
+        return self.load().arrays()
+
+    def load(self):
+        """Loads every task into the full list, once, and returns it"""
+        if self._list is None:
+            self._list = self.build(self._all())
+            self._release()
+        return self._list
+
+    def _count(self):
+        """Returns the number of tasks in the storage, before loading them"""
+        raise NotImplementedError()
+
+    def _task(self, position):
+        """Returns the task at the position given, before loading them"""
+        raise NotImplementedError()
+
+    def _all(self):
+        """Returns an iterator over all tasks, before loading them"""
+        return (self._task(i) for i in range(self._count()))
+
+    def _release(self):
+        """Drops what was kept to read the tasks, once they are loaded"""
+        self._tasks = {}
+        self._positions = {}
+
+
+class TaskView:
+    """
+    The tasks found by a search, kept up to date while they are shown. The
+    tasks can come from an iterator, and then they are pulled from it only
+    as they are needed, so the first ones are shown before the search ends.
+    Each task gets a sequence number in the order of the result, so a task
+    is located with a binary search instead of comparing it with every task.
+    Deleted tasks leave the view. Edited tasks keep their place, even if
+    they no longer meet the search, so the result doesn't jump while it is
+    browsed: searching again gives the new result. New tasks that meet the
+    predicate of the search, if given, are added to the view.
+    """
+    def __init__(self, tasks=(), predicate=None):
+        """
+        Initializes the view with the tasks found, in their order, and the
+        predicate they were found with.
+        """
+        self._tasks = []
+        self._seqs = []
+        self._seq_of = {}
+        self._source = iter(tasks)
+        self.predicate = predicate
+
+    @property
+    def complete(self):
+        """True once every task found has been pulled"""
+        return self._source is None
+
+    @property
+    def known(self):
+        """The number of tasks pulled so far"""
+        return len(self._tasks)
+
+    def pull(self, count=None):
+        """
+        Pulls tasks from the search until there are count of them, or all of
+        them if count is None. It returns the number of tasks pulled so far.
+        """
+        if self._source is not None:
+            if count is None:
+                new = list(self._source)
+                self._source = None
+            else:
+                new = list(itertools.islice(
+                    self._source, max(count - len(self._tasks), 0)))
+                if len(self._tasks) + len(new) < count:
+                    self._source = None
+            seq = self._seqs[-1] + 1 if self._seqs else 0
+            seqs = range(seq, seq + len(new))
+            self._tasks.extend(new)
+            self._seqs.extend(seqs)
+            self._seq_of.update(zip(new, seqs))
+        return len(self._tasks)
+
+    def __len__(self):
+        return self.pull()
+
+    def __getitem__(self, index):
+        """Slices are returned as plain lists of tasks"""
+        if isinstance(index, slice):
+            if (index.start or 0) < 0 or index.stop is None or index.stop < 0:
+                self.pull()
+            else:
+                self.pull(index.stop)
+        elif index < 0:
+            self.pull()
+        else:
+            self.pull(index + 1)
+        return self._tasks[index]
+
+    def __delitem__(self, index):
+        self.pull()
+        del self._seq_of[self._tasks[index]]
+        del self._seqs[index]
+        del self._tasks[index]
+
+    def __iter__(self):
+        position = 0
+        while position < self.pull(position + 1):
+            yield self._tasks[position]
+            position += 1
+
+    def __contains__(self, task):
+        self.pull()
+        return task in self._seq_of
+
+    def __eq__(self, other):
+        if isinstance(other, TaskView):
+            other = other[:]
+        return self[:] == other
+
+    # Views are kept in sets by identity
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return "TaskView({!r})".format(self[:])
+
+    def index(self, task):
+        """Returns the position of the task in the view"""
+        self.pull()
+        try:
+            return bisect.bisect_left(self._seqs, self._seq_of[task])
+        except KeyError:
+            raise ValueError("task is not in view") from None
+
+    def discard(self, task):
+        """Removes a task from the view, if it is there"""
+        if task in self:
+            del self[self.index(task)]
+
+    def add(self, task):
+        """
+        Adds a new task to the view, after the tasks of its date and the ones
+        before, as a TaskList does. Every task is numbered again.
+        """
+        self.pull()
+        if task in self._seq_of:
+            return
+        position = len(self._tasks)
+        while position and self._tasks[position - 1].date > task.date:
+            position -= 1
+        self._tasks.insert(position, task)
+        self._seqs = list(range(len(self._tasks)))
+        self._seq_of = dict(zip(self._tasks, self._seqs))
+
+
+class TaskArrays:
+    """
+    Date ordinals and minutes spent of a list of tasks held as NumPy arrays,
+    so filters are evaluated for all tasks at once as boolean masks instead
+    of comparing task by task. Masks can be combined with & and |, and
+    select returns the tasks where a mask is true, in the order of the list.
+    """
+    def __init__(self, tasks, dates, minutes):
+        """
+        Initializes the arrays of a list of tasks. The position of each task
+        in the list must be the same as in the arrays.
+        """
+        self.tasks = tasks
+        self.dates = dates
+        self.minutes = minutes
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        """
+        Returns the arrays of a list of tasks, or None if NumPy is not
+        available or any time spent is not a number written as such (like
+        '060'), as it would not be compared the same as its text.
+        """
+        if numpy is None:
+            return None
+        try:
+            minutes = numpy.fromiter(
+                (minutes_of(task.time) for task in tasks), numpy.int64,
+                len(tasks))
+        except (TypeError, ValueError):
+            return None
+        dates = numpy.fromiter(
+            (task.date.toordinal() for task in tasks), numpy.int64,
+            len(tasks))
+        return cls(tasks, dates, minutes)
+
+    def date_mask(self, date):
+        """Returns a mask of the tasks of a date"""
+        return self.dates == date.toordinal()
+
+    def range_mask(self, start_date, end_date):
+        """Returns a mask of the tasks between two dates, both included"""
+        return ((self.dates >= start_date.toordinal())
+                & (self.dates <= end_date.toordinal()))
+
+    def time_mask(self, time):
+        """
+        Returns a mask of the tasks with the time spent given. A time that is
+        not a number written as such is never found, as the times held are.
+        """
+        try:
+            minutes = minutes_of(time)
+        except (TypeError, ValueError):
+            return numpy.zeros(len(self.minutes), bool)
+        return self.minutes == minutes
+
+    def insert(self, position, task):
+        """
+        Inserts the values of a task added to the list at the position given.
+        It returns False if its time spent can't be held, and then the arrays
+        are no longer valid.
+        """
+        try:
+            minutes = minutes_of(task.time)
+        except (TypeError, ValueError):
+            return False
+        self.dates = numpy.insert(self.dates, position, task.date.toordinal())
+        self.minutes = numpy.insert(self.minutes, position, minutes)
+        return True
+
+    def delete(self, position):
+        """Deletes the values of the task removed from the position given"""
+        self.dates = numpy.delete(self.dates, position)
+        self.minutes = numpy.delete(self.minutes, position)
+
+    def positions(self, mask):
+        """Returns an array with the positions where a mask is true"""
+        return numpy.flatnonzero(mask)
+
+    def select(self, mask):
+        """Returns a list of the tasks where a mask is true"""
+        tasks = self.tasks
+        return [tasks[position] for position in self.positions(mask).tolist()]
+
+
+class Predicate:
+    """
+    Base class of the conditions a task must meet to be found by a query.
+    Each predicate can check a single task with matches, and select the tasks
+    that meet it from a whole list, using the indexes or the TaskArrays of
+    the list when it has them. Predicates are combined with & (And) and
+    | (Or), and those choose the cheapest way to evaluate them.
+    """
+    # Relative costs of checking a task and of going through a whole list
+    CHECK_COST = 1
+    SCAN_COST = 1000
+
+    def matches(self, task):
+        """Returns True if the task meets the condition"""
+        raise NotImplementedError()
+
+    def lookup(self, tasks):
+        """
+        Returns the list of tasks that meet the condition using an index of
+        the list, or None if there is no index to use.
+        """
+        return None
+
+    def cost(self, tasks):
+        """
+        Returns the estimated cost of selecting the tasks of a list. Indexed
+        predicates are cheaper than the ones that need a scan.
+        """
+        return self.SCAN_COST * self.CHECK_COST
+
+    def mask(self, arrays):
+        """
+        Returns the mask of the tasks that meet the condition on the
+        TaskArrays of a list, or None if it can't be told from them.
+        """
+        return None
+
+    def select(self, tasks):
+        """Returns a list of the tasks that meet the condition"""
+        found = self.lookup(tasks)
+        if found is None:
+            found = [
+                task for task in profiling.counted('tasks scanned', tasks)
+                if self.matches(task)]
+        return found
+
+    def stream(self, tasks):
+        """
+        Returns an iterator over the tasks that meet the condition, in the
+        order of the list. Indexes are used at once, but without an index the
+        list is scanned only as far as the tasks are pulled, so the first
+        ones are found at once.
+        """
+        found = self.lookup(tasks)
+        if found is None:
+            return (
+                task for task in profiling.counted('tasks scanned', tasks)
+                if self.matches(task))
+        return iter(found)
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+
+class DateIs(Predicate):
+    """Tasks of a date"""
+
+    def __init__(self, date):
+        """Initializes the predicate with the date to find"""
+        self.date = date
+
+    def matches(self, task):
+        return task.date == self.date
+
+    def lookup(self, tasks):
+        index = TaskSearch.find_index(tasks, 'date')
+        if index is not None:
+            return index.on(self.date)
+        arrays = TaskSearch.find_arrays(tasks)
+        if arrays is not None:
+            return arrays.select(self.mask(arrays))
+        return None
+
+    def mask(self, arrays):
+        return arrays.date_mask(self.date)
+
+    def cost(self, tasks):
+        if TaskSearch.find_index(tasks, 'date') is not None:
+            return 1
+        return super().cost(tasks)
+
+
+class DateBetween(Predicate):
+    """Tasks between two dates, both included"""
+
+    def __init__(self, start_date, end_date):
+        """Initializes the predicate with the first and last dates"""
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def matches(self, task):
+        return self.start_date <= task.date <= self.end_date
+
+    def lookup(self, tasks):
+        index = TaskSearch.find_index(tasks, 'date')
+        if index is not None:
+            return index.between(self.start_date, self.end_date)
+        arrays = TaskSearch.find_arrays(tasks)
+        if arrays is not None:
+            return arrays.select(self.mask(arrays))
+        return None
+
+    def mask(self, arrays):
+        return arrays.range_mask(self.start_date, self.end_date)
+
+    def cost(self, tasks):
+        if TaskSearch.find_index(tasks, 'date') is not None:
+            return 2 + (self.end_date - self.start_date).days
+        return super().cost(tasks)
+
+
+class TimeIs(Predicate):
+    """Tasks with a time spent, in minutes"""
+
+    def __init__(self, time):
+        """Initializes the predicate with the minutes to find"""
+        self.time = str(time)
+
+    def matches(self, task):
+        return task.time == self.time
+
+    def lookup(self, tasks):
+        index = TaskSearch.find_index(tasks, 'time')
+        if index is not None:
+            return index.spent(self.time)
+        arrays = TaskSearch.find_arrays(tasks)
+        if arrays is not None:
+            return arrays.select(self.mask(arrays))
+        return None
+
+    def mask(self, arrays):
+        return arrays.time_mask(self.time)
+
+    def cost(self, tasks):
+        if TaskSearch.find_index(tasks, 'time') is not None:
+            return 10
+        return super().cost(tasks)
+
+
+class Contains(Predicate):
+    """Tasks which contain a text within their Title or Notes, ignoring case"""
+    CHECK_COST = 2
+
+    def __init__(self, text):
+        """Initializes the predicate with the text to find"""
+        self.text = text.lower()
+
+    def matches(self, task):
+        return (self.text in task.title.lower()
+                or self.text in task.notes.lower())
+
+    def lookup(self, tasks):
+        index = TaskSearch.find_index(tasks, 'text')
+        if index is not None:
+            return index.search(self.text)
+        return None
+
+    def cost(self, tasks):
+        if TaskSearch.find_index(tasks, 'text') is not None:
+            return 100 if len(self.text) >= 3 else 500
+        return super().cost(tasks)
+
+
+class Matches(Predicate):
+    """
+    Tasks whose Title or Notes match a regular expression. Patterns are
+    compiled through the cache of the patterns module, and tasks without the
+    literal text every match contains are skipped before the regex runs (if
+    it doesn't start with it), or found through the text index of the list.
+    Big lists are searched in parallel, in chunks, by a pool of processes.
+    """
+    CHECK_COST = 4
+    PARALLEL_THRESHOLD = 50000
+    PARALLEL_CHUNK_SIZE = 10000
+
+    def __init__(self, regex):
+        """Initializes the predicate with a pattern or a compiled regex"""
+        self.regex = patterns.compile(regex)
+        self.literal = patterns.literal(self.regex)
+        # A regex that starts with a literal finds it as fast on its own
+        self.prefilter = None if patterns.prefix(self.regex) else self.literal
+
+    def matches(self, task):
+        literal = self.prefilter
+        if (literal is not None and literal not in task.title
+                and literal not in task.notes):
+            return False
+        return bool(
+            self.regex.search(task.title) or self.regex.search(task.notes))
+
+    def indexed(self, tasks):
+        """
+        Returns the list of tasks that match using the regex index of the
+        list, or the text index to find the tasks with the literal, or None
+        if there is no index to use.
+        """
+        index = TaskSearch.find_index(tasks, 'regex')
+        if index is not None:
+            return index.match(self.regex)
+        index = TaskSearch.find_index(tasks, 'text')
+        if index is not None and self.literal and len(self.literal) >= 3:
+            return [
+                task for task in index.search(self.literal)
+                if self.matches(task)]
+        return None
+
+    def lookup(self, tasks):
+        found = self.indexed(tasks)
+        if found is None and len(tasks) >= self.PARALLEL_THRESHOLD:
+            return self.select_parallel(tasks)
+        return found
+
+    def cost(self, tasks):
+        if (TaskSearch.find_index(tasks, 'regex') is None
+                and TaskSearch.find_index(tasks, 'text') is not None
+                and self.literal and len(self.literal) >= 3):
+            return 100 * self.CHECK_COST
+        return super().cost(tasks)
+
+    def stream(self, tasks):
+        found = self.indexed(tasks)
+        if found is not None:
+            return iter(found)
+        if len(tasks) >= self.PARALLEL_THRESHOLD:
+            return self.stream_parallel(tasks)
+        return (
+            task for task in profiling.counted('tasks scanned', tasks)
+            if self.matches(task))
+
+    def select_parallel(self, tasks, workers=None):
+        """
+        Returns a list of tasks that match, splitting the tasks in chunks
+        that are searched by a pool of processes.
+        """
+        return list(self.stream_parallel(tasks, workers))
+
+    def stream_parallel(self, tasks, workers=None):
+        """
+        Yields the tasks that match, in the order of the list. The first
+        chunk is searched right here, so the first tasks are found without
+        waiting for the pool of processes. The rest of the chunks are sent to
+        the pool a few at a time, with only their texts.
+        """
+        size = self.PARALLEL_CHUNK_SIZE
+        for task in profiling.counted('tasks scanned', tasks[:size]):
+            if self.matches(task):
+                yield task
+        workers = workers or os.cpu_count() or 1
+        starts = iter(range(size, len(tasks), size))
+        pending = collections.deque()
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            def submit():
+                for start in itertools.islice(starts, 1):
+                    chunk = tasks[start:start + size]
+                    texts = [(task.title, task.notes) for task in chunk]
+                    future = executor.submit(
+                        match_texts, self.regex, texts, self.prefilter)
+                    pending.append((chunk, future))
+
+            try:
+                for _ in range(workers * 2):
+                    submit()
+                while pending:
+                    chunk, future = pending.popleft()
+                    submit()
+                    profiling.count('tasks scanned', len(chunk))
+                    for position in future.result():
+                        yield chunk[position]
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+
+class And(Predicate):
+    """
+    Tasks that meet all the predicates given. The cheapest predicate selects
+    the candidates, using an index if it can, and the rest are only checked
+    on them, the cheapest checks first. Without an index, predicates that
+    can all be told from the TaskArrays of the list are evaluated at once
+    as masks, and-ed together.
+    """
+
+    def __init__(self, *predicates):
+        """Initializes the predicate with the predicates to combine"""
+        self.predicates = predicates
+
+    def matches(self, task):
+        return all(predicate.matches(task) for predicate in self.predicates)
+
+    def cost(self, tasks):
+        return min(predicate.cost(tasks) for predicate in self.predicates)
+
+    def mask(self, arrays):
+        masks = [predicate.mask(arrays) for predicate in self.predicates]
+        if any(mask is None for mask in masks):
+            return None
+        return functools.reduce(operator.and_, masks)
+
+    def select(self, tasks):
+        """
+        Selects candidates with the cheapest predicate and checks them, or
+        selects the tasks at once with the masks of the predicates.
+        """
+        predicates = sorted(
+            self.predicates, key=lambda predicate: predicate.cost(tasks))
+        if predicates[0].cost(tasks) < self.SCAN_COST:
+            found = predicates[0].lookup(tasks)
+        else:
+            found = TaskSearch.masked(tasks, self)
+            if found is not None:
+                return found
+        if found is None:
+            found, rest = tasks, predicates
+        else:
+            rest = predicates[1:]
+        rest = sorted(rest, key=lambda predicate: predicate.CHECK_COST)
+        return [
+            task for task in profiling.counted('tasks scanned', found)
+            if all(predicate.matches(task) for predicate in rest)
+        ]
+
+    def stream(self, tasks):
+        """
+        Returns an iterator over the candidates of the cheapest indexed
+        predicate that meet the rest, or scans the list as far as the tasks
+        are pulled.
+        """
+        predicates = sorted(
+            self.predicates, key=lambda predicate: predicate.cost(tasks))
+        if predicates[0].cost(tasks) < self.SCAN_COST:
+            found, rest = predicates[0].stream(tasks), predicates[1:]
+        else:
+            found = TaskSearch.masked(tasks, self)
+            if found is not None:
+                return iter(found)
+            found, rest = tasks, predicates
+        rest = sorted(rest, key=lambda predicate: predicate.CHECK_COST)
+        return (
+            task for task in profiling.counted('tasks scanned', found)
+            if all(predicate.matches(task) for predicate in rest)
+        )
+
+
+class Or(Predicate):
+    """
+    Tasks that meet any of the predicates given. If all of them can use an
+    index, their results are merged in the order of the list. Otherwise the
+    masks of their TaskArrays are or-ed together if all have one, or the
+    list is scanned just once.
+    """
+
+    def __init__(self, *predicates):
+        """Initializes the predicate with the predicates to combine"""
+        self.predicates = predicates
+
+    def matches(self, task):
+        return any(predicate.matches(task) for predicate in self.predicates)
+
+    def cost(self, tasks):
+        costs = [predicate.cost(tasks) for predicate in self.predicates]
+        if max(costs) >= self.SCAN_COST:
+            return self.SCAN_COST * max(
+                predicate.CHECK_COST for predicate in self.predicates)
+        return sum(costs)
+
+    def mask(self, arrays):
+        masks = [predicate.mask(arrays) for predicate in self.predicates]
+        if any(mask is None for mask in masks):
+            return None
+        return functools.reduce(operator.or_, masks)
+
+    def select(self, tasks):
+        """Merges the results of indexed predicates, or scans the list once"""
+        if self.cost(tasks) >= self.SCAN_COST:
+            found = TaskSearch.masked(tasks, self)
+            if found is not None:
+                return found
+            predicates = sorted(
+                self.predicates, key=lambda predicate: predicate.CHECK_COST)
+            return [
+                task for task in profiling.counted('tasks scanned', tasks)
+                if any(predicate.matches(task) for predicate in predicates)
+            ]
+        found = {}
+        for predicate in self.predicates:
+            for task in predicate.select(tasks):
+                found[task] = None
+        return sorted(found, key=tasks.index)
+
+    def stream(self, tasks):
+        """Merges the indexed results at once, or scans the list lazily"""
+        if self.cost(tasks) < self.SCAN_COST:
+            return iter(self.select(tasks))
+        found = TaskSearch.masked(tasks, self)
+        if found is not None:
+            return iter(found)
+        predicates = sorted(
+            self.predicates, key=lambda predicate: predicate.CHECK_COST)
+        return (
+            task for task in profiling.counted('tasks scanned', tasks)
+            if any(predicate.matches(task) for predicate in predicates)
+        )
+
+
 class TaskSearch:
     """
     This class provides all different methods to search through a list of
-    tasks and returns the ones that meet the requirements.
+    tasks and returns the ones that meet the requirements. Each method asks
+    the user for what to search and then runs a query with the predicates
+    of this module, which can also be run without any prompt with query,
+    or with stream to get the tasks as they are found. The methods return a
+    TaskView that pulls the tasks found as they are shown.
+    When the list of tasks has indexes (like the TaskList of a WorkLog),
+    they are used instead of going through every task, and if NumPy is
+    available the filters are evaluated on its TaskArrays.
     """
 
+    @classmethod
+    def find_index(cls, tasks, name):
+        """Returns the index with the name given of a list of tasks, if any"""
+        return getattr(tasks, 'indexes', {}).get(name)
+
+    @classmethod
+    def find_arrays(cls, tasks):
+        """
+        Returns the TaskArrays of a list of tasks, if it keeps them and NumPy
+        is available.
+        """
+        arrays = getattr(tasks, 'arrays', None)
+        if arrays is None:
+            return None
+        return arrays()
+
+    @classmethod
+    def masked(cls, tasks, predicate):
+        """
+        Returns a list of the tasks that meet a predicate told from the
+        TaskArrays of the list, or None if it can't be.
+        """
+        arrays = cls.find_arrays(tasks)
+        if arrays is None:
+            return None
+        mask = predicate.mask(arrays)
+        if mask is None:
+            return None
+        return arrays.select(mask)
+
+    @classmethod
+    @profiling.timed('TaskSearch.query')
+    def query(cls, tasks, predicate):
+        """Returns a list of the tasks that meet a predicate, no prompts"""
+        profiling.count('queries')
+        found = predicate.select(tasks)
+        profiling.count('tasks found', len(found))
+        return found
+
+    @classmethod
+    def stream(cls, tasks, predicate):
+        """
+        Returns an iterator over the tasks that meet a predicate, no prompts.
+        Tasks are found as they are pulled from it.
+        """
+        profiling.count('queries')
+        return profiling.counted('tasks found', predicate.stream(tasks))
+
+    @classmethod
+    def view(cls, tasks, predicate):
+        """
+        Returns a TaskView of the tasks that meet a predicate, which pulls
+        them as they are shown and takes in the new tasks that meet it.
+        """
+        return TaskView(cls.stream(tasks, predicate), predicate)
+
     @classmethod
     def search_date(cls, tasks):
         """Returns a list of tasks that match the exact date the user gives."""
         utils.clear_screen()
-        found = []
 
         # Asks the user to provide a date with the valid format
         search_date = utils.get_date()
 
-        # Fills a list with the tasks found (if any)
-        for task in tasks:
-            if task.date == search_date:
-                found.append(task)
-        return found
+        # Returns a list with the tasks found (if any)
+        return cls.view(tasks, DateIs(search_date))
 
     @classmethod
     def search_by_range(cls, tasks):
@@ -87,16 +1114,12 @@ class TaskSearch:
         provided by the user.
         """
         utils.clear_screen()
-        found = []
 
         # Asks the user to provide a valid range of dates
         start_date, end_date = utils.get_date_range()
 
-        # Fills a list with the tasks found (if any)
-        for task in tasks:
-            if start_date <= task.date <= end_date:
-                found.append(task)
-        return found
+        # Returns a list with the tasks found (if any)
+        return cls.view(tasks, DateBetween(start_date, end_date))
 
     @classmethod
     def search_time(cls, tasks):
@@ -105,16 +1128,12 @@ class TaskSearch:
         the user.
         """
         utils.clear_screen()
-        found = []
 
         # Asks the user to provide a valid time spent
         time = utils.get_time()
 
-        # Fills a list with the tasks found (if any)
-        for task in tasks:
-            if task.time == time:
-                found.append(task)
-        return found
+        # Returns a list with the tasks found (if any)
+        return cls.view(tasks, TimeIs(time))
 
     @classmethod
     def search_exact(cls, tasks):
@@ -123,16 +1142,12 @@ class TaskSearch:
         both within the Title or Notes (if task have it).
         """
         utils.clear_screen()
-        found = []
 
         # Asks the user to provide a string to search
         text = input("Enter a string to search on Title/Notes: ").lower()
 
-        # Fills a list with the tasks found (if any)
-        for task in tasks:
-            if text in task.title.lower() or text in task.notes.lower():
-                found.append(task)
-        return found
+        # Returns a list with the tasks found (if any)
+        return cls.view(tasks, Contains(text))
 
     @classmethod
     def search_regex(cls, tasks):
@@ -141,20 +1156,16 @@ class TaskSearch:
         the user. Only valid regex expression are allow to be used.
         """
         utils.clear_screen()
-        found = []
 
         # Ask the user to provide a regular expresion
         while True:
             text = (input("Enter a regular expression to search: "))
             try:
-                regex = re.compile(r'{}'.format(text))
+                regex = patterns.compile(text)
             except re.error:
                 print("Sorry, you must enter a valid regular expression\n")
             else:
                 break
 
-        # Fills a list with the tasks found (if any)
-        for task in tasks:
-            if re.search(regex, task.title) or re.search(regex, task.notes):
-                found.append(task)
-        return found
+        # Returns a list with the tasks found (if any)
+        return cls.view(tasks, Matches(regex))
@@ -1,15 +1,50 @@
 import datetime
 import io
+import itertools
+import json
+import os
+import pstats
+import re
+import shutil
+import sqlite3
 import sys
+import tempfile
+import time
 import unittest
 from unittest import mock
 
-from menu import MenuOption, Menu, SearchMenu, TaskMenu, MainMenu
+import benchmark
+import binary_log
+import cli
+import patterns
+import profiling
+import shards
+from menu import (
+    MenuOption, Menu, ReportMenu, SearchMenu, TaskMenu, MainMenu)
 import utils
-from task import Task, TaskSearch
+from index import DateIndex, TextIndex, TotalsIndex
+from shards import ShardedStorage, join_shards, split_csv
+from sqlite_log import export_csv, import_csv
+from storage import CsvStorage, JournalStorage, fcntl
+from task import (
+    And, Contains, DateBetween, DateIs, Matches, Or, Task, TaskArrays,
+    TaskList, TaskSearch, TaskView, TimeIs, numpy)
+from watch import InotifyWatcher, PollingWatcher
 from work_log import WorkLog
 
 
+def copy_of_log(test):
+    """
+    Returns the path of a copy of log.csv in a temporary directory removed
+    after the test, so tests never lock nor change the tracked log.
+    """
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    file = os.path.join(directory, 'log.csv')
+    shutil.copy('log.csv', file)
+    return file
+
+
 #################
 #  TASK TESTS   #
 #################
@@ -35,6 +70,17 @@ class TaskTests(unittest.TestCase):
         self.assertTrue(fake_time.called)
         self.assertTrue(fake_notes.called)
 
+    def test_ids(self):
+        self.assertRegex(self.task.id, r'^[0-9a-f]{16}$')
+        self.assertEqual(self.task.log()['Id'], self.task.id)
+        task = Task(**self.task.log())
+        self.assertEqual(task.id, self.task.id)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.task, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.task.other = 'Not allowed'
+
     def test_show(self):
         output = io.StringIO()
         sys.stdout = output
@@ -108,6 +154,16 @@ class TaskSearchTests(unittest.TestCase):
         result = TaskSearch.search_regex(self.tasks)
         self.assertEqual(len(result), 0)
 
+    @mock.patch('builtins.input')
+    @mock.patch('task.Matches.PARALLEL_CHUNK_SIZE', 3)
+    @mock.patch('task.Matches.PARALLEL_THRESHOLD', 1)
+    def test_search_regex_parallel(self, fake_input):
+        fake_input.return_value = r'[Pp]ar|\d{3}'
+        tasks = WorkLog(copy_of_log(self)).TASKS
+        result = TaskSearch.search_regex(tasks)
+        self.assertEqual([task.title for task in result], [
+            "Susan's birthday", "Party at Carol's", 'Call Logan'])
+
     @mock.patch('builtins.input')
     def test_search_regex_exception_first(self, fake_input):
         fake_input.side_effect = ['\w+[[', '\w+']
@@ -115,6 +171,242 @@ class TaskSearchTests(unittest.TestCase):
         self.assertEqual(len(result), 2)
 
 
+class TaskListTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tasks = [
+            Task(Date='15/06/2018', Title='First', Time='10', Notes=''),
+            Task(Date='01/01/2018', Title='Second', Time='20', Notes=''),
+            Task(Date='15/06/2018', Title='Third', Time='30', Notes=''),
+        ]
+        self.task_list = TaskList(self.tasks)
+
+    def test_init_sorts_and_keeps_same_day_order(self):
+        titles = [task.title for task in self.task_list]
+        self.assertEqual(titles, ['Second', 'First', 'Third'])
+
+    def test_add_after_same_day_tasks(self):
+        task = Task(Date='15/06/2018', Title='Fourth', Time='40', Notes='')
+        self.task_list.add(task)
+        self.assertIs(self.task_list[-1], task)
+        self.assertEqual(len(self.task_list), 4)
+
+    def test_remove(self):
+        self.task_list.remove(self.tasks[2])
+        self.assertNotIn(self.tasks[2], self.task_list)
+        self.assertEqual(self.task_list, [self.tasks[1], self.tasks[0]])
+        with self.assertRaises(ValueError):
+            self.task_list.remove(self.tasks[2])
+
+    def test_update_repositions_only_edited_task(self):
+        self.tasks[0].date = datetime.date(2017, 1, 1)
+        self.task_list.update(self.tasks[0])
+        self.assertEqual(
+            self.task_list, [self.tasks[0], self.tasks[1], self.tasks[2]])
+        self.assertEqual(self.task_list.index(self.tasks[2]), 2)
+
+    def test_extend_keeps_order(self):
+        tasks = [
+            Task(Date='15/06/2018', Title='Fourth', Time='40', Notes=''),
+            Task(Date='01/01/2017', Title='Fifth', Time='50', Notes=''),
+        ]
+        self.task_list.extend(tasks)
+        titles = [task.title for task in self.task_list]
+        self.assertEqual(
+            titles, ['Fifth', 'Second', 'First', 'Third', 'Fourth'])
+        self.assertEqual(self.task_list.index(tasks[0]), 4)
+
+
+class TaskViewTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tasks = [
+            Task(Date='15/06/2018', Title=str(number), Time='10', Notes='')
+            for number in range(5)
+        ]
+        self.view = TaskView(self.tasks)
+
+    def test_index_and_delete(self):
+        self.assertEqual(self.view.index(self.tasks[3]), 3)
+        del self.view[1]
+        self.assertEqual(self.view.index(self.tasks[3]), 2)
+        self.assertNotIn(self.tasks[1], self.view)
+        with self.assertRaises(ValueError):
+            self.view.index(self.tasks[1])
+
+    def test_tasks_are_pulled_when_needed(self):
+        pulled = []
+        view = TaskView(pulled.append(task) or task for task in self.tasks)
+        self.assertIs(view[1], self.tasks[1])
+        self.assertEqual(len(pulled), 2)
+        self.assertFalse(view.complete)
+        self.assertEqual(view.pull(10), 5)
+        self.assertTrue(view.complete)
+
+    def test_stream_scans_only_as_needed(self):
+        checked = []
+        predicate = Contains('')
+        predicate.matches = lambda task: checked.append(task) or True
+        found = TaskSearch.stream(self.tasks, predicate)
+        self.assertIs(next(found), self.tasks[0])
+        self.assertEqual(len(checked), 1)
+
+    def test_discard(self):
+        self.view.discard(self.tasks[4])
+        self.view.discard(self.tasks[4])
+        self.assertEqual(self.view, self.tasks[:4])
+
+
+class QueryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self))
+        self.tasks = self.log.TASKS
+        self.plain = list(self.tasks)
+
+    def titles(self, predicate):
+        found = TaskSearch.query(self.tasks, predicate)
+        self.assertEqual(found, TaskSearch.query(self.plain, predicate))
+        return [task.title for task in found]
+
+    def test_single_predicates(self):
+        date = datetime.date(2018, 6, 15)
+        self.assertEqual(len(self.titles(DateIs(date))), 2)
+        self.assertEqual(len(self.titles(DateBetween(
+            datetime.date(2018, 1, 1), datetime.date(2018, 3, 1)))), 3)
+        self.assertEqual(len(self.titles(TimeIs(60))), 2)
+        self.assertEqual(len(self.titles(Contains('PARTY'))), 2)
+        self.assertEqual(self.titles(Matches(r'\d{3}-')), ['Call Logan'])
+
+    def test_and_or(self):
+        predicate = DateBetween(
+            datetime.date(2018, 1, 1), datetime.date(2018, 6, 30)) & (
+            TimeIs(100) | Contains('party'))
+        self.assertEqual(self.titles(predicate), [
+            "Susan's birthday", 'Job Fair', "Party at Carol's",
+            'Python exam'])
+        predicate = Or(DateIs(datetime.date(2018, 7, 4)), Contains('fair'))
+        self.assertEqual(self.titles(predicate), ['Job Fair', 'Call Logan'])
+        predicate = And(Matches('^P'), TimeIs(100))
+        self.assertEqual(self.titles(predicate), ['Python exam'])
+
+    def test_regex_literal_prefilter(self):
+        regex = Matches(r'\w+ Logan')
+        self.assertEqual(regex.prefilter, ' Logan')
+        self.assertIsNone(Matches(r'^Call \w+').prefilter)
+        with mock.patch.object(
+                regex, 'regex', mock.Mock(wraps=regex.regex)) as fake_regex:
+            self.assertEqual(
+                TaskSearch.query(self.plain, regex), [self.tasks[-1]])
+        self.assertEqual(fake_regex.search.call_count, 1)
+        self.assertEqual(self.titles(regex), ['Call Logan'])
+        self.assertEqual(self.titles(Matches('(?i)CALL')), ['Call Logan'])
+
+    def test_regex_literal_uses_text_index(self):
+        regex = Matches('exa[mn]')
+        self.assertLess(regex.cost(self.tasks), regex.cost(self.plain))
+        with mock.patch.object(
+                self.tasks.indexes['text'], 'search',
+                wraps=self.tasks.indexes['text'].search) as fake_search:
+            self.assertEqual(self.titles(regex), ['Python exam'])
+        fake_search.assert_called_once_with('exa')
+
+    def test_indexed_predicate_runs_first(self):
+        regex = Matches('o')
+        date = DateIs(datetime.date(2018, 6, 15))
+        with mock.patch.object(regex, 'lookup') as fake_lookup:
+            found = TaskSearch.query(self.tasks, regex & date)
+        self.assertFalse(fake_lookup.called)
+        self.assertEqual(len(found), 2)
+
+
+class TaskArraysTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self))
+        self.tasks = self.log.TASKS
+
+    @mock.patch('task.numpy', None)
+    def test_no_numpy(self):
+        self.assertIsNone(self.tasks.arrays())
+        self.assertIsNone(TaskSearch.find_arrays(self.tasks))
+        self.assertIsNone(TaskSearch.find_arrays(list(self.tasks)))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_masks(self):
+        arrays = self.tasks.arrays()
+        self.assertEqual(
+            arrays.select(arrays.date_mask(datetime.date(2018, 6, 15))),
+            self.tasks[5:7])
+        mask = arrays.range_mask(
+            datetime.date(2018, 2, 1), datetime.date(2018, 6, 30))
+        self.assertEqual(arrays.select(mask), self.tasks[1:7])
+        mask &= arrays.time_mask('100')
+        self.assertEqual(list(arrays.positions(mask)), [2, 6])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_times_compare_as_text(self):
+        task = self.tasks[0]
+        task.time = '060'
+        self.tasks.update(task)
+        for spent in ('60', '060', 'abc'):
+            with self.subTest(time=spent):
+                self.assertEqual(
+                    TaskSearch.query(self.tasks, TimeIs(spent)),
+                    TaskSearch.query(list(self.tasks), TimeIs(spent)))
+        self.assertIsNone(self.tasks.arrays())
+        arrays = WorkLog(copy_of_log(self)).TASKS.arrays()
+        self.assertEqual(arrays.select(arrays.time_mask('060')), [])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_arrays_follow_changes(self):
+        arrays = self.tasks.arrays()
+        self.assertIs(self.tasks.arrays(), arrays)
+        self.tasks.remove(self.tasks[0])
+        task = self.tasks[3]
+        task.date, task.time = datetime.date(2019, 1, 1), '45'
+        self.tasks.update(task)
+        self.tasks.add(
+            Task.from_values('Added', datetime.date(2018, 3, 1), '5', ''))
+        self.assertIs(self.tasks.arrays(), arrays)
+        built = TaskArrays.from_tasks(self.tasks)
+        self.assertEqual(list(arrays.dates), list(built.dates))
+        self.assertEqual(list(arrays.minutes), list(built.minutes))
+        task.time = '045'
+        self.tasks.update(task)
+        self.assertIsNone(self.tasks.arrays())
+        task.time = '45'
+        self.tasks.update(task)
+        self.assertEqual(len(self.tasks.arrays().dates), 8)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_and_or_combine_masks(self):
+        tasks = TaskList(self.tasks)
+        dates = DateBetween(
+            datetime.date(2018, 2, 1), datetime.date(2018, 6, 30))
+        times = TimeIs(100)
+        expected = TaskSearch.query(list(tasks), dates & times)
+        either = TaskSearch.query(list(tasks), dates | times)
+        with mock.patch.object(DateBetween, 'matches') as fake_dates, \
+                mock.patch.object(TimeIs, 'matches') as fake_times:
+            self.assertEqual(TaskSearch.query(tasks, dates & times), expected)
+            self.assertEqual(TaskSearch.query(tasks, dates | times), either)
+            self.assertEqual(list((dates & times).stream(tasks)), expected)
+        fake_dates.assert_not_called()
+        fake_times.assert_not_called()
+        self.assertEqual([task.title for task in expected], [
+            'Job Fair', 'Python exam'])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    @mock.patch('utils.get_time')
+    def test_search_time_with_columns(self, fake_time):
+        fake_time.return_value = '60'
+        tasks = WorkLog(copy_of_log(self), columnar=True).TASKS
+        result = TaskSearch.search_time(tasks)
+        self.assertEqual([task.title for task in result], [
+            'New year celebration', 'Review some projects'])
+
+
 #################
 #  UTILS TESTS  #
 #################
@@ -154,6 +446,33 @@ class UtilsTests(unittest.TestCase):
         self.assertEqual(result, '10')
         self.assertEqual(fake_print.call_count, 1)
 
+    def test_parse_date_accepts_same_as_strptime(self):
+        texts = [
+            '05/03/2018', '5/3/2018', ' 5/03/2018', '31/12/1999',
+            '29/02/2020', '29/02/2019', '00/03/2018', '05/00/2018',
+            '32/01/2018', '05/13/2018', '05/03/18', '05/03/20181',
+            '05-03-2018', '05/03/2018 ', '01/01/0000', '\u0661/03/2018',
+            '١٢/٠٣/٢٠١٨', '+5/03/2018', '',
+        ]
+        for text in texts:
+            try:
+                expected = datetime.datetime.strptime(text, '%d/%m/%Y').date()
+            except ValueError:
+                with self.assertRaises(ValueError, msg=text):
+                    utils.parse_date(text)
+            else:
+                self.assertEqual(utils.parse_date(text), expected, text)
+
+    def test_parse_date_cache(self):
+        utils.parse_date.cache_clear()
+        utils.parse_date('05/03/2018')
+        utils.parse_date('05/03/2018')
+        self.assertEqual(utils.parse_date.cache_info().hits, 1)
+
+    def test_format_date(self):
+        date = datetime.date(2018, 3, 5)
+        self.assertEqual(utils.format_date(date), '05/03/2018')
+
     @mock.patch('builtins.input')
     def test_get_notes(self, fake_input):
         fake_input.return_value = 'Test notes'
@@ -161,13 +480,281 @@ class UtilsTests(unittest.TestCase):
         self.assertEqual(result, 'Test notes')
 
 
+class ScreenTests(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = utils.Screen()
+        self.output = io.StringIO()
+        self.output.isatty = lambda: True
+        size = mock.patch('shutil.get_terminal_size')
+        size.start().return_value = os.terminal_size((80, 24))
+        self.addCleanup(size.stop)
+
+    def draw(self, *lines, partial=False):
+        with mock.patch('sys.stdout', self.output):
+            with self.screen.frame(partial):
+                for line in lines:
+                    print(line)
+        text = self.output.getvalue()
+        self.output.seek(0)
+        self.output.truncate()
+        return text
+
+    def test_clear_without_subprocess(self):
+        with mock.patch('sys.stdout', self.output), \
+                mock.patch('os.system') as fake_system:
+            utils.clear_screen()
+            self.assertEqual(self.output.getvalue(), utils.CLEAR)
+            self.assertFalse(fake_system.called)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            utils.clear_screen()
+        self.assertEqual(out.getvalue(), '')
+
+    @mock.patch('utils.ansi_enabled', return_value=False)
+    def test_clear_without_ansi(self, fake_ansi):
+        with mock.patch('sys.stdout', self.output), \
+                mock.patch('os.system') as fake_system:
+            utils.clear_screen()
+        self.assertEqual(self.output.getvalue(), '\n' * 24)
+        self.assertFalse(fake_system.called)
+        self.assertFalse(utils.enable_virtual_terminal())
+
+    def test_frame_is_written_at_once(self):
+        self.assertEqual(self.draw('a', 'b'), utils.CLEAR + 'a\nb\n')
+        self.output.isatty = lambda: False
+        self.assertEqual(self.draw('a', 'b'), 'a\nb\n')
+
+    def test_partial_frame_rewrites_changed_lines(self):
+        self.draw('Title', 'Result 1 of 3', 'Options')
+        text = self.draw('Title', 'Result 2 of 3', 'Options', partial=True)
+        self.assertEqual(text, (
+            '\x1b[2;1HResult 2 of 3\x1b[K\x1b[4;1H\x1b[J'))
+
+    def test_partial_frame_redraws_what_does_not_fit(self):
+        self.draw('Title')
+        text = self.draw('x' * 100, partial=True)
+        self.assertTrue(text.startswith(utils.CLEAR))
+        self.screen.invalidate()
+        text = self.draw('Title', partial=True)
+        self.assertTrue(text.startswith(utils.CLEAR))
+
+
+###################
+#  INDEX TESTS    #
+###################
+class DateIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self))
+        self.index = self.log.TASKS.indexes['date']
+
+    def test_build(self):
+        self.assertEqual(len(self.index.dates), 7)
+        self.assertEqual(
+            self.index.on(datetime.date(2018, 6, 15)), self.log.TASKS[5:7])
+        self.assertEqual(self.index.on(datetime.date(2018, 6, 16)), [])
+
+    def test_between(self):
+        found = self.index.between(
+            datetime.date(2018, 2, 18), datetime.date(2018, 6, 15))
+        self.assertEqual(found, self.log.TASKS[1:7])
+
+    def test_follows_changes_of_the_list(self):
+        task = self.log.TASKS[0]
+        task.date = datetime.date(2018, 6, 15)
+        self.log.TASKS.update(task)
+        self.assertEqual(self.index.on(datetime.date(2018, 1, 1)), [])
+        self.assertIs(self.index.on(datetime.date(2018, 6, 15))[0], task)
+        self.log.TASKS.remove(task)
+        self.assertEqual(len(self.index.on(datetime.date(2018, 6, 15))), 2)
+        self.assertNotIn(datetime.date(2018, 1, 1), self.index.dates)
+
+    @mock.patch('utils.get_date_range')
+    def test_search_by_range_uses_index(self, fake_range):
+        fake_range.return_value = (
+            datetime.date(2018, 3, 1), datetime.date(2018, 12, 31))
+        with mock.patch.object(
+                DateIndex, 'between', wraps=self.index.between) as between:
+            result = TaskSearch.search_by_range(self.log.TASKS)
+        self.assertTrue(between.called)
+        self.assertEqual(result, self.log.TASKS[3:])
+
+
+class TextIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self))
+        self.index = self.log.TASKS.indexes['text']
+        self.index.scans = TextIndex.SCANS
+
+    def scan(self, text):
+        text = text.lower()
+        return [
+            task for task in self.log.TASKS
+            if text in task.title.lower() or text in task.notes.lower()
+        ]
+
+    def test_search_matches_scan(self):
+        for text in ['party', 'PARTY', 'o', 'ar', 's b', "'s", '555-',
+                     'nothing', '', 'in madrid']:
+            self.assertEqual(self.index.search(text), self.scan(text), text)
+
+    def test_follows_changes_of_the_list(self):
+        task = self.log.TASKS[0]
+        task.title = 'Brand new title'
+        self.log.TASKS.update(task)
+        self.assertEqual(self.index.search('new year'), [])
+        self.assertEqual(self.index.search('brand'), [task])
+        self.log.TASKS.remove(task)
+        self.assertEqual(self.index.search('brand'), [])
+        self.assertNotIn(task, self.index.numbers)
+        for task in list(self.log.TASKS)[:5]:
+            self.log.TASKS.remove(task)
+        self.assertIsNone(self.index.grams)
+        for text in ['party', 'o', 'exam']:
+            self.assertEqual(self.index.search(text), self.scan(text), text)
+        self.assertEqual(len(self.index.tasks), 2)
+
+    def test_postings_are_built_after_some_scans(self):
+        self.index.scans = 0
+        for _ in range(TextIndex.SCANS):
+            self.assertEqual(self.index.search('party'), self.scan('party'))
+        self.assertIsNone(self.index.grams)
+        self.assertEqual(self.index.search('party'), self.scan('party'))
+        self.assertEqual(len(self.index.grams['par']), 2)
+        task = self.log.TASKS[0]
+        task.title = 'Brand new title'
+        self.log.TASKS.update(task)
+        self.assertEqual(self.index.search('new year'), [])
+        self.assertEqual(self.index.search('brand'), [task])
+
+    @mock.patch('builtins.input')
+    def test_search_exact_uses_index(self, fake_input):
+        fake_input.return_value = 'Party'
+        with mock.patch.object(
+                TextIndex, 'search', wraps=self.index.search) as search:
+            result = TaskSearch.search_exact(self.log.TASKS)
+        self.assertTrue(search.called)
+        self.assertEqual(result, self.scan('party'))
+        self.assertEqual(len(result), 2)
+
+
+class TotalsIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self))
+        self.index = self.log.TASKS.indexes['totals']
+
+    def test_totals(self):
+        self.assertEqual(self.index.total(), (580, 8))
+        self.assertEqual(self.index.total(
+            datetime.date(2018, 2, 20), datetime.date(2018, 6, 15)), (385, 5))
+        self.assertEqual(self.index.total(
+            datetime.date(2019, 1, 1), datetime.date(2018, 1, 1)), (0, 0))
+        self.assertEqual(self.index.report('month')[1], ('02/2018', 220, 2))
+        self.assertEqual(self.index.report('week')[-1], ('2018-W27', 15, 1))
+        self.assertEqual(
+            self.index.report('day', datetime.date(2018, 6, 1)),
+            [('15/06/2018', 180, 2), ('04/07/2018', 15, 1)])
+        self.assertEqual(
+            self.log.report('title', datetime.date(2018, 7, 1)),
+            [('Call Logan', 15, 1)])
+
+    def test_totals_follow_changes(self):
+        task = self.log.TASKS[0]
+        task.date = datetime.date(2018, 7, 4)
+        task.time = '45'
+        self.log.TASKS.update(task)
+        self.log.TASKS.remove(self.log.TASKS[0])
+        self.assertEqual(self.index.total(), (445, 7))
+        self.assertEqual(self.index.report('month')[0], ('02/2018', 100, 1))
+        self.assertEqual(self.index.report('day')[-1], ('04/07/2018', 60, 2))
+        rebuilt = TotalsIndex.from_tasks(self.log.TASKS)
+        self.assertEqual(rebuilt.totals, self.index.totals)
+
+    def test_ranges_match_the_tasks_in_them(self):
+        tasks = list(self.log.TASKS)
+        for task in tasks[:3]:
+            self.log.TASKS.remove(task)
+        for number in range(40):
+            task = Task.from_values(
+                'Task {}'.format(number % 3),
+                datetime.date(2016, 12, 25) + datetime.timedelta(number * 53),
+                str(number + 1), '')
+            self.log.TASKS.add(task)
+            tasks.append(task)
+        tasks = list(self.log.TASKS)
+        dates = [
+            datetime.date(2016, 12, 31), datetime.date(2017, 3, 1),
+            datetime.date(2018, 2, 25), datetime.date(2018, 6, 30),
+            datetime.date(2020, 1, 6), None]
+        for start, end in itertools.product(dates, dates):
+            with self.subTest(start=start, end=end):
+                found = [
+                    task for task in tasks
+                    if (start is None or task.date >= start)
+                    and (end is None or task.date <= end)]
+                expected = TotalsIndex.from_tasks(found)
+                self.assertEqual(
+                    self.index.total(start, end),
+                    (sum(int(task.time) for task in found), len(found)))
+                for group in ('day', 'week', 'month'):
+                    self.assertEqual(
+                        self.index.report(group, start, end),
+                        expected.report(group))
+
+
+class PatternsTests(unittest.TestCase):
+
+    def test_compiled_patterns_are_cached(self):
+        regex = patterns.compile(r'\d+ minutes')
+        self.assertIs(patterns.compile(r'\d+ minutes'), regex)
+        self.assertIs(patterns.compile(regex), regex)
+        self.assertIsNot(patterns.compile(r'\d+ minutes', re.I), regex)
+        with self.assertRaises(re.error):
+            patterns.compile('[')
+
+    def test_literal(self):
+        cases = {
+            'party': 'party',
+            r'^Call \w+': 'Call ',
+            r'\d{3}-\d{4}': '-',
+            'a(bc)+d': 'bc',
+            '(abc)*': None,
+            'ab|cd': None,
+            'x?': None,
+            '(?i)party': None,
+            'a(?i:bcd)e': 'a',
+            r'(?x) big \ cat ': 'big cat',
+        }
+        for pattern, literal in cases.items():
+            with self.subTest(pattern=pattern):
+                self.assertEqual(
+                    patterns.literal(patterns.compile(pattern)), literal)
+        self.assertIsNone(patterns.literal(re.compile('party', re.I)))
+        self.assertIsNone(patterns.literal(re.compile(b'party')))
+
+    def test_prefix(self):
+        cases = {'party': 'party', r'^Call \w+': 'Call ', r'\w+ Logan': ''}
+        for pattern, prefix in cases.items():
+            with self.subTest(pattern=pattern):
+                self.assertEqual(
+                    patterns.prefix(patterns.compile(pattern)), prefix)
+
+
 ###################
 #  WORKLOG TESTS  #
 ###################
 class WorkLogTests(unittest.TestCase):
 
     def setUp(self):
-        self.log = WorkLog('log.csv')
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.csv')
+        shutil.copy('log.csv', self.file)
+        self.log = WorkLog(self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
 
     def test_init_no_file(self):
         log = WorkLog()
@@ -204,6 +791,20 @@ class WorkLogTests(unittest.TestCase):
         self.assertNotIn(entry, self.log.TASKS)
         self.assertEqual(fake_save.call_count, 1)
 
+    @mock.patch('builtins.input')
+    @mock.patch('work_log.WorkLog.save_log')
+    def test_delete_updates_open_views(self, fake_save, fake_input):
+        fake_input.return_value = 'y'
+        found = TaskSearch.query(self.log.TASKS, Contains('party'))
+        view = self.log.view(found)
+        other = self.log.view(self.log.TASKS[:3])
+        entry = found[0]
+        self.assertEqual(self.log.delete_task(0, view), 0)
+        self.assertEqual(view, found[1:])
+        self.assertNotIn(entry, other)
+        self.assertNotIn(entry, self.log.TASKS)
+        self.assertEqual(len(other), 2)
+
     @mock.patch('builtins.input')
     @mock.patch('work_log.WorkLog.save_log')
     def test_delete_no_deletion(self, fake_save, fake_input):
@@ -236,6 +837,963 @@ class WorkLogTests(unittest.TestCase):
         self.assertEqual(len(self.log.TASKS), len_TASKS - 1)
 
 
+class JournaledWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.csv')
+        shutil.copy('log.csv', self.file)
+        self.log = WorkLog(self.file, journal=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def reloaded_logs(self):
+        return [task.log() for task in WorkLog(self.file).TASKS]
+
+    @mock.patch('task.Task.show')
+    @mock.patch('builtins.input')
+    def test_changes_are_journaled_and_replayed(self, fake_input, fake_show):
+        with open(self.file) as csvfile:
+            base = csvfile.read()
+        fake_input.side_effect = [
+            'Journal entry', '15/06/2018', '30', '',
+            '', 'New title', '', '', '', 'y'
+        ]
+        self.log.add_task()
+        self.log.edit_task(0, self.log.TASKS)
+        self.log.delete_task(2, self.log.TASKS)
+
+        with open(self.file) as csvfile:
+            self.assertEqual(csvfile.read(), base)
+        self.assertTrue(os.path.exists(self.log.storage.journal))
+        self.assertEqual(
+            self.reloaded_logs(), [task.log() for task in self.log.TASKS])
+
+    def test_compact_log(self):
+        task = self.log.TASKS[0]
+        self.log.TASKS.remove(task)
+        self.log.save_log(JournalStorage.DELETE, task.log())
+        self.assertTrue(os.path.exists(self.log.storage.journal))
+        self.log.compact_log()
+        self.assertFalse(os.path.exists(self.log.storage.journal))
+        self.assertEqual(len(self.reloaded_logs()), 7)
+
+    def test_compact_when_journal_is_too_big(self):
+        self.log.storage.compact_size = 1
+        task = self.log.TASKS[0]
+        self.log.TASKS.remove(task)
+        self.log.save_log(JournalStorage.DELETE, task.log())
+        self.assertFalse(os.path.exists(self.log.storage.journal))
+        self.assertEqual(len(self.reloaded_logs()), 7)
+
+    def test_ids_are_stable_and_saved(self):
+        ids = [task.id for task in self.log.TASKS]
+        self.assertEqual(ids, [task.id for task in WorkLog(self.file).TASKS])
+        self.assertEqual(len(set(ids)), 8)
+        task = self.log.get_task(ids[3])
+        self.assertIs(task, self.log.TASKS[3])
+        self.assertIsNone(self.log.get_task('missing'))
+        self.log.compact_log()
+        with open(self.file) as csvfile:
+            header = csvfile.readline().strip()
+        self.assertEqual(header, 'Date,Title,Time,Notes,Id')
+        self.assertEqual(ids, [task.id for task in WorkLog(self.file).TASKS])
+
+    def test_old_journal_records_are_replayed(self):
+        with open(self.log.storage.journal, 'w') as journal:
+            journal.write('-,01/01/2018,New year celebration,60,\n')
+        logs = self.reloaded_logs()
+        self.assertEqual(len(logs), 7)
+        self.assertEqual(logs[0]['Title'], "Susan's birthday")
+
+    def test_same_rows_are_found_by_id(self):
+        first, second = self.log.TASKS[0], self.log.TASKS[1]
+        second.title, second.notes = first.title, first.notes
+        second.date, second.time = first.date, first.time
+        self.log.save_log(self.log.storage.EDIT, first.log(), second.log())
+        self.log.compact_log()
+        self.log.TASKS.remove(second)
+        self.log.save_log(self.log.storage.DELETE, second.log())
+        self.assertEqual(
+            [task.id for task in WorkLog(self.file).TASKS],
+            [task.id for task in self.log.TASKS])
+
+    def test_partial_record_is_skipped(self):
+        with open(self.log.storage.journal, 'w') as journal:
+            journal.write('+,01/01/2019,Cut\n')
+        self.assertEqual(len(self.reloaded_logs()), 8)
+
+    def test_torn_record_is_ignored_until_complete(self):
+        journal = self.log.storage.journal
+        with open(journal, 'w', newline='') as journal_file:
+            journal_file.write(
+                '+,01/01/2019,Whole,10,"notes that were\ncut off in the midd')
+        self.assertEqual(len(self.reloaded_logs()), 8)
+        task = Task.from_values('Next', datetime.date(2019, 2, 1), '5', '')
+        self.log.TASKS.add(task)
+        self.log.save_log(self.log.storage.ADD, task.log())
+        logs = self.reloaded_logs()
+        self.assertEqual(len(logs), 9)
+        self.assertEqual(logs[-1]['Title'], 'Next')
+
+    def test_journal_left_by_a_crash_while_compacting(self):
+        task = Task.from_values('Added', datetime.date(2019, 1, 1), '5', '')
+        self.log.TASKS.add(task)
+        self.log.save_log(self.log.storage.ADD, task.log())
+        first, second = self.log.TASKS[0], self.log.TASKS[1]
+        old = second.log()
+        second.title, second.notes = first.title, first.notes
+        second.date, second.time = first.date, first.time
+        self.log.save_log(self.log.storage.EDIT, old, second.log())
+        self.log.TASKS.remove(first)
+        self.log.save_log(self.log.storage.DELETE, first.log())
+        with mock.patch('os.remove', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.log.compact_log()
+        self.assertTrue(os.path.exists(self.log.storage.journal))
+        self.assertEqual(
+            self.reloaded_logs(), [task.log() for task in self.log.TASKS])
+
+    def test_failed_save_keeps_file(self):
+        with open(self.file) as csvfile:
+            base = csvfile.read()
+        with mock.patch('os.replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.log.storage.save([])
+        with open(self.file) as csvfile:
+            self.assertEqual(csvfile.read(), base)
+        self.assertEqual(
+            sorted(os.listdir(self.dir)), ['log.csv', 'log.csv.lock'])
+
+    def test_group_commit(self):
+        self.log.group_commit = 60
+        tasks = list(self.log.TASKS)[:3]
+        with mock.patch('os.fsync') as fake_fsync:
+            for task in tasks:
+                self.log.TASKS.remove(task)
+                self.log.save_log(JournalStorage.DELETE, task.log())
+            self.assertFalse(os.path.exists(self.log.storage.journal))
+            self.log.flush()
+            self.assertEqual(fake_fsync.call_count, 1)
+        self.assertEqual(len(self.reloaded_logs()), 5)
+
+    @mock.patch('builtins.print')
+    def test_expired_group_is_saved_when_a_menu_is_drawn(self, fake_print):
+        self.log.group_commit = 60
+        task = self.log.TASKS[0]
+        self.log.TASKS.remove(task)
+        self.log.save_log(JournalStorage.DELETE, task.log())
+        MainMenu(self.log).print_menu()
+        self.assertEqual(len(self.reloaded_logs()), 8)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 60):
+            MainMenu(self.log).print_menu()
+        self.assertEqual(len(self.reloaded_logs()), 7)
+
+
+class SharedWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.csv')
+        shutil.copy('log.csv', self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def add(self, log, title, date=datetime.date(2018, 6, 15)):
+        task = Task.from_values(title, date, '10', '')
+        log.TASKS.add(task)
+        log.save_log(log.storage.ADD, task.log())
+        return task
+
+    def titles(self, log):
+        return [task.title for task in log.TASKS]
+
+    def test_no_change_is_lost(self):
+        first, second = WorkLog(self.file), WorkLog(self.file)
+        self.add(first, 'First')
+        self.add(second, 'Second', datetime.date(2018, 6, 20))
+        titles = self.titles(WorkLog(self.file))
+        self.assertIn('First', titles)
+        self.assertIn('Second', titles)
+        self.assertEqual(self.titles(second), titles)
+        self.assertNotIn('Second', self.titles(first))
+        first.refresh()
+        self.assertEqual(self.titles(first), titles)
+
+    def test_journal_changes_are_merged_incrementally(self):
+        first = WorkLog(self.file, journal=True)
+        second = WorkLog(self.file, journal=True)
+        task = self.add(first, 'First')
+        gone = first.TASKS[0]
+        first.TASKS.remove(gone)
+        first.save_log(first.storage.DELETE, gone.log())
+        edited = first.TASKS[0]
+        old_log = edited.log()
+        edited.title = 'Edited'
+        first.TASKS.update(edited)
+        first.save_log(first.storage.EDIT, old_log, edited.log())
+        with mock.patch.object(second.storage, 'load') as fake_load:
+            second.refresh()
+        fake_load.assert_not_called()
+        self.assertEqual(self.titles(second), self.titles(first))
+        self.assertEqual(second.get_task(task.id).title, 'First')
+        self.assertIsNone(second.get_task(gone.id))
+        self.assertEqual(second.totals().total(), first.totals().total())
+
+    def test_compacted_journal_is_merged(self):
+        first = WorkLog(self.file, journal=True)
+        second = WorkLog(self.file, journal=True)
+        self.add(first, 'First')
+        first.compact_log()
+        second.refresh()
+        self.assertEqual(self.titles(second), self.titles(first))
+
+    def test_changes_without_op_are_kept(self):
+        first, second = WorkLog(self.file), WorkLog(self.file)
+        self.add(second, 'Second', datetime.date(2018, 6, 20))
+        tasks = [
+            Task.from_values(title, datetime.date(2019, 1, 1), '5', '')
+            for title in ('One', 'Two', 'Three')]
+        first.TASKS.extend(tasks)
+        first.save_log()
+        titles = self.titles(WorkLog(self.file))
+        for title in ('Second', 'One', 'Two', 'Three'):
+            self.assertIn(title, titles)
+
+    def test_local_changes_win(self):
+        first, second = WorkLog(self.file), WorkLog(self.file)
+        second.group_commit = 60
+        task = second.TASKS[0]
+        old_log = task.log()
+        task.title = 'Local'
+        second.TASKS.update(task)
+        second.save_log(second.storage.EDIT, old_log, task.log())
+        same = first.get_task(task.id)
+        old_log = same.log()
+        same.title = 'Remote'
+        first.TASKS.update(same)
+        first.save_log(first.storage.EDIT, old_log, same.log())
+        second.flush()
+        self.assertEqual(WorkLog(self.file).get_task(task.id).title, 'Local')
+
+    def test_generation(self):
+        log = WorkLog(self.file)
+        self.assertEqual(log.storage.generation(), 0)
+        self.add(log, 'First')
+        self.add(log, 'Second')
+        self.assertEqual(log.storage.generation(), 2)
+        self.assertEqual(log.storage.changes(), [])
+
+    @unittest.skipIf(fcntl is None, "fcntl is not available")
+    def test_writes_are_locked(self):
+        log = WorkLog(self.file)
+        with log.storage.lock():
+            with open(log.storage.lock_file) as lock_file:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        with open(log.storage.lock_file) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class WatchedWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.csv')
+        shutil.copy('log.csv', self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def append(self, title, date='15/06/2018'):
+        with open(self.file, 'a', newline='') as csvfile:
+            csvfile.write('{},{},10,\n'.format(date, title))
+
+    def test_appended_rows_are_read_alone(self):
+        log = WorkLog(self.file)
+        self.append('Appended')
+        with mock.patch.object(log.storage, 'load') as fake_load:
+            self.assertTrue(log.refresh())
+        fake_load.assert_not_called()
+        self.assertEqual(
+            [task.log() for task in log.TASKS],
+            [task.log() for task in WorkLog(self.file).TASKS])
+        self.assertFalse(log.refresh())
+
+    def test_rewritten_file_is_read_again(self):
+        log = WorkLog(self.file)
+        other = WorkLog(self.file)
+        gone = other.TASKS[0]
+        other.TASKS.remove(gone)
+        other.save_log(other.storage.DELETE, gone.log())
+        self.assertTrue(log.refresh())
+        self.assertIsNone(log.get_task(gone.id))
+
+    def test_appended_rows_and_journal(self):
+        log = WorkLog(self.file, journal=True)
+        other = WorkLog(self.file, journal=True)
+        task = Task.from_values(
+            'Journaled', datetime.date(2018, 6, 1), '5', '')
+        other.TASKS.add(task)
+        other.save_log(other.storage.ADD, task.log())
+        self.append('Appended')
+        with mock.patch.object(log.storage, 'load') as fake_load:
+            log.refresh()
+        fake_load.assert_not_called()
+        titles = [task.title for task in log.TASKS]
+        self.assertIn('Journaled', titles)
+        self.assertIn('Appended', titles)
+
+    def test_polling_watcher(self):
+        watcher = PollingWatcher([self.file])
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+        self.append('Appended')
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+
+    @unittest.skipUnless(
+        sys.platform.startswith('linux'), "inotify is only on Linux")
+    def test_inotify_watcher(self):
+        watcher = InotifyWatcher([self.file])
+        self.addCleanup(watcher.close)
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+        with open(os.path.join(self.dir, 'other.csv'), 'w') as other:
+            other.write('Title\n')
+        self.assertFalse(watcher.changed())
+        self.append('Appended')
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+
+    def test_close_stops_watching(self):
+        log = WorkLog(self.file, watch=True)
+        watcher = log.watcher
+        task = Task.from_values('Closed', datetime.date(2019, 1, 1), '5', '')
+        log.group_commit = 60
+        log.import_tasks([task])
+        with mock.patch.object(watcher, 'close', wraps=watcher.close) as close:
+            log.close()
+        close.assert_called_once_with()
+        self.assertIsNone(log.watcher)
+        self.assertEqual(WorkLog(self.file).get_task(task.id).title, 'Closed')
+
+    def test_watched_log_is_only_refreshed_after_a_change(self):
+        log = WorkLog(self.file, watch=True)
+        self.assertIn(self.file, log.storage.watched_files())
+        log.refresh()
+        with mock.patch.object(log.storage, 'changes') as fake_changes:
+            self.assertFalse(log.refresh())
+        fake_changes.assert_not_called()
+        self.append('Appended')
+        self.assertTrue(log.refresh())
+        self.assertIn('Appended', [task.title for task in log.TASKS])
+
+    def test_new_tasks_join_open_views(self):
+        log = WorkLog(self.file)
+        view = log.view(TaskSearch.view(log.TASKS, Contains('party')))
+        other = log.view(TaskSearch.view(log.TASKS, Contains('exam')))
+        count = len(view)
+        self.append('Another party', '01/01/2000')
+        log.refresh()
+        self.assertEqual(len(view), count + 1)
+        self.assertEqual(view[0].title, 'Another party')
+        self.assertEqual(view.index(view[0]), 0)
+        self.assertNotIn('Another party', [task.title for task in other])
+
+    def test_menu_index_is_kept_within_tasks(self):
+        log = WorkLog(self.file)
+        menu = TaskMenu(log, len(log.TASKS) - 1)
+        other = WorkLog(self.file)
+        gone = other.TASKS[-1]
+        other.TASKS.remove(gone)
+        other.save_log(other.storage.DELETE, gone.log())
+        with mock.patch('builtins.print'):
+            menu.print_menu()
+        self.assertEqual(menu.index, len(log.TASKS) - 1)
+
+
+class ColumnarWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self), columnar=True)
+        self.tasks = self.log.TASKS
+
+    def test_same_tasks_as_task_list(self):
+        logs = [task.log() for task in WorkLog(copy_of_log(self)).TASKS]
+        self.assertEqual([task.log() for task in self.tasks], logs)
+        self.assertEqual(list(self.tasks.logs()), logs)
+        self.assertEqual(len(self.tasks.pool.strings), 21)
+
+    def test_views_are_the_same_objects(self):
+        task = self.tasks[3]
+        self.assertIs(self.tasks[3], task)
+        self.assertIs(self.tasks[-5], task)
+        self.assertEqual(self.tasks.index(task), 3)
+        self.assertEqual(self.tasks[1:3], [self.tasks[1], self.tasks[2]])
+
+    @mock.patch('work_log.WorkLog.save_log')
+    def test_edit_is_written_back(self, fake_save):
+        task = self.tasks[0]
+        with mock.patch('builtins.input') as fake_input:
+            fake_input.side_effect = ['Edited', '16/06/2018', '5', '']
+            self.log.edit_task(0, self.tasks)
+        self.assertIs(self.tasks[6], task)
+        self.assertEqual(list(self.tasks.logs())[6], task.log())
+        self.assertEqual(list(self.tasks.logs())[6]['Time'], '5')
+
+    @mock.patch('builtins.input')
+    @mock.patch('work_log.WorkLog.save_log')
+    def test_delete_task(self, fake_save, fake_input):
+        fake_input.return_value = 'y'
+        entry = self.tasks[4]
+        self.log.delete_task(4, self.tasks)
+        self.assertEqual(len(self.tasks), 7)
+        self.assertNotIn(entry, self.tasks)
+
+    def test_searches(self):
+        found = self.tasks.indexes['date'].between(
+            datetime.date(2018, 6, 15), datetime.date(2018, 7, 4))
+        self.assertEqual([task.title for task in found], [
+            "Party at Carol's", 'Python exam', 'Call Logan'])
+        found = self.tasks.indexes['text'].search('PARTY')
+        self.assertEqual(len(found), 2)
+
+    def test_get_task(self):
+        task = self.tasks[5]
+        self.assertIs(self.log.get_task(task.id), task)
+        self.tasks.remove(task)
+        self.assertIsNone(self.log.get_task(task.id))
+
+    def test_totals_are_kept_until_a_change(self):
+        totals = self.log.totals()
+        self.assertIs(self.log.totals(), totals)
+        task = Task.from_values('Added', datetime.date(2019, 1, 1), '5', '')
+        self.log.import_tasks([task])
+        self.assertIsNot(self.log.totals(), totals)
+        self.assertEqual(self.log.totals().total(), (585, 9))
+
+    def test_times_are_kept_as_written(self):
+        odd = [
+            Task(Date='15/06/2018', Title='Padded', Time='060', Notes=''),
+            Task(Date='16/06/2018', Title='Text', Time='abc', Notes='')]
+        self.tasks.extend(odd)
+        self.assertEqual(
+            [log['Time'] for log in self.tasks.logs()][7:9], ['060', 'abc'])
+        self.assertEqual(self.tasks[7].time, '060')
+        self.assertIsNone(self.tasks.arrays())
+        self.assertEqual(TaskSearch.query(self.tasks, TimeIs('060')), [odd[0]])
+        for task in odd:
+            self.tasks.remove(task)
+        if numpy is not None:
+            self.assertIsNotNone(self.tasks.arrays())
+
+    def test_extend(self):
+        task = Task(Date='15/06/2018', Title='Extra', Time='5', Notes='')
+        self.tasks.extend([task])
+        self.assertEqual(len(self.tasks), 9)
+        self.assertIs(self.tasks[7], task)
+        self.assertEqual(list(self.tasks.logs())[7], task.log())
+
+
+class LazyWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.log = WorkLog(copy_of_log(self), lazy=True)
+        self.tasks = self.log.TASKS
+
+    def test_rows_are_read_from_the_file_scanned(self):
+        file = copy_of_log(self)
+        tasks = WorkLog(file, lazy=True).TASKS
+        self.assertEqual(len(tasks), 8)
+        other = WorkLog(file)
+        gone = other.TASKS[0]
+        other.TASKS.remove(gone)
+        other.save_log(other.storage.DELETE, gone.log())
+        self.assertEqual(tasks[0].log(), gone.log())
+        tasks.add(Task.from_values(
+            'Added', datetime.date(2019, 1, 1), '5', ''))
+        self.assertEqual(len(tasks), 9)
+
+    def test_other_writers_are_kept(self):
+        file = copy_of_log(self)
+        log = WorkLog(file, lazy=True)
+        other = WorkLog(file)
+        first = Task.from_values('First', datetime.date(2019, 1, 1), '5', '')
+        other.import_tasks([first])
+        second = Task.from_values('Second', datetime.date(2019, 1, 2), '5', '')
+        log.import_tasks([second])
+        self.assertEqual(
+            [task.title for task in WorkLog(file).TASKS][-2:],
+            ['First', 'Second'])
+
+    def test_file_is_not_read_on_init(self):
+        self.assertIsNone(self.tasks._dates)
+        MainMenu(self.log)
+        self.assertIsNone(self.tasks._dates)
+
+    def test_same_tasks_as_task_list(self):
+        logs = [task.log() for task in WorkLog(copy_of_log(self)).TASKS]
+        self.assertEqual([task.log() for task in self.tasks], logs)
+        self.assertIs(self.tasks[-2], self.tasks[6])
+        self.assertFalse(self.tasks.loaded)
+
+    def test_get_task(self):
+        task_id = WorkLog(copy_of_log(self)).TASKS[4].id
+        self.assertEqual(self.log.get_task(task_id).id, task_id)
+        self.assertTrue(self.tasks.loaded)
+
+    def test_date_search_creates_only_tasks_found(self):
+        found = self.tasks.indexes['date'].on(datetime.date(2018, 6, 15))
+        self.assertEqual(len(found), 2)
+        self.assertEqual(len(self.tasks._tasks), 2)
+        self.assertEqual(self.tasks.index(found[1]), 6)
+
+    @mock.patch('builtins.input')
+    @mock.patch('work_log.WorkLog.save_log')
+    def test_delete_loads_all_tasks(self, fake_save, fake_input):
+        fake_input.return_value = 'y'
+        found = self.tasks.between(
+            datetime.date(2018, 6, 15), datetime.date(2018, 7, 4))
+        self.log.delete_task(0, found)
+        self.assertTrue(self.tasks.loaded)
+        self.assertEqual(len(self.tasks), 7)
+        self.assertEqual(found[0].title, 'Python exam')
+        self.assertIn(found[0], self.tasks)
+        self.assertIn('text', self.tasks.indexes)
+
+    def test_multiline_notes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file = os.path.join(directory, 'log.csv')
+        log = WorkLog(file)
+        log.TASKS.add(Task(
+            Date='02/01/2018', Title='Two', Time='5', Notes='a\n"b",\nc'))
+        log.TASKS.add(Task(
+            Date='01/01/2018', Title='One', Time='5', Notes=''))
+        log.save_log()
+        tasks = WorkLog(file, lazy=True).TASKS
+        self.assertEqual(
+            [task.log() for task in tasks], list(log.TASKS.logs()))
+
+    def test_journal_is_replayed(self):
+        with mock.patch('storage.JournalStorage.has_journal') as fake_has:
+            fake_has.return_value = True
+            log = WorkLog(copy_of_log(self), lazy=True)
+        self.assertIsInstance(log.TASKS, TaskList)
+
+
+class SqliteWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.db')
+        self.assertEqual(import_csv(copy_of_log(self), self.file), 8)
+        self.log = WorkLog(self.file)
+        self.tasks = self.log.TASKS
+
+    def tearDown(self):
+        self.log.storage.connection.close()
+        shutil.rmtree(self.dir)
+
+    def test_get_task(self):
+        task = self.tasks[2]
+        self.assertIs(self.log.get_task(task.id), task)
+        self.assertIsNone(self.log.get_task('missing'))
+
+    def test_old_database_gets_ids(self):
+        file = os.path.join(self.dir, 'old.db')
+        connection = sqlite3.connect(file)
+        connection.executescript(
+            "CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " date INTEGER NOT NULL, title TEXT NOT NULL, time TEXT NOT NULL,"
+            " notes TEXT NOT NULL DEFAULT '');"
+            "INSERT INTO tasks (date, title, time) VALUES (736695, 'Old', 5);")
+        connection.commit()
+        connection.close()
+        log = WorkLog(file)
+        task_id = log.TASKS[0].id
+        log.storage.connection.close()
+        log = WorkLog(file)
+        self.assertEqual(log.TASKS[0].id, task_id)
+        self.assertEqual(log.get_task(task_id).title, 'Old')
+        log.storage.connection.close()
+
+    def test_import_keeps_rows(self):
+        query = "SELECT id FROM tasks ORDER BY id"
+        ids = self.log.storage.connection.execute(query).fetchall()
+        task = Task.from_values('Imported', datetime.date(2019, 3, 1), '5', '')
+        with mock.patch.object(self.log.storage, 'save') as fake_save:
+            self.assertEqual(self.log.import_tasks([task]), 1)
+        fake_save.assert_not_called()
+        rows = self.log.storage.connection.execute(query).fetchall()
+        self.assertEqual(rows[:-1], ids)
+        self.assertIs(self.log.get_task(task.id), task)
+
+    def test_export_is_lossless(self):
+        csv_file = os.path.join(self.dir, 'log.csv')
+        self.assertEqual(export_csv(self.file, csv_file), 8)
+        self.assertEqual(
+            CsvStorage(csv_file).load(), CsvStorage(copy_of_log(self)).load())
+
+    def test_same_tasks_as_task_list(self):
+        logs = [task.log() for task in WorkLog(copy_of_log(self)).TASKS]
+        self.assertEqual([task.log() for task in self.tasks], logs)
+        self.assertEqual(len(self.tasks), 8)
+        self.assertIs(self.tasks[6], self.tasks[-2])
+        self.assertEqual(self.tasks.index(self.tasks[6]), 6)
+        self.assertEqual(self.tasks[5:7], [self.tasks[5], self.tasks[6]])
+
+    @mock.patch('utils.get_date_range')
+    @mock.patch('utils.get_time')
+    @mock.patch('builtins.input')
+    def test_searches_run_in_sql(self, fake_input, fake_time, fake_range):
+        fake_range.return_value = (
+            datetime.date(2018, 6, 15), datetime.date(2018, 7, 4))
+        fake_time.return_value = '100'
+        self.assertEqual(len(TaskSearch.search_by_range(self.tasks)), 3)
+        self.assertEqual(len(TaskSearch.search_time(self.tasks)), 2)
+        fake_input.return_value = 'PARTY'
+        self.assertEqual(len(TaskSearch.search_exact(self.tasks)), 2)
+        fake_input.return_value = 'ar'
+        self.assertEqual(len(TaskSearch.search_exact(self.tasks)), 4)
+        fake_input.return_value = r'\d{3}-'
+        found = TaskSearch.search_regex(self.tasks)
+        self.assertEqual([task.title for task in found], ['Call Logan'])
+
+    @mock.patch('task.Task.show')
+    @mock.patch('builtins.input')
+    def test_changes_are_written(self, fake_input, fake_show):
+        fake_input.side_effect = [
+            'Sqlite entry', '15/06/2018', '30', '',
+            '', 'New title', '', '', '', 'y'
+        ]
+        self.log.add_task()
+        self.log.edit_task(0, self.tasks)
+        self.log.delete_task(2, self.tasks)
+        logs = [task.log() for task in self.tasks]
+        self.assertEqual(logs[0]['Title'], 'New title')
+        self.assertEqual(logs[6]['Title'], 'Sqlite entry')
+        self.assertEqual(len(logs), 8)
+        self.assertEqual(
+            [task.log() for task in WorkLog(self.file).TASKS], logs)
+
+
+class BinaryWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.wlog')
+        self.assertEqual(
+            binary_log.import_csv(copy_of_log(self), self.file), 8)
+        self.log = WorkLog(self.file)
+        self.tasks = self.log.TASKS
+
+    def tearDown(self):
+        self.log.storage.close()
+        shutil.rmtree(self.dir)
+
+    def test_export_is_lossless(self):
+        csv_file = os.path.join(self.dir, 'log.csv')
+        self.assertEqual(binary_log.export_csv(self.file, csv_file), 8)
+        self.assertEqual(
+            CsvStorage(csv_file).load(), CsvStorage(copy_of_log(self)).load())
+        self.assertLess(
+            os.path.getsize(self.file), os.path.getsize(csv_file) + 300)
+
+    def test_same_tasks_as_task_list(self):
+        logs = [task.log() for task in WorkLog(copy_of_log(self)).TASKS]
+        self.assertEqual([task.log() for task in self.tasks], logs)
+        self.assertIs(self.tasks[6], self.tasks[-2])
+        self.assertEqual(self.tasks.index(self.tasks[6]), 6)
+        self.assertFalse(self.tasks.loaded)
+
+    def test_searches_create_only_tasks_found(self):
+        self.assertEqual(len(self.tasks), 8)
+        found = TaskSearch.query(self.tasks, DateBetween(
+            datetime.date(2018, 6, 1), datetime.date(2018, 7, 1)))
+        self.assertEqual(
+            [task.title for task in found],
+            ["Party at Carol's", 'Python exam'])
+        found = TaskSearch.query(self.tasks, TimeIs(100))
+        self.assertEqual(
+            [task.title for task in found], ['Job Fair', 'Python exam'])
+        with mock.patch('binary_log.numpy', None):
+            found = TaskSearch.query(self.tasks, TimeIs(60))
+        self.assertEqual(len(found), 2)
+        self.assertEqual(len(self.tasks._tasks), 5)
+
+    @mock.patch('task.Task.show')
+    @mock.patch('builtins.input')
+    def test_changes_are_saved(self, fake_input, fake_show):
+        fake_input.side_effect = [
+            'Binary entry', '15/06/2018', '30', '', '', 'y'
+        ]
+        self.log.add_task()
+        self.log.delete_task(0, self.tasks)
+        logs = [task.log() for task in self.tasks]
+        self.assertEqual(logs[6]['Title'], 'Binary entry')
+        self.assertEqual(len(logs), 8)
+        self.assertEqual(
+            [task.log() for task in WorkLog(self.file).TASKS], logs)
+
+    def test_other_writers_are_kept(self):
+        other = WorkLog(self.file)
+        self.assertEqual(len(other.TASKS), 8)
+        first = Task.from_values('First', datetime.date(2019, 1, 1), '5', '')
+        self.log.import_tasks([first])
+        other.storage.close()
+        second = Task.from_values('Second', datetime.date(2019, 1, 2), '5', '')
+        other.import_tasks([second])
+        self.assertEqual(
+            [task.title for task in WorkLog(self.file).TASKS][-2:],
+            ['First', 'Second'])
+
+    def test_invalid_files(self):
+        with open(self.file, 'r+b') as binary:
+            binary.truncate(100)
+        with self.assertRaises(ValueError):
+            WorkLog(self.file)
+        new_log = WorkLog(os.path.join(self.dir, 'new.wlog'))
+        self.assertEqual(len(new_log.TASKS), 0)
+        with self.assertRaises(ValueError):
+            binary_log.encode([{
+                'Date': '01/01/2018', 'Title': 'T', 'Time': '05',
+                'Notes': '', 'Id': 'a'}])
+
+
+class ShardedWorkLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.shards = os.path.join(self.dir, 'log')
+        self.assertEqual(split_csv(copy_of_log(self), self.shards), 8)
+        self.log = WorkLog(self.shards)
+        self.tasks = self.log.TASKS
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read_shards(self):
+        return mock.patch.object(
+            ShardedStorage, 'load_shard', autospec=True,
+            side_effect=ShardedStorage.load_shard)
+
+    def written_files(self):
+        return mock.patch('shards.replace_file', wraps=shards.replace_file)
+
+    def test_manifest(self):
+        self.assertEqual(sorted(os.listdir(self.shards)), [
+            '2018-01.csv', '2018-02.csv', '2018-03.csv', '2018-04.csv',
+            '2018-06.csv', '2018-07.csv', 'manifest.json'])
+        shard = self.log.storage.shards['2018-02']
+        self.assertEqual(shard['first'], '18/02/2018')
+        self.assertEqual(shard['last'], '25/02/2018')
+        self.assertEqual(shard['rows'], 2)
+
+    def test_range_search_reads_overlapping_shards(self):
+        with self.read_shards() as load_shard:
+            self.assertEqual(len(self.tasks), 8)
+            found = TaskSearch.query(self.tasks, DateBetween(
+                datetime.date(2018, 2, 20), datetime.date(2018, 4, 1)))
+        self.assertEqual(
+            [task.title for task in found],
+            ['Job Fair', 'Review some projects'])
+        self.assertEqual(
+            [call.args[1] for call in load_shard.call_args_list],
+            ['2018-02', '2018-03'])
+        self.assertFalse(self.tasks.loaded)
+
+    def test_same_tasks_as_task_list(self):
+        logs = [task.log() for task in WorkLog(copy_of_log(self)).TASKS]
+        self.assertEqual([task.log() for task in self.tasks], logs)
+        self.assertIs(self.tasks[6], self.tasks[-2])
+        self.assertEqual(self.tasks.index(self.tasks[6]), 6)
+
+    @mock.patch('task.Task.show')
+    @mock.patch('builtins.input')
+    def test_changes_rewrite_their_shards(self, fake_input, fake_show):
+        fake_input.side_effect = [
+            'Sharded entry', '15/06/2018', '30', '',
+            '', 'New title', '', '', '', 'y'
+        ]
+        with self.written_files() as replace_file:
+            self.log.add_task()
+        self.assertEqual(
+            [os.path.basename(call.args[0])
+             for call in replace_file.call_args_list],
+            ['2018-06.csv', 'manifest.json'])
+        self.log.edit_task(0, self.tasks)
+        with self.written_files() as replace_file:
+            self.log.delete_task(0, self.tasks)
+        self.assertEqual(
+            [os.path.basename(call.args[0])
+             for call in replace_file.call_args_list],
+            ['manifest.json'])
+        self.assertNotIn('2018-01.csv', os.listdir(self.shards))
+        logs = [task.log() for task in self.tasks]
+        self.assertEqual(logs[6]['Title'], 'Sharded entry')
+        self.assertEqual(len(logs), 8)
+        self.assertEqual(
+            [task.log() for task in WorkLog(self.shards).TASKS], logs)
+
+    def test_other_writers_are_kept(self):
+        other = WorkLog(self.shards)
+        self.assertEqual(len(other.TASKS), 8)
+        first = Task.from_values('First', datetime.date(2019, 1, 1), '5', '')
+        self.log.import_tasks([first])
+        second = Task.from_values('Second', datetime.date(2019, 2, 1), '5', '')
+        other.import_tasks([second])
+        self.assertEqual(
+            [task.title for task in WorkLog(self.shards).TASKS][-2:],
+            ['First', 'Second'])
+
+    def test_shards_have_no_lock_files(self):
+        self.assertEqual(len([task.log() for task in self.tasks]), 8)
+        self.assertEqual(len(self.log.storage.load()), 8)
+        self.assertFalse(
+            [name for name in os.listdir(self.shards)
+             if name.endswith('.lock')])
+
+    def test_file_is_not_sharded(self):
+        with self.assertRaises(ValueError):
+            WorkLog(copy_of_log(self), shards='month')
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            with self.assertRaises(SystemExit):
+                cli.main(['--shards', 'month', 'search'])
+
+    def test_save_rewrites_changed_shards(self):
+        task = Task.from_values('Imported', datetime.date(2019, 3, 1), '5', '')
+        with self.written_files() as replace_file:
+            self.log.import_tasks([task])
+        self.assertEqual(
+            [os.path.basename(call.args[0])
+             for call in replace_file.call_args_list],
+            ['2019-03.csv', 'manifest.json'])
+        self.assertIs(self.log.get_task(task.id), task)
+
+    def test_years_and_join(self):
+        shards_dir = os.path.join(self.dir, 'years')
+        log = WorkLog(shards_dir, shards='year')
+        log.import_tasks(self.tasks)
+        self.assertEqual(
+            sorted(os.listdir(shards_dir)), ['2018.csv', 'manifest.json'])
+        with self.assertRaises(ValueError):
+            WorkLog(shards_dir, shards='month')
+        csv_file = os.path.join(self.dir, 'log.csv')
+        self.assertEqual(join_shards(shards_dir, csv_file), 8)
+        self.assertEqual(
+            CsvStorage(csv_file).load(), CsvStorage(copy_of_log(self)).load())
+
+
+class CommandLineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.csv')
+        shutil.copy('log.csv', self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_cli(self, *args, stdin=''):
+        with mock.patch('sys.stdin', io.StringIO(stdin)), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as out, \
+                mock.patch('sys.stderr', new_callable=io.StringIO):
+            code = cli.main(['--file', self.file] + list(args))
+        return code, out.getvalue()
+
+    def test_import_csv_and_jsonl(self):
+        code, _ = self.run_cli('import', stdin=(
+            "Date,Title,Time,Notes\n01/02/2018,Imported,15,Some notes\n"))
+        self.assertEqual(code, 0)
+        code, _ = self.run_cli('import', '--format', 'jsonl', stdin=(
+            '{"Date": "02/02/2018", "Title": "Json", "Time": "5"}\n'))
+        self.assertEqual(code, 0)
+        titles = [task.title for task in WorkLog(self.file).TASKS]
+        self.assertEqual(len(titles), 10)
+        self.assertIn('Imported', titles)
+        self.assertIn('Json', titles)
+
+    def test_group_commit_is_saved_on_exit(self):
+        code, _ = self.run_cli('--group-commit', '60', 'import', stdin=(
+            "Date,Title,Time,Notes\n01/02/2018,Imported,15,Some notes\n"))
+        self.assertEqual(code, 0)
+        titles = [task.title for task in WorkLog(self.file).TASKS]
+        self.assertIn('Imported', titles)
+
+    @mock.patch('builtins.print')
+    @mock.patch('builtins.input')
+    def test_menus_without_command(self, fake_input, fake_print):
+        fake_input.return_value = 'd'
+        self.assertEqual(cli.main(['--file', self.file]), 0)
+        self.assertEqual(fake_input.call_count, 1)
+
+    def test_report(self):
+        code, output = self.run_cli('report', '--by', 'month')
+        self.assertEqual(code, 0)
+        lines = output.splitlines()
+        self.assertEqual(lines[0], 'Month,Minutes,Tasks')
+        self.assertEqual(lines[2], '02/2018,220,2')
+        _, output = self.run_cli(
+            'report', '--by', 'total', '--from', '01/06/2018',
+            '--format', 'jsonl')
+        self.assertEqual(json.loads(output), {'Minutes': 195, 'Tasks': 3})
+
+    def test_tasks_already_in_log_are_skipped(self):
+        entry = ('{"Date": "02/02/2018", "Title": "Json", "Time": "5",'
+                 ' "Id": "00000000000000ff"}\n')
+        self.run_cli('import', '--format', 'jsonl', stdin=entry * 2)
+        self.run_cli('import', '--format', 'jsonl', stdin=entry)
+        log = WorkLog(self.file)
+        self.assertEqual(len(log.TASKS), 9)
+        self.assertEqual(log.get_task('00000000000000ff').title, 'Json')
+
+    def test_invalid_entries_import_nothing(self):
+        code, _ = self.run_cli('import', stdin=(
+            "Date,Title,Time,Notes\n01/02/2018,Good,15,\n"
+            "31/02/2018,Bad date,15,\n01/02/2018,Bad time,-3,\n"))
+        self.assertEqual(code, 1)
+        self.assertEqual(len(WorkLog(self.file).TASKS), 8)
+
+    def test_invalid_json_lines_are_entry_errors(self):
+        with mock.patch('builtins.print') as fake_print:
+            code, _ = self.run_cli('import', '--format', 'jsonl', stdin=(
+                '{"Date": "02/02/2018", "Title": "Json", "Time": "5"}\n'
+                '{"Date": "02/02/2018",\n["not", "an", "object"]\n'
+                '{"Date": "02/02/2018", "Title": "Float", "Time": 5.7}\n'))
+        self.assertEqual(code, 1)
+        errors = [call.args[0] for call in fake_print.call_args_list]
+        self.assertEqual(
+            [error.split(':')[0] for error in errors[:3]],
+            ['Entry 2', 'Entry 3', 'Entry 4'])
+        self.assertEqual(len(WorkLog(self.file).TASKS), 8)
+
+    def test_invalid_regex_is_an_argument_error(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            with self.assertRaises(SystemExit) as raised:
+                self.run_cli('search', '--regex', '[')
+        self.assertEqual(raised.exception.code, 2)
+
+    def test_search(self):
+        code, output = self.run_cli(
+            'search', '--from', '15/06/2018', '--to', '04/07/2018')
+        self.assertEqual(code, 0)
+        self.assertEqual(output.splitlines()[0], 'Date,Title,Time,Notes,Id')
+        self.assertEqual(len(output.splitlines()), 4)
+        code, output = self.run_cli(
+            'search', '--text', 'party', '--time', '80', '--format', 'jsonl')
+        logs = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([log['Title'] for log in logs], ["Party at Carol's"])
+        code, output = self.run_cli(
+            'search', '--text', 'party', '--time', '100', '--any')
+        self.assertEqual(len(output.splitlines()), 5)
+        code, output = self.run_cli('search', '--time', '0')
+        self.assertEqual(output.splitlines(), ['Date,Title,Time,Notes,Id'])
+
+
 ################
 #  MENU TESTS  #
 ################
@@ -302,7 +1860,7 @@ class MainMenuTests(unittest.TestCase):
         self.menu = MainMenu(WorkLog())
 
     def test_init(self):
-        self.assertEqual(len(self.menu.options), 3)
+        self.assertEqual(len(self.menu.options), 4)
         self.assertIsInstance(self.menu.options[1], MenuOption)
 
     def test_print_title(self):
@@ -314,6 +1872,33 @@ class MainMenuTests(unittest.TestCase):
         self.assertEqual(output.getvalue(), text)
 
 
+class ReportMenuTests(unittest.TestCase):
+
+    def setUp(self):
+        self.menu = ReportMenu(WorkLog(copy_of_log(self)))
+
+    @mock.patch('builtins.input')
+    def test_show_report(self, fake_input):
+        output = io.StringIO()
+        with mock.patch('sys.stdout', output):
+            self.menu.show_report('month')
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0].split(), ['Month', 'Minutes', 'Tasks'])
+        self.assertEqual(lines[1].split(), ['01/2018', '60', '1'])
+        self.assertEqual(lines[-2].split(), ['Total', '580', '8'])
+
+    @mock.patch('utils.get_date_range')
+    @mock.patch('builtins.input')
+    def test_show_total(self, fake_input, fake_range):
+        fake_range.return_value = (
+            datetime.date(2018, 6, 1), datetime.date(2018, 6, 30))
+        output = io.StringIO()
+        with mock.patch('sys.stdout', output):
+            self.menu.show_total()
+        self.assertIn(
+            "180 minutes (3.0 hours) spent in 2 tasks", output.getvalue())
+
+
 class SearchMenuTests(unittest.TestCase):
 
     def setUp(self):
@@ -341,7 +1926,7 @@ class SearchMenuTests(unittest.TestCase):
 class TaskMenuTests(unittest.TestCase):
 
     def setUp(self):
-        self.log = WorkLog('log.csv')
+        self.log = WorkLog(copy_of_log(self))
         self.tasks = self.log.TASKS
 
     def test_get_options(self):
@@ -351,10 +1936,10 @@ class TaskMenuTests(unittest.TestCase):
         result3 = TaskMenu(self.log, 2, self.tasks[:3]).options
         result4 = TaskMenu(self.log, 5).options
         self.assertEqual(len(result0), 1)
-        self.assertEqual(len(result1), 3)
-        self.assertEqual(len(result2), 4)
-        self.assertEqual(len(result3), 4)
-        self.assertEqual(len(result4), 5)
+        self.assertEqual(len(result1), 4)
+        self.assertEqual(len(result2), 5)
+        self.assertEqual(len(result3), 5)
+        self.assertEqual(len(result4), 6)
         with self.assertRaises(IndexError):
             TaskMenu(self.log, 4, self.tasks[:2])
 
@@ -381,7 +1966,7 @@ class TaskMenuTests(unittest.TestCase):
         sys.stdout = output
         TaskMenu(self.log, 0, self.tasks).print_options()
         sys.stdout = sys.__stdout__
-        text = "[N]ext, [E]dit, [D]elete, [R]eturn\n"
+        text = "[N]ext, [E]dit, [D]elete, [L]ist, [R]eturn\n"
         self.assertEqual(output.getvalue(), text)
 
     def test_side_run(self):
@@ -391,6 +1976,58 @@ class TaskMenuTests(unittest.TestCase):
         new_options = menu.options
         self.assertLess(len(options), len(new_options))
 
+    @mock.patch('work_log.WorkLog.save_log')
+    def test_edited_task_keeps_its_place(self, fake_save):
+        view = self.log.view(self.tasks[2:5])
+        menu = TaskMenu(self.log, 1, view)
+        task = view[1]
+        with mock.patch('builtins.input') as fake_input:
+            fake_input.side_effect = ['', '01/01/2019', '', '']
+            menu.side_run(menu.edit_task())
+        self.assertIs(view[1], task)
+        self.assertEqual(menu.index, 1)
+        self.assertEqual(self.tasks.index(task), 7)
+
+    @mock.patch('task.Task.show')
+    def test_results_are_pulled_a_page_ahead(self, fake_show):
+        pulled = []
+
+        def results():
+            for task in itertools.cycle(self.tasks):
+                pulled.append(task)
+                yield task
+
+        menu = TaskMenu(self.log, 0, TaskView(results()))
+        self.assertEqual(len(pulled), TaskMenu.PAGE_SIZE * 2)
+        output = io.StringIO()
+        with mock.patch('sys.stdout', output):
+            menu.print_title()
+        self.assertEqual(output.getvalue(), "Result 1 of \u226520\n\n")
+        menu.side_run(menu.next_task())
+        self.assertEqual(len(pulled), TaskMenu.PAGE_SIZE * 2 + 1)
+
+    def test_list_mode(self):
+        menu = TaskMenu(self.log, 3, self.tasks)
+        menu.PAGE_SIZE = 5
+        menu.side_run(menu.list_tasks())
+        self.assertEqual(menu.index, 0)
+        self.assertEqual(
+            [option.key for option in menu.options], ['n', 's', 'r'])
+        menu.side_run(menu.next_task())
+        self.assertEqual(menu.index, 5)
+        output = io.StringIO()
+        with mock.patch('sys.stdout', output):
+            menu.print_title()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], "Results 6-8 of 8")
+        self.assertEqual(
+            lines[2], "   6) 15/06/2018 Party at Carol's (80 minutes)")
+        self.assertEqual(
+            [option.key for option in menu.options], ['p', 's', 'r'])
+        menu.side_run(menu.show_task())
+        self.assertEqual(menu.index, 5)
+        self.assertFalse(menu.list_mode)
+
     def test_previous_task(self):
         menu = TaskMenu(self.log, 5, self.tasks)
         index = menu.previous_task()
@@ -402,5 +2039,97 @@ class TaskMenuTests(unittest.TestCase):
         self.assertGreater(index, menu.index)
 
 
+#####################
+#  BENCHMARK TESTS  #
+#####################
+class BenchmarkTests(unittest.TestCase):
+
+    def test_generate_logs(self):
+        logs = benchmark.generate_logs(200, days=10, duplicates=0.5)
+        self.assertEqual(len(logs), 200)
+        self.assertLessEqual(len({log['Date'] for log in logs}), 10)
+        titles = {log['Title'] for log in logs}
+        self.assertLess(len(titles), 150)
+        tasks = [Task(**log) for log in logs]
+        self.assertEqual(len(tasks), 200)
+
+    def test_run(self):
+        results = benchmark.run(50)
+        self.assertEqual(len(results), 8)
+        self.assertIn('search_regex', results)
+
+    def test_compare(self):
+        baseline = {'1000': {'get_tasks': 1.0, 'save_log': 1.0}}
+        results = {'1000': {'get_tasks': 1.1, 'save_log': 1.5,
+                            'search_date': 1.0}}
+        self.assertEqual(
+            benchmark.compare(results, baseline, tolerance=0.2),
+            [('1000', 'save_log', 1.5, 1.0)])
+
+
+#####################
+#  PROFILING TESTS  #
+#####################
+class ProfilingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'log.csv')
+        shutil.copy('log.csv', self.file)
+
+    def tearDown(self):
+        profiling.disable()
+        shutil.rmtree(self.dir)
+
+    def test_disabled(self):
+        self.assertFalse(profiling.enabled())
+        tasks = [1, 2]
+        self.assertIs(profiling.counted('tasks scanned', tasks), tasks)
+        profiling.count('queries')
+        self.assertEqual(len(WorkLog(self.file).TASKS), 8)
+        self.assertIsNone(profiling.STATS)
+
+    def test_stats(self):
+        stats = profiling.enable()
+        log = WorkLog(self.file)
+        TaskSearch.query(log.TASKS, Matches('^P'))
+        list(TaskSearch.stream(log.TASKS, DateIs(datetime.date(2018, 1, 1))))
+        log.save_log()
+        self.assertEqual(stats.counters['rows parsed'], 8)
+        self.assertEqual(stats.counters['queries'], 2)
+        self.assertEqual(stats.counters['tasks scanned'], 8)
+        self.assertEqual(stats.counters['tasks found'], 5)
+        self.assertGreater(stats.counters['bytes written'], 300)
+        for name in ('WorkLog.get_tasks', 'WorkLog.sort_tasks',
+                     'WorkLog.save_log', 'CsvStorage.save',
+                     'TaskSearch.query'):
+            self.assertEqual(stats.timings[name][0], 1)
+        output = os.path.join(self.dir, 'stats.json')
+        stats.dump(output)
+        with open(output) as stats_file:
+            dumped = json.load(stats_file)
+        self.assertEqual(dumped['counters']['queries'], 2)
+        self.assertEqual(dumped['tasks scanned per query'], 4)
+        self.assertIn('WorkLog.flush', dumped['timings'])
+
+    def test_cprofile_dump(self):
+        output = os.path.join(self.dir, 'stats.prof')
+        profiling.enable(output)
+        WorkLog(self.file)
+        profiling.dump()
+        names = {
+            function for _, _, function
+            in pstats.Stats(output).stats}
+        self.assertIn('get_tasks', names)
+
+    def test_command_line_option(self):
+        output = os.path.join(self.dir, 'stats.json')
+        with mock.patch('sys.stdout', new_callable=io.StringIO):
+            cli.main(['--file', self.file, '--profile', output,
+                      'search', '--regex', '(?i)party'])
+        self.assertEqual(profiling.STATS.file, output)
+        self.assertEqual(profiling.STATS.counters['tasks scanned'], 8)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,10 +1,194 @@
+import contextlib
+import ctypes
 import datetime
+import functools
+import io
 import os
+import re
+import shutil
+import sys
+import unicodedata
+
+DATE_FORMAT = '%d/%m/%Y'
+DATE_CACHE_SIZE = 4096
+
+# Same fields strptime accepts for DATE_FORMAT
+DATE_PATTERN = re.compile(
+    r'(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])/(1[0-2]|0[1-9]|[1-9])/(\d\d\d\d)')
+
+
+# ANSI sequences: clear screen, move cursor, erase line and erase below
+CLEAR = '\x1b[H\x1b[2J'
+MOVE = '\x1b[{};1H'
+ERASE_LINE = '\x1b[K'
+ERASE_BELOW = '\x1b[J'
+# Console mode that makes the Windows console understand ANSI sequences
+ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+STD_OUTPUT_HANDLE = -11
+
+
+class Screen:
+    """
+    Renders the output on the terminal without running any external command.
+    The screen is cleared with ANSI sequences, and only when the output is a
+    terminal. Where the terminal can't be given ANSI sequences (a Windows
+    console without virtual terminal processing), the screen is scrolled
+    instead. A frame collects everything printed while it is open and
+    writes it in a single write. A partial frame rewrites only the lines
+    that changed since the frame before, as long as both fit on screen.
+    """
+    MARGIN = 3
+
+    def __init__(self):
+        """Initializes the screen with nothing known to be on it"""
+        self.lines = None
+        self.buffer = None
+
+    def clear(self):
+        """
+        Clears the screen. Inside a frame, it just discards what has been
+        printed so far, as the frame replaces the whole screen.
+        """
+        if self.buffer is not None:
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            return
+        self.lines = None
+        if is_terminal(sys.stdout):
+            if ansi_enabled():
+                sys.stdout.write(CLEAR)
+            else:
+                sys.stdout.write('\n' * shutil.get_terminal_size().lines)
+            sys.stdout.flush()
+
+    def invalidate(self):
+        """Forgets the last frame, after something else is printed"""
+        self.lines = None
+
+    @contextlib.contextmanager
+    def frame(self, partial=False):
+        """
+        Collects everything printed inside the with block and writes it at
+        the end, replacing the screen.
+        """
+        output = sys.stdout
+        self.buffer = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(self.buffer):
+                yield
+            text = self.buffer.getvalue()
+        finally:
+            self.buffer = None
+        self.render(text, output, partial)
+
+    def render(self, text, output, partial=False):
+        """Writes the text of a frame to the output in a single write"""
+        if not is_terminal(output) or not ansi_enabled():
+            output.write(text)
+            output.flush()
+            self.lines = None
+            return
+        lines = text.split('\n')
+        size = shutil.get_terminal_size()
+        if len(lines) + self.MARGIN > size.lines or not all(
+                len(line) < size.columns and self.is_plain(line)
+                for line in lines):
+            self.lines = None
+            output.write(CLEAR + text)
+        elif partial and self.lines is not None:
+            parts = [
+                MOVE.format(row) + line + ERASE_LINE
+                for row, line in enumerate(lines, 1)
+                if row > len(self.lines) or self.lines[row - 1] != line
+            ]
+            parts.append(MOVE.format(len(lines)) + ERASE_BELOW)
+            self.lines = lines
+            output.write(''.join(parts))
+        else:
+            self.lines = lines
+            output.write(CLEAR + text)
+        output.flush()
+
+    @staticmethod
+    def is_plain(line):
+        """
+        Returns True if every character of a line is printable and takes a
+        single column, so the line takes as many columns as its length.
+        """
+        return line.isprintable() and (line.isascii() or not any(
+            unicodedata.east_asian_width(char) in 'WF'
+            or unicodedata.combining(char) for char in line))
+
+
+def is_terminal(stream):
+    """Returns True if the stream given is an interactive terminal"""
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def ansi_enabled():
+    """
+    Returns True if the terminal understands ANSI sequences. On Windows,
+    virtual terminal processing is turned on in the console the first time.
+    """
+    if os.name != 'nt':
+        return True
+    return enable_virtual_terminal()
+
+
+def enable_virtual_terminal():
+    """
+    Turns on virtual terminal processing in the Windows console of stdout,
+    and returns True if it could.
+    """
+    try:
+        kernel32 = ctypes.windll.kernel32
+    except AttributeError:
+        return False
+    handle = kernel32.GetStdHandle(STD_OUTPUT_HANDLE)
+    mode = ctypes.c_uint32()
+    if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+        return False
+    return bool(kernel32.SetConsoleMode(
+        handle, mode.value | ENABLE_VIRTUAL_TERMINAL_PROCESSING))
+
+
+screen = Screen()
 
 
 def clear_screen():
     """Clear the screen to prepare it to show the menu."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    screen.clear()
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(text):
+    """
+    Returns the date of a string with the DD/MM/YYYY format. It accepts the
+    same strings as strptime with DATE_FORMAT and raises ValueError for the
+    rest, but it is much faster and repeated dates are taken from a cache.
+    """
+    if (len(text) == 10 and text[2] == '/' and text[5] == '/'
+            and text.isascii() and text[:2] != '00' and text[3:5] != '00'):
+        fields = text[:2], text[3:5], text[6:]
+        if all(field.isdigit() for field in fields):
+            return datetime.date(
+                int(fields[2]), int(fields[1]), int(fields[0]))
+    match = DATE_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError("time data {!r} does not match format {!r}".format(
+            text, DATE_FORMAT))
+    day, month, year = match.groups()
+    return datetime.date(int(year), int(month), int(day))
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_date(date):
+    """Returns a date as a string with the DD/MM/YYYY format"""
+    return date.strftime(DATE_FORMAT)
 
 
 def get_date(initial=None):
@@ -20,11 +204,9 @@ def get_date(initial=None):
         if date == '' and initial:
             return initial
         try:
-            date = datetime.datetime.strptime(date, '%d/%m/%Y')
+            return parse_date(date)
         except ValueError:
             print("Sorry, you must enter a valid date.\n")
-        else:
-            return date.date()
 
 
 def get_date_range():
@@ -37,7 +219,7 @@ def get_date_range():
         print("Enter the start date")
         start_date = input("Please use DD/MM/YYYY: ")
         try:
-            start_date = datetime.datetime.strptime(start_date, '%d/%m/%Y')
+            start_date = parse_date(start_date)
         except ValueError:
             print("Sorry, you must enter a valid date.\n")
         else:
@@ -47,11 +229,11 @@ def get_date_range():
         print("Enter the end date")
         end_date = input("Please use DD/MM/YYYY: ")
         try:
-            end_date = datetime.datetime.strptime(end_date, '%d/%m/%Y')
+            end_date = parse_date(end_date)
         except ValueError:
             print("Sorry, you must enter a valid date.\n")
         else:
-            return start_date.date(), end_date.date()
+            return start_date, end_date
 
 
 def get_title(initial=None):
@@ -0,0 +1,122 @@
+"""
+Watching of the files of a log, to tell when another process may have
+changed them. On Linux the directories of the files are watched with
+inotify, so nothing is read until there is an event. Anywhere else, or if
+inotify can't be used, the files are polled with stat.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from storage import file_stamp
+
+# inotify events of a file written, replaced, created or deleted. Closing a
+# file opened for writing is left out, as taking a lock does just that.
+IN_MODIFY = 0x2
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+MASK = IN_MODIFY | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# Watch descriptor, mask, cookie and length of the name of an event
+EVENT = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    """
+    Watches files by comparing their modification time, size and inode
+    every time it is asked.
+    """
+
+    def __init__(self, files):
+        """Starts watching the files given"""
+        self.files = list(files)
+        self.stamps = None
+
+    def changed(self):
+        """
+        Returns True if any file has changed since the last time it was
+        asked, and always the first time.
+        """
+        stamps = [file_stamp(file) for file in self.files]
+        changed, self.stamps = stamps != self.stamps, stamps
+        return changed
+
+    def close(self):
+        """Stops watching the files"""
+
+
+class InotifyWatcher:
+    """
+    Watches files with inotify. The directories of the files are watched,
+    as files replaced by a rename are new files, and the events are read
+    without blocking every time it is asked.
+    """
+
+    def __init__(self, files):
+        """
+        Starts watching the files given. It raises OSError if inotify can't
+        be used.
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify can't be used")
+        self.names = {}
+        self.pending = True
+        try:
+            for file in files:
+                directory, name = os.path.split(os.path.abspath(file))
+                watch = libc.inotify_add_watch(
+                    self.fd, os.fsencode(directory), MASK)
+                if watch < 0:
+                    raise OSError(
+                        ctypes.get_errno(), "{} can't be watched".format(
+                            directory))
+                self.names.setdefault(watch, set()).add(os.fsencode(name))
+        except OSError:
+            self.close()
+            raise
+
+    def changed(self):
+        """
+        Returns True if there has been an event of any file since the last
+        time it was asked, and always the first time.
+        """
+        changed, self.pending = self.pending, False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW or name in self.names.get(watch, ()):
+                    changed = True
+
+    def close(self):
+        """Stops watching the files"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def watcher(files):
+    """
+    Returns a watcher of the files given: an InotifyWatcher where it can be
+    used, or else a PollingWatcher.
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(files)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(files)
@@ -1,7 +1,18 @@
-import csv
+import datetime
+import sys
+import time
+import weakref
 
-from menu import MainMenu
-from task import Task
+import profiling
+from binary_log import BinaryStorage, BinaryTaskList
+from columns import TaskColumns
+from index import DateIndex, IdIndex, TextIndex, TotalsIndex
+from lazy import LazyTaskList
+from shards import ShardedStorage, ShardedTaskList
+from sqlite_log import SqliteStorage, SqliteTaskList
+from storage import JournalStorage
+from task import DateBetween, Task, TaskList, TaskSearch, TaskView
+from watch import watcher
 
 
 class WorkLog:
@@ -12,51 +23,254 @@ class WorkLog:
     and save all information in a csv file.
     """
 
-    def __init__(self, file=None):
+    def __init__(self, file=None, journal=False, compact_size=None,
+                 columnar=False, lazy=False, group_commit=0, shards=None,
+                 watch=False):
         """
         Initialize the app by reading the csv file and adding all tasks to a
         list. If there is no file, the app runs with an empty task list.
+        With journal, changes are appended to a journal file instead of
+        rewriting the csv file, until the journal is bigger than compact_size.
+        With columnar, tasks are kept in compact columns instead of a Task
+        object per entry, which uses much less memory on big logs.
+        With lazy, the csv file is not read until tasks are needed, so the
+        app starts at once whatever the size of the file. A file with a
+        SQLite extension (like log.db) is kept in a SQLite database instead,
+        and a file with the .wlog extension in a binary file mapped in
+        memory.
+        With group_commit, changes made within that many seconds of the first
+        one not saved are saved together, by the next change after that time
+        or by flush. With shards ('month' or 'year'), the log is kept in a
+        directory with a csv file per month or year of entries, and a
+        directory given as file is always read that way. With watch, the
+        files of the log are watched, and refresh merges the changes made to
+        them only after there has been one.
         """
         self.file = file
+        self.columnar = columnar
+        self.lazy = lazy
+        self.group_commit = group_commit
+        self._changes = []
+        self._since = None
+        self.views = weakref.WeakSet()
+        self.watcher = None
+        self._totals = None
+        if not journal:
+            compact_size = 0
+        if SqliteStorage.handles(file):
+            self.storage = SqliteStorage(file)
+        elif BinaryStorage.handles(file):
+            self.storage = BinaryStorage(file)
+        elif shards or ShardedStorage.handles(file):
+            self.storage = ShardedStorage(file, shards)
+        else:
+            self.storage = JournalStorage(file, compact_size)
         self.TASKS = self.get_tasks(file)
+        if watch:
+            self.watch()
 
+    @profiling.timed()
     def get_tasks(self, file=None):
         """
-        Imports a list of tasks from a .csv file, if provided. It returns that
-        list sorted by date.
+        Imports a list of tasks from a .csv file, if provided. The file is
+        read through the storage of the log, so any journal is replayed too.
+        It returns that list sorted by date. A lazy log returns a list that
+        reads the file on demand, unless there is a journal to replay. A
+        SQLite log returns a list that reads and writes the database, a
+        binary log a list mapped over its file, and a sharded log a list that
+        reads its shards on demand.
         """
+        if isinstance(self.storage, SqliteStorage):
+            return SqliteTaskList(self.storage)
+        if isinstance(self.storage, BinaryStorage):
+            build = TaskColumns if self.columnar else self.sort_tasks
+            return BinaryTaskList(self.storage, build)
+        if isinstance(self.storage, ShardedStorage):
+            build = TaskColumns if self.columnar else self.sort_tasks
+            return ShardedTaskList(self.storage, build)
+        if self.lazy and file and not self.storage.has_journal():
+            self.storage.track()
+            return LazyTaskList(file, self.sort_tasks)
+        if self.columnar:
+            return TaskColumns.from_logs(self.storage.load() if file else [])
         tasks = []
         if file:
-            try:
-                with open(file) as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for log in reader:
-                        tasks.append(Task(**log))
-            except FileNotFoundError:
-                pass
+            for log in self.storage.load():
+                tasks.append(Task(**log))
+            profiling.count('tasks created', len(tasks))
         return self.sort_tasks(tasks)
 
+    @profiling.timed()
     def sort_tasks(self, tasks):
         """
         Takes a list of tasks and sort them by date, from the oldest to the
-        newest one.
+        newest one. Tasks with the same date keep their original order. The
+        sorted list keeps a date index and a text index up to date to speed
+        up searches, an id index to find any task by its id, and the totals
+        of time spent for reports.
         """
-        for i in range(1, len(tasks)):
-            j = i-1
-            key = tasks[i]
-            while (tasks[j].date > key.date) and (j >= 0):
-                tasks[j+1] = tasks[j]
-                j -= 1
-            tasks[j+1] = key
-        return tasks
+        return TaskList(tasks, indexes={
+            'date': DateIndex(), 'text': TextIndex(), 'id': IdIndex(),
+            'totals': TotalsIndex()})
+
+    def totals(self):
+        """
+        Returns the TotalsIndex with the time spent per day, week, month and
+        title of the log. Lists that don't keep one (columnar, lazy and
+        SQLite logs) get one built from all their tasks, kept until the log
+        changes.
+        """
+        index = TaskSearch.find_index(self.TASKS, 'totals')
+        if index is not None:
+            return index
+        if self._totals is None:
+            self._totals = TotalsIndex.from_tasks(self.TASKS)
+        return self._totals
+
+    def report(self, group, start_date=None, end_date=None):
+        """
+        Returns a sorted list of (name, minutes, count) with the time spent
+        per day, week, month or title, of the tasks between two dates if
+        given. Title totals of a range of dates are added up from the tasks
+        of the range.
+        """
+        if group == 'title' and (start_date or end_date):
+            tasks = TaskSearch.stream(self.TASKS, DateBetween(
+                start_date or datetime.date.min,
+                end_date or datetime.date.max))
+            return TotalsIndex.from_tasks(tasks).report(group)
+        return self.totals().report(group, start_date, end_date)
+
+    def watch(self):
+        """
+        Starts watching the files of the log, with inotify if available or
+        else by polling them, so refresh doesn't look for changes until they
+        change. Logs whose changes made elsewhere are not found aren't
+        watched.
+        """
+        files = self.storage.watched_files()
+        if files and self.watcher is None:
+            self.watcher = watcher(files)
+
+    def close(self):
+        """
+        Saves the changes not saved yet and stops watching the files of the
+        log, freeing the file descriptor of its watcher.
+        """
+        try:
+            self.flush()
+        finally:
+            if self.watcher is not None:
+                self.watcher.close()
+                self.watcher = None
+
+    def refresh(self, force=False):
+        """
+        Merges into the log the changes saved by other processes since it
+        was read, and returns True if there was any. Only the rows appended
+        to the file and the records appended to a journal are read, if that
+        is all there is; otherwise the whole file is read again, but only the
+        tasks that differ are changed. Tasks changed here and not saved yet
+        keep their local changes. A watched log is only looked at after its
+        files change, unless force is True.
+        """
+        if (not force and self.watcher is not None
+                and not self.watcher.changed()):
+            return False
+        changes = self.storage.changes()
+        if changes is None:
+            changes = self.diff(self.storage.load())
+        if changes:
+            self.merge(changes)
+        return bool(changes)
+
+    def diff(self, logs):
+        """
+        Returns the changes that turn the tasks of the log into the logs
+        given, as (op, logs) pairs matched by id.
+        """
+        logs = {log['Id']: log for log in logs}
+        changes = []
+        for task in self.TASKS:
+            log = logs.pop(task.id, None)
+            if log is None:
+                changes.append((self.storage.DELETE, [task.log()]))
+            elif log != task.log():
+                changes.append((self.storage.EDIT, [task.log(), log]))
+        changes.extend((self.storage.ADD, [log]) for log in logs.values())
+        return changes
+
+    def merge(self, changes):
+        """
+        Applies to the tasks of the log the changes, as (op, logs) pairs,
+        made by another process. Changes to tasks with local changes not
+        saved yet are skipped. While a change made without an op is pending,
+        any task could be new here, so no task is deleted. New tasks are
+        added to the open views of the searches they meet.
+        """
+        pending = {log.get('Id') for _, logs in self._changes for log in logs}
+        unknown = any(op is None for op, _ in self._changes)
+        self.settle_views()
+        self._totals = None
+        for op, logs in changes:
+            if any(log.get('Id') in pending for log in logs):
+                continue
+            task = self.get_task(logs[0].get('Id'))
+            if op == self.storage.ADD and task is None:
+                task = Task(**logs[0])
+                self.TASKS.add(task)
+                for view in self.views:
+                    if view.predicate and view.predicate.matches(task):
+                        view.add(task)
+            elif op == self.storage.DELETE and task is not None:
+                if unknown:
+                    continue
+                self.TASKS.remove(task)
+                for view in self.views:
+                    view.discard(task)
+            elif op == self.storage.EDIT and task is not None:
+                edited = Task(**logs[1])
+                task.title, task.date = edited.title, edited.date
+                task.time, task.notes = edited.time, edited.notes
+                self.TASKS.update(task)
+        profiling.count('changes merged', len(changes))
+
+    def get_task(self, task_id):
+        """Returns the task with the id given, or None if there is none"""
+        return self.TASKS.indexes['id'].get(task_id)
+
+    def view(self, tasks):
+        """
+        Returns a TaskView of the tasks found by a search, or the same view
+        if it is one already. Open views are kept up to date when a task is
+        deleted, and new tasks that meet their search are added.
+        """
+        view = tasks if isinstance(tasks, TaskView) else TaskView(tasks)
+        self.views.add(view)
+        return view
+
+    def settle_views(self):
+        """
+        Pulls all the tasks of the open views before the log changes, as a
+        search going through the log can't go on after a change.
+        """
+        for view in self.views:
+            view.pull()
 
     def edit_task(self, index, tasks):
         """
         Edit a task using its index to locate it within the list of tasks
-        provided. It returns the index to keep displaying it on the menu.
+        provided. It returns the index to keep displaying it on the menu,
+        which is its new position if the list is the whole log.
         """
-        tasks[index].edit()
-        self.save_log()
+        task = tasks[index]
+        self.settle_views()
+        old_log = task.log()
+        task.edit()
+        self.TASKS.update(task)
+        self.save_log(self.storage.EDIT, old_log, task.log())
+        if tasks is self.TASKS:
+            return self.TASKS.index(task)
         return index
 
     def delete_task(self, index, tasks):
@@ -68,37 +282,109 @@ class WorkLog:
         """
         answer = input("Do you really want to delete this task? [y/N]: ")
         if answer.lower() == 'y':
-            self.TASKS.remove(tasks[index])
-            tasks.remove(tasks[index])
-            self.save_log()
+            task = tasks[index]
+            self.settle_views()
+            self.TASKS.remove(task)
+            for view in self.views:
+                view.discard(task)
+            if tasks is not self.TASKS and tasks not in self.views:
+                del tasks[index]
+            self.save_log(self.storage.DELETE, task.log())
             if index > 1:
                 return index - 1
             return 0
         return index
 
-    def save_log(self):
-        """Saves all tasks in a csvfile."""
-        with open(self.file, 'w') as csvfile:
-            fieldnames = ["Date", "Title", "Time", "Notes"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for entry in self.TASKS:
-                writer.writerow(entry.log())
+    @profiling.timed()
+    def save_log(self, op=None, *logs):
+        """
+        Saves all tasks in a csvfile. If the change made is given as an
+        operation and the logs of the tasks involved, the storage may record
+        just that change instead. With group_commit, the change is kept until
+        the group is flushed.
+        """
+        self.save_changes([(op, logs)])
+
+    def save_changes(self, changes):
+        """
+        Saves several changes, given as (op, logs) pairs, as save_log saves
+        one: the storage may record them all together.
+        """
+        if not self._changes:
+            self._since = time.monotonic()
+        self._totals = None
+        self._changes.extend(changes)
+        self.flush_expired()
+
+    def flush_expired(self):
+        """
+        Saves the changes kept by group_commit once group_commit seconds
+        have passed since the first one. The menus call it every time they
+        are drawn, so a change isn't kept for long after the user stops.
+        """
+        if (self._changes
+                and time.monotonic() - self._since >= self.group_commit):
+            self.flush()
+
+    @profiling.timed()
+    def flush(self):
+        """
+        Saves every change not saved yet at once: the storage records them
+        all together, or else all tasks are saved. The log is locked while
+        it is saved, and the changes saved by other processes are merged
+        first, so none of them is lost.
+        """
+        if not self._changes:
+            return
+        with self.storage.lock():
+            self.refresh(force=True)
+            changes, self._changes = self._changes, []
+            if (all(op for op, _ in changes)
+                    and self.storage.record_many(changes)):
+                return
+            self.storage.save(self.TASKS.logs())
+
+    @profiling.timed()
+    def compact_log(self):
+        """Merges any journaled changes into a clean csv file."""
+        with self.storage.lock():
+            self.refresh(force=True)
+            self._changes = []
+            self.storage.compact(self.TASKS.logs())
 
     def add_task(self):
         """
         Let the user to create and add a new task to the log. Once is created,
         the file is saved and the user is prompted with the new task to review
-        its content. Tasks are sorted before being saved to file to keep them
-        ordered.
+        its content. The task is inserted at its place in the sorted list, so
+        tasks are kept ordered.
         """
         task = Task()
-        self.TASKS.append(task)
-        self.sort_tasks(self.TASKS)
-        self.save_log()
+        self.settle_views()
+        self.TASKS.add(task)
+        self.save_log(self.storage.ADD, task.log())
         task.show()
         input("The entry has been added. Press enter to return to the menu")
 
+    def import_tasks(self, tasks):
+        """
+        Adds many tasks to the log at once, without asking the user. Tasks are
+        sorted and saved just once, as changes that add them, so the storage
+        records them together. Tasks with the id of a task already in the log
+        are skipped. It returns the number of tasks added.
+        """
+        added = {}
+        for task in tasks:
+            if task.id not in added and self.get_task(task.id) is None:
+                added[task.id] = task
+        self.settle_views()
+        self.TASKS.extend(added.values())
+        self.save_changes([
+            (self.storage.ADD, (task.log(),)) for task in added.values()])
+        return len(added)
+
 
 if __name__ == '__main__':
-    MainMenu(WorkLog('log.csv')).run()
+    profiling.enable_from_environ()
+    import cli
+    sys.exit(cli.main())